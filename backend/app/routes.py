@@ -1,12 +1,18 @@
 # backend/app/routes.py
 import logging
-from flask import Blueprint, request, jsonify, send_from_directory
+from flask import Blueprint, Response, request, jsonify, send_from_directory, stream_with_context
 import json
 from pathlib import Path
 import os
+import hmac
+import threading
 from dotenv import load_dotenv
 
-from scripts.search import search
+from scripts.search import (
+    search, search_batch, search_page, stream_search, prewarm_query_embedding_cache, get_result_cache_stats,
+    pinned_model_name, start_index_reload, get_index_status
+)
+from scripts.index_manifest import load_manifest
 from scripts.utils import apply_filters  # If you're using apply_filters from utils.py
 import nltk
 
@@ -27,6 +33,8 @@ app_logger.info(f"Base Dir='{BASE_DIR}'")
 faiss_index_path = BASE_DIR / os.getenv('FAISS_INDEX_PATH')
 metadata_path = BASE_DIR / os.getenv('METADATA_PATH')
 book_mapping_path = BASE_DIR / os.getenv('BOOK_MAPPING_PATH')
+max_batch_queries = int(os.getenv('MAX_BATCH_QUERIES', 1000))
+max_batch_top_k = int(os.getenv('MAX_BATCH_TOP_K', 500))
 
 app_logger.info(f"Faiss Index Path='{faiss_index_path}'")
 
@@ -43,6 +51,18 @@ if not book_mapping_path.exists():
     app_logger.error(f"Book mapping file not found at '{book_mapping_path}'")
     raise FileNotFoundError(f"Book mapping file not found at '{book_mapping_path}'")
 
+# Prewarm the shared query-embedding cache from past queries without delaying startup
+# (only for indexes whose manifest pins their dimension)
+query_cache_prewarm = int(os.getenv('QUERY_CACHE_PREWARM', 500))
+index_manifest = load_manifest(str(faiss_index_path.parent))
+if query_cache_prewarm > 0 and (index_manifest or {}).get('dim'):
+    threading.Thread(
+        target=prewarm_query_embedding_cache,
+        args=(os.getenv('QUERY_LOG_PATH', 'search.log'), query_cache_prewarm, pinned_model_name(index_manifest),
+              index_manifest['dim']),
+        daemon=True
+    ).start()
+
 # Remove these lines as model, index, and metadata are loaded inside search()
 #logging.info(f"Initializing model and loading data...")
 #model = initialize_model()
@@ -105,6 +125,16 @@ def get_filters():
 
 @main.route('/search', methods=['GET'])
 def search_api():
+    """
+    Runs a search and returns up to top_k results.
+
+    With page_size (or a cursor from a previous page) the results come one
+    page at a time: the response also holds "next_cursor", to pass as
+    "cursor" for the next page, or null after the last one.
+    """
+    cursor = request.args.get('cursor')
+    if cursor or request.args.get('page_size'):
+        return search_page_api(cursor)
 
     query = request.args.get('query', '')
     top_k = int(request.args.get('top_k', 100))
@@ -138,3 +168,205 @@ def search_api():
         return jsonify({"error": "An error occurred during the search."}), 500
 
     return jsonify({"results": search_results}), 200  # Wrapped with 'results' key
+
+
+def search_page_api(cursor):
+    try:
+        page_size = int(request.args.get('page_size', 10))
+    except ValueError:
+        return jsonify({"error": "page_size must be an integer."}), 400
+    query = request.args.get('query', '')
+    filters = {
+        'author': request.args.get('author', ''),
+        'group': request.args.get('group', ''),
+        'book_title': request.args.get('book_title', ''),
+    }
+    filters = {k: v for k, v in filters.items() if v}
+    app_logger.info(f"Received search page request: query='{query}', filters={filters}, page_size={page_size}, "
+                    f"cursor={'yes' if cursor else 'no'}")
+
+    if not cursor and not query:
+        return jsonify({"error": "Query parameter is required."}), 400
+    if page_size <= 0:
+        return jsonify({"error": "page_size must be positive."}), 400
+
+    try:
+        search_results, next_cursor = search_page(
+            query=query,
+            index_path=str(faiss_index_path),
+            metadata_path=str(metadata_path),
+            page_size=page_size,
+            top_k=int(request.args.get('top_k', 100)),
+            filters=filters,
+            search_type=request.args.get('search_type', 'all'),
+            cursor=cursor
+        )
+        app_logger.info(f"Search page completed with {len(search_results)} results")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 410
+    except Exception as e:
+        app_logger.error(f"Error during search: {e}", exc_info=True)
+        return jsonify({"error": "An error occurred during the search."}), 500
+
+    return jsonify({"results": search_results, "next_cursor": next_cursor}), 200
+
+
+@main.route('/search/stream', methods=['GET'])
+def search_stream_api():
+    """
+    Streams a search stage by stage, with the same parameters as /search.
+
+    Each stage's results are sent as soon as they are rendered, as
+    {"category": "exact" | "all_words" | "semantic", "results": [...]},
+    followed by {"done": true, "total": n}, or {"error": ...} if the search
+    fails. The events are newline-delimited JSON, or Server-Sent Events
+    when the client accepts text/event-stream.
+    """
+    query = request.args.get('query', '')
+    top_k = int(request.args.get('top_k', 100))
+    search_type = request.args.get('search_type', 'all')
+    filters = {
+        'author': request.args.get('author', ''),
+        'group': request.args.get('group', ''),
+        'book_title': request.args.get('book_title', ''),
+    }
+    filters = {k: v for k, v in filters.items() if v}
+    app_logger.info(f"Received streaming search request: query='{query}', filters={filters}, top_k={top_k}, search_type={search_type}")
+
+    if not query:
+        return jsonify({"error": "Query parameter is required."}), 400
+
+    use_sse = request.accept_mimetypes.best == 'text/event-stream'
+
+    def format_event(event):
+        data = json.dumps(event)
+        return f"data: {data}\n\n" if use_sse else data + '\n'
+
+    def generate():
+        total = 0
+        try:
+            for category, results in stream_search(
+                query=query,
+                index_path=str(faiss_index_path),
+                metadata_path=str(metadata_path),
+                top_k=top_k,
+                filters=filters,
+                search_type=search_type
+            ):
+                total += len(results)
+                yield format_event({"category": category, "results": results})
+        except Exception as e:
+            app_logger.error(f"Error during streaming search: {e}", exc_info=True)
+            yield format_event({"error": "An error occurred during the search."})
+            return
+        app_logger.info(f"Streaming search completed with {total} results")
+        yield format_event({"done": True, "total": total})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream' if use_sse else 'application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@main.route('/search/cache/stats', methods=['GET'])
+def result_cache_stats():
+    """
+    Hit/miss counters of this worker's search result cache.
+    """
+    return jsonify(get_result_cache_stats()), 200
+
+
+def admin_authorized():
+    """
+    True when the request carries the ADMIN_TOKEN as its X-Admin-Token header; admin routes are off without one.
+    """
+    admin_token = os.getenv('ADMIN_TOKEN')
+    return bool(admin_token) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token)
+
+
+@main.route('/admin/reload', methods=['POST'])
+def reload_index_api():
+    """
+    Reloads the index artifacts without a restart.
+
+    The new generation is loaded and validated against its manifest in the
+    background, then swapped in; searches already running finish on the
+    previous one. Responds 202 once the reload has started and 409 while one
+    is already running; GET /admin/index reports the outcome. Only this
+    worker reloads: set INDEX_RELOAD_CHECK_INTERVAL to have every worker
+    follow manifest changes.
+    """
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    if not start_index_reload(str(faiss_index_path), str(metadata_path)):
+        return jsonify({"error": "A reload is already running."}), 409
+    app_logger.info("Index reload started")
+    return jsonify({"reloading": True}), 202
+
+
+@main.route('/admin/index', methods=['GET'])
+def index_status_api():
+    """
+    The index generation this worker serves and the state of its reloads.
+    """
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(get_index_status(str(faiss_index_path), str(metadata_path))), 200
+
+
+@main.route('/search/batch', methods=['POST'])
+def search_batch_api():
+    """
+    Runs many searches in one request.
+
+    Expects a JSON body {"queries": [{"query": ..., "top_k": ..., "search_type": ...,
+    "author": ..., "group": ..., "book_title": ...}, ...]}; top-level "top_k" and
+    "search_type" are used for queries that do not set their own; top_k is at
+    most MAX_BATCH_TOP_K. Returns {"results": [...]} with one result list per
+    query, in order.
+    """
+    body = request.get_json(silent=True) or {}
+    queries = body.get('queries')
+    if not isinstance(queries, list) or not queries:
+        return jsonify({"error": "A non-empty 'queries' list is required."}), 400
+    if len(queries) > max_batch_queries:
+        return jsonify({"error": f"At most {max_batch_queries} queries are allowed per batch."}), 400
+
+    batch = []
+    for item in queries:
+        if not isinstance(item, dict) or not isinstance(item.get('query'), str) or not item['query']:
+            return jsonify({"error": "Every query needs a non-empty 'query' string."}), 400
+        try:
+            top_k = int(item.get('top_k', body.get('top_k', 100)))
+        except (TypeError, ValueError):
+            return jsonify({"error": "'top_k' must be an integer."}), 400
+        if not 0 < top_k <= max_batch_top_k:
+            return jsonify({"error": f"'top_k' must be between 1 and {max_batch_top_k}."}), 400
+        filters = {
+            'author': item.get('author', ''),
+            'group': item.get('group', ''),
+            'book_title': item.get('book_title', ''),
+        }
+        batch.append({
+            'query': item['query'],
+            'top_k': top_k,
+            'search_type': item.get('search_type', body.get('search_type', 'all')),
+            'filters': {k: v for k, v in filters.items() if v},
+        })
+    app_logger.info(f"Received batch search request with {len(batch)} queries")
+
+    try:
+        batch_results = search_batch(
+            batch,
+            index_path=str(faiss_index_path),
+            metadata_path=str(metadata_path)
+        )
+        app_logger.info(f"Batch search completed for {len(batch_results)} queries")
+    except Exception as e:
+        app_logger.error(f"Error during batch search: {e}", exc_info=True)
+        return jsonify({"error": "An error occurred during the batch search."}), 500
+
+    return jsonify({"results": batch_results}), 200
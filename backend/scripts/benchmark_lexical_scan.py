@@ -0,0 +1,99 @@
+# benchmark_lexical_scan.py
+"""
+Scaling report for the multi-core lexical scan.
+
+Times the exact and all-words scans over the normalized corpus in-process
+(the single-core loop search.py uses without an index) and with
+ParallelLexicalScanner for each worker count, and checks that every mode
+finds the same chunks.
+
+Usage:
+    python benchmark_lexical_scan.py /path/to/indexes --workers 1 2 4 8 --queries "psychic being" "the"
+"""
+
+import os
+import json
+import time
+import argparse
+import logging
+from lexical_index import load_normalized_snippets
+from parallel_scan import ParallelLexicalScanner
+from utils import prepare_text_for_matching
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+DEFAULT_QUERIES = ['the', 'psychic being', 'supramental consciousness', 'savitri']
+
+
+def load_corpus(index_dir):
+    normalized_snippets = load_normalized_snippets(index_dir)
+    if normalized_snippets is None:
+        with open(os.path.join(index_dir, 'metadata.json'), 'r', encoding='utf-8') as meta_file:
+            normalized_snippets = [prepare_text_for_matching(meta['snippet']) for meta in json.load(meta_file)]
+    return normalized_snippets
+
+
+def scan_in_process(normalized_snippets, query_normalized, query_words_set):
+    exact = [idx for idx, snippet in enumerate(normalized_snippets) if query_normalized in snippet]
+    all_words = [idx for idx, snippet in enumerate(normalized_snippets) if query_words_set.issubset(snippet.split())]
+    return exact, all_words
+
+
+def scan_parallel(scanner, query_normalized, query_words_set):
+    exact = [idx for chunk_ids in scanner.find_exact_match_chunks(query_normalized) for idx in chunk_ids.tolist()]
+    all_words = [idx for chunk_ids in scanner.find_all_words_match_chunks(query_words_set) for idx in chunk_ids.tolist()]
+    return exact, all_words
+
+
+def time_queries(scan, queries, repeat):
+    found = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        found = [scan(prepare_text_for_matching(query), set(prepare_text_for_matching(query).split())) for query in queries]
+    return (time.perf_counter() - start) / (repeat * len(queries)), found
+
+
+def benchmark(normalized_snippets, queries, worker_counts, repeat=3):
+    baseline, expected = time_queries(
+        lambda query_normalized, words: scan_in_process(normalized_snippets, query_normalized, words), queries, repeat
+    )
+    report = [{'mode': 'in-process', 'workers': 1, 'seconds': baseline, 'speedup': 1.0, 'matches': True}]
+    chunk_order = list(range(len(normalized_snippets)))
+    for num_workers in worker_counts:
+        scanner = ParallelLexicalScanner(normalized_snippets, chunk_order, num_workers)
+        try:
+            # Warm up the pool so that worker start-up is not timed
+            scan_parallel(scanner, 'warm up', {'warm'})
+            seconds, found = time_queries(lambda query_normalized, words: scan_parallel(scanner, query_normalized, words),
+                                          queries, repeat)
+        finally:
+            scanner.close()
+        report.append({
+            'mode': 'parallel',
+            'workers': num_workers,
+            'seconds': seconds,
+            'speedup': baseline / seconds,
+            'matches': [(sorted(exact), sorted(all_words)) for exact, all_words in found] ==
+                       [(sorted(exact), sorted(all_words)) for exact, all_words in expected],
+        })
+    return report
+
+
+def print_report(report, num_chunks):
+    print(f"{num_chunks} chunks, mean time per query (exact + all words scan)")
+    print(f"{'mode':<12}{'workers':>8}{'ms/query':>12}{'speedup':>10}{'same hits':>11}")
+    for row in report:
+        print(f"{row['mode']:<12}{row['workers']:>8}{row['seconds'] * 1000:>12.1f}{row['speedup']:>9.2f}x"
+              f"{'yes' if row['matches'] else 'NO':>11}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling report for the multi-core lexical scan.")
+    parser.add_argument('index_dir')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--queries', nargs='+', default=DEFAULT_QUERIES)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    normalized_snippets = load_corpus(args.index_dir)
+    print_report(benchmark(normalized_snippets, args.queries, sorted(set(args.workers)), args.repeat), len(normalized_snippets))
@@ -6,6 +6,13 @@ import json
 import unicodedata
 import logging
 import fitz  # PyMuPDF
+from utils import prepare_text_for_matching
+from lexical_index import write_exact_index, write_inverted_index, LEXICAL_INDEX_FILENAMES
+from index_manifest import (
+    layout_order, compute_layout, write_manifest, build_pins, replace_file, save_array, INDEX_FILENAME, METADATA_FILENAME
+)
+from metadata_store import write_metadata_store, STORE_FILENAMES
+from faiss_index_factory import build_faiss_index
 
 # Configure Logging
 logging.basicConfig(
@@ -17,9 +24,10 @@ logging.basicConfig(
     ]
 )
 
-# Load the Hugging Face model
+# Load the Hugging Face model; its name is pinned in the index manifest
+MODEL_NAME = 'sentence-transformers/all-mpnet-base-v2'
 logging.info("Loading SentenceTransformer model...")
-model = SentenceTransformer('sentence-transformers/all-mpnet-base-v2')
+model = SentenceTransformer(MODEL_NAME)
 logging.info("Model loaded successfully.")
 
 def normalize_text(text):
@@ -110,7 +118,8 @@ def get_pdf_url_from_pdf_path(pdf_file_path, pdf_directory, base_pdf_url):
     pdf_url = os.path.join(base_pdf_url, relative_pdf_path.replace(os.sep, '/'))
     return pdf_url
 
-def create_embeddings_from_pdfs(pdf_directory, index_output_dir, base_pdf_url, book_mapping_path, chunk_size=1000, overlap=200):
+def create_embeddings_from_pdfs(pdf_directory, index_output_dir, base_pdf_url, book_mapping_path, chunk_size=1000, overlap=200,
+                                index_type='flat', index_options=None):
     embeddings = []
     metadata = []  # To store chapter and file details
     total_pdfs = 0
@@ -187,6 +196,11 @@ def create_embeddings_from_pdfs(pdf_directory, index_output_dir, base_pdf_url, b
     logging.info(f"Total pages processed: {total_pages}")
     logging.info(f"Total chunks created: {total_chunks}")
 
+    # Store every group and book contiguously so that filters map to id ranges
+    order = layout_order(metadata)
+    metadata = [metadata[i] for i in order]
+    embeddings = [embeddings[i] for i in order]
+
     # Convert embeddings to numpy array
     try:
         embeddings_np = np.array(embeddings).astype('float32')
@@ -200,10 +214,8 @@ def create_embeddings_from_pdfs(pdf_directory, index_output_dir, base_pdf_url, b
     # Create FAISS index
     if embeddings_np.size > 0:
         try:
-            #index = faiss.IndexFlatL2(embeddings_np.shape[1])  # L2 distance metric
-            # Use IndexFlatIP using Inner Product for cosine similarity
-            index = faiss.IndexFlatIP(embeddings_np.shape[1])            
-            index.add(embeddings_np)  # Add embeddings to the FAISS index
+            # Use Inner Product for cosine similarity; index_type selects flat, IVF or HNSW
+            index, index_config = build_faiss_index(embeddings_np, index_type, faiss.METRIC_INNER_PRODUCT, **(index_options or {}))
             logging.info(f"FAISS index created with {index.ntotal} embeddings.")
         except Exception as e:
             logging.error(f"Error creating FAISS index: {e}")
@@ -219,20 +231,54 @@ def create_embeddings_from_pdfs(pdf_directory, index_output_dir, base_pdf_url, b
 
         # Save the FAISS index
         try:
-            faiss.write_index(index, os.path.join(index_output_dir, 'faiss_index.bin'))
+            # Replace atomically: running servers may have the old index memory-mapped
+            replace_file(os.path.join(index_output_dir, INDEX_FILENAME), lambda path: faiss.write_index(index, path))
             logging.info("FAISS index saved successfully.")
         except Exception as e:
             logging.error(f"Error saving FAISS index: {e}")
             return
 
+        # Quantized indexes keep a full-precision copy of the vectors for exact re-ranking
+        if index_config.get('rerank_vectors'):
+            try:
+                save_array(os.path.join(index_output_dir, index_config['rerank_vectors']), embeddings_np)
+                logging.info("Re-rank vectors saved successfully.")
+            except Exception as e:
+                logging.error(f"Error saving re-rank vectors: {e}")
+                return
+
         # Save metadata as JSON
         try:
-            with open(os.path.join(index_output_dir, 'metadata.json'), 'w', encoding='utf-8') as meta_file:
+            with open(os.path.join(index_output_dir, METADATA_FILENAME), 'w', encoding='utf-8') as meta_file:
                 json.dump(metadata, meta_file, ensure_ascii=False, indent=4)
+            write_metadata_store(index_output_dir, metadata)
             logging.info("Metadata saved successfully.")
         except Exception as e:
             logging.error(f"Error saving metadata: {e}")
             return
+
+        # Build the exact match and all words indexes over the normalized snippets
+        try:
+            normalized_snippets = [prepare_text_for_matching(meta['snippet']) for meta in metadata]
+            write_exact_index(index_output_dir, normalized_snippets)
+            write_inverted_index(index_output_dir, normalized_snippets)
+        except Exception as e:
+            logging.error(f"Error creating lexical indexes: {e}")
+            return
+
+        # Save the manifest describing the layout of the saved artifacts and pinning what they were built with
+        try:
+            artifacts = [INDEX_FILENAME, METADATA_FILENAME, *STORE_FILENAMES, *LEXICAL_INDEX_FILENAMES]
+            if index_config.get('rerank_vectors'):
+                artifacts.append(index_config['rerank_vectors'])
+            write_manifest(index_output_dir, {
+                'index': index_config,
+                'layout': compute_layout(metadata),
+                **build_pins(index_output_dir, MODEL_NAME, True, index, len(metadata), artifacts)
+            })
+        except Exception as e:
+            logging.error(f"Error saving index manifest: {e}")
+            return
     else:
         logging.warning("No embeddings were generated. Please check your PDFs and extraction process.")
 
@@ -250,5 +296,6 @@ if __name__ == "__main__":
         base_pdf_url=base_pdf_url,
         book_mapping_path=book_mapping_path,
         chunk_size=1000,
-        overlap=200
+        overlap=200,
+        index_type=os.getenv('INDEX_TYPE', 'flat')  # 'flat', 'ivf', 'hnsw', 'sq8', 'fp16' or 'pq'
     )
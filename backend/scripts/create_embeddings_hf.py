@@ -6,9 +6,17 @@ import re
 from sentence_transformers import SentenceTransformer
 import unicodedata
 import json
+from faiss_index_factory import build_faiss_index
+from utils import prepare_text_for_matching
+from lexical_index import write_exact_index, write_inverted_index, LEXICAL_INDEX_FILENAMES
+from index_manifest import (
+    layout_order, compute_layout, write_manifest, build_pins, replace_file, save_array, INDEX_FILENAME, METADATA_FILENAME
+)
+from metadata_store import write_metadata_store, STORE_FILENAMES
 
-# Initialize the SentenceTransformer model
-model = SentenceTransformer('sentence-transformers/all-mpnet-base-v2')
+# Initialize the SentenceTransformer model; its name is pinned in the index manifest
+MODEL_NAME = 'sentence-transformers/all-mpnet-base-v2'
+model = SentenceTransformer(MODEL_NAME)
 
 
 def chunk_text_with_chapters(text, chunk_size=1000, overlap=200):
@@ -113,7 +121,8 @@ def get_pdf_url(text_file_path, text_directory, pdf_base_url='https://127.0.0.1:
     return pdf_url
 
 
-def create_embeddings_from_texts(text_directory, pdf_directory, index_output_dir, chunk_size=1000, overlap=200, pdf_base_url='https://yourdomain.com/pdfs/'):
+def create_embeddings_from_texts(text_directory, pdf_directory, index_output_dir, chunk_size=1000, overlap=200, pdf_base_url='https://yourdomain.com/pdfs/',
+                                 index_type='flat', index_options=None):
     embeddings = []
     metadata = []  # To store chapter and file details
 
@@ -150,28 +159,44 @@ def create_embeddings_from_texts(text_directory, pdf_directory, index_output_dir
                     }
                     metadata.append(file_metadata)
 
+    # Store every group and book contiguously so that filters map to id ranges
+    order = layout_order(metadata)
+    metadata = [metadata[i] for i in order]
+    embeddings = [embeddings[i] for i in order]
+
     # Convert embeddings to numpy array
     embeddings_np = np.array(embeddings).astype('float32')
 
-    # Create FAISS index
-    index = faiss.IndexFlatL2(embeddings_np.shape[1])  # L2 distance metric
-    index.add(embeddings_np)  # Add embeddings to the FAISS index
+    # Normalize embeddings for cosine similarity, like the query vectors search.py builds
+    faiss.normalize_L2(embeddings_np)
 
-    # Normalize embeddings for cosine similarity
-    # faiss.normalize_L2(embeddings_np)
-    # Create IndexFlatIP
-    # index = faiss.IndexFlatIP(embeddings_np.shape[1])
-    # index.add(embeddings_np)
+    # Create FAISS index
+    index, index_config = build_faiss_index(embeddings_np, index_type, faiss.METRIC_INNER_PRODUCT, **(index_options or {}))
 
 
     # Create directory if it doesn't exist
     os.makedirs(index_output_dir, exist_ok=True)
 
     # Save the FAISS index and metadata to files
-    faiss.write_index(index, os.path.join(index_output_dir, 'faiss_index.bin'))
+    replace_file(os.path.join(index_output_dir, INDEX_FILENAME), lambda path: faiss.write_index(index, path))
+    if index_config.get('rerank_vectors'):
+        save_array(os.path.join(index_output_dir, index_config['rerank_vectors']), embeddings_np)
     # Ensure metadata is JSON serializable (convert numpy types if necessary)
-    with open(os.path.join(index_output_dir, 'metadata.json'), 'w', encoding='utf-8') as meta_file:
+    with open(os.path.join(index_output_dir, METADATA_FILENAME), 'w', encoding='utf-8') as meta_file:
         json.dump(metadata, meta_file, ensure_ascii=False, indent=2)
+    write_metadata_store(index_output_dir, metadata)
+    # Build the exact match and all words indexes over the normalized snippets
+    normalized_snippets = [prepare_text_for_matching(meta['snippet']) for meta in metadata]
+    write_exact_index(index_output_dir, normalized_snippets)
+    write_inverted_index(index_output_dir, normalized_snippets)
+    artifacts = [INDEX_FILENAME, METADATA_FILENAME, *STORE_FILENAMES, *LEXICAL_INDEX_FILENAMES]
+    if index_config.get('rerank_vectors'):
+        artifacts.append(index_config['rerank_vectors'])
+    write_manifest(index_output_dir, {
+        'index': index_config,
+        'layout': compute_layout(metadata),
+        **build_pins(index_output_dir, MODEL_NAME, True, index, len(metadata), artifacts)
+    })
     print(f"FAISS index and metadata saved in {index_output_dir}")
 
 
@@ -188,5 +213,6 @@ if __name__ == "__main__":
         index_output_dir, 
         chunk_size=1000, 
         overlap=200, 
-        pdf_base_url=pdf_base_url
+        pdf_base_url=pdf_base_url,
+        index_type=os.getenv('INDEX_TYPE', 'flat')  # 'flat', 'ivf', 'hnsw', 'sq8', 'fp16' or 'pq'
     )
@@ -0,0 +1,145 @@
+# embedding_cache.py
+"""
+Persistent query-embedding cache shared by all search workers on a host.
+
+Embeddings are stored in SQLite, keyed by (model name, dimension,
+normalized query), as float32 blobs. The dimension keeps an entry written
+for another build of a model from reaching an index it does not fit. The file survives restarts and deploys. WAL mode lets
+several worker processes read and write it at the same time. The cache
+holds at most max_entries embeddings; the least recently used ones are
+evicted first.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import logging
+import unicodedata
+from collections import Counter
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Matches the line search() logs for every query
+QUERY_LOG_PATTERN = re.compile(r"Starting search for query: '(.*)' with top_k=")
+
+
+def normalize_query(query):
+    """
+    Canonical form of a query for cache keys: NFC, with whitespace collapsed.
+
+    Case is kept because the embedding model is case-sensitive.
+    """
+    return ' '.join(unicodedata.normalize('NFC', query).split())
+
+
+class QueryEmbeddingCache:
+    def __init__(self, path, max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as conn:
+            # Caches written before entries recorded their dimension
+            conn.execute("DROP TABLE IF EXISTS embeddings")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "model TEXT NOT NULL, dim INTEGER NOT NULL, query TEXT NOT NULL, embedding BLOB NOT NULL, "
+                "last_used REAL NOT NULL, PRIMARY KEY (model, dim, query))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS query_embeddings_last_used ON query_embeddings (last_used)")
+
+    def _connect(self):
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get_many(self, model_name, dim, queries):
+        """
+        Returns {query: embedding} for the (normalized) queries found in the cache with dim dimensions.
+        """
+        if not queries:
+            return {}
+        conn = self._connect()
+        found = {}
+        queries = list(queries)
+        # SQLite limits the number of bound parameters per statement
+        for start in range(0, len(queries), 500):
+            chunk = queries[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(
+                "SELECT query, embedding FROM query_embeddings "
+                f"WHERE model = ? AND dim = ? AND query IN ({placeholders})",
+                [model_name, dim, *chunk]
+            ).fetchall()
+            found.update({
+                query: np.frombuffer(blob, dtype='float32').reshape(1, -1).copy()
+                for query, blob in rows if len(blob) == 4 * dim
+            })
+        if found:
+            now = time.time()
+            conn.executemany(
+                "UPDATE query_embeddings SET last_used = ? WHERE model = ? AND dim = ? AND query = ?",
+                [(now, model_name, dim, query) for query in found]
+            )
+        return found
+
+    def get(self, model_name, dim, query):
+        return self.get_many(model_name, dim, [query]).get(query)
+
+    def put_many(self, model_name, embeddings):
+        """
+        Stores {query: embedding} and evicts the least recently used entries beyond max_entries.
+        """
+        if not embeddings:
+            return
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO query_embeddings (model, dim, query, embedding, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(model_name, np.shape(embedding)[-1], query,
+                  np.ascontiguousarray(embedding, dtype='float32').tobytes(), now)
+                 for query, embedding in embeddings.items()]
+            )
+            excess = conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM query_embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM query_embeddings ORDER BY last_used LIMIT ?)", (excess,)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def put(self, model_name, query, embedding):
+        self.put_many(model_name, {query: embedding})
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+
+
+def read_logged_queries(log_path, limit):
+    """
+    Returns up to limit of the most frequent normalized queries found in a search log.
+    """
+    if not os.path.exists(log_path):
+        return []
+    counts = Counter()
+    with open(log_path, 'r', encoding='utf-8', errors='replace') as log_file:
+        for line in log_file:
+            match = QUERY_LOG_PATTERN.search(line)
+            if match:
+                query = normalize_query(match.group(1))
+                if query:
+                    counts[query] += 1
+    return [query for query, _ in counts.most_common(limit)]
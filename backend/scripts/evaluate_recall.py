@@ -0,0 +1,98 @@
+# evaluate_recall.py
+"""
+Recall@k report for the compressed index types.
+
+Builds every index type from the same full-precision vectors and compares
+its top-k against exact search, with and without re-ranking, alongside
+the memory the index needs.
+
+Usage:
+    python evaluate_recall.py /path/to/indexes --k 10 --num-queries 500
+"""
+
+import os
+import argparse
+import logging
+import numpy as np
+import faiss
+from faiss_index_factory import (
+    build_faiss_index, rerank, get_flat_vectors, RERANK_VECTORS_FILENAME, DEFAULT_RERANK_FACTOR
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+
+def load_full_vectors(index_dir):
+    """
+    Loads the float32 vectors from embeddings.npy, or from a flat faiss_index.bin.
+    """
+    vectors_path = os.path.join(index_dir, RERANK_VECTORS_FILENAME)
+    if os.path.exists(vectors_path):
+        return np.load(vectors_path)
+    index = faiss.read_index(os.path.join(index_dir, 'faiss_index.bin'))
+    vectors = get_flat_vectors(index)
+    if vectors is None:
+        raise RuntimeError("Index has no full-precision vectors; rebuild it with a flat index or keep embeddings.npy.")
+    return np.array(vectors)
+
+
+def recall_at_k(found, expected):
+    hits = sum(len(set(f[f >= 0]) & set(e[e >= 0])) for f, e in zip(found, expected))
+    return hits / expected.size
+
+
+def evaluate(vectors, metric, k=10, num_queries=500, index_types=('flat', 'sq8', 'fp16', 'pq'),
+             rerank_factor=DEFAULT_RERANK_FACTOR, seed=0):
+    rng = np.random.default_rng(seed)
+    query_ids = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+    # Perturb the stored vectors so that queries are near, but not equal to, a corpus vector
+    queries = vectors[query_ids] + rng.normal(scale=0.05, size=(len(query_ids), vectors.shape[1])).astype('float32')
+    if metric == faiss.METRIC_INNER_PRODUCT:
+        faiss.normalize_L2(queries)
+
+    exact_index, _ = build_faiss_index(vectors, 'flat', metric)
+    _, expected = exact_index.search(queries, k)
+    float32_bytes = vectors.nbytes
+
+    report = []
+    for index_type in index_types:
+        index, _ = build_faiss_index(vectors, index_type, metric)
+        index_bytes = faiss.serialize_index(index).nbytes
+        _, found = index.search(queries, k)
+        row = {
+            'index_type': index_type,
+            'bytes': index_bytes,
+            'compression': float32_bytes / index_bytes,
+            'recall': recall_at_k(found, expected),
+            'recall_reranked': None,
+        }
+        if index_type != 'flat':
+            _, candidates = index.search(queries, k * rerank_factor)
+            reranked = np.vstack([
+                rerank(vectors, metric, queries[i:i + 1], candidates[i:i + 1], k)[1]
+                for i in range(len(queries))
+            ])
+            row['recall_reranked'] = recall_at_k(reranked, expected)
+        report.append(row)
+    return report
+
+
+def print_report(report, k):
+    print(f"{'index':<8}{'size (MB)':>12}{'compression':>14}{f'recall@{k}':>12}{'reranked':>12}")
+    for row in report:
+        reranked = f"{row['recall_reranked']:.4f}" if row['recall_reranked'] is not None else '-'
+        print(f"{row['index_type']:<8}{row['bytes'] / 2 ** 20:>12.1f}{row['compression']:>13.1f}x"
+              f"{row['recall']:>12.4f}{reranked:>12}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k report for compressed FAISS indexes.")
+    parser.add_argument('index_dir')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--num-queries', type=int, default=500)
+    parser.add_argument('--metric', choices=('inner_product', 'l2'), default='inner_product')
+    args = parser.parse_args()
+
+    metric = faiss.METRIC_INNER_PRODUCT if args.metric == 'inner_product' else faiss.METRIC_L2
+    vectors = load_full_vectors(args.index_dir)
+    print_report(evaluate(vectors, metric, args.k, args.num_queries), args.k)
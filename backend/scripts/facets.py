@@ -0,0 +1,77 @@
+# facets.py
+"""
+Per-value row-id bitsets for the metadata fields used as search filters.
+
+A bitset is a packed little-endian bit array with one bit per metadata row,
+which is also the layout FAISS expects for IDSelectorBitmap, so the same
+array filters the lexical candidates and restricts the semantic index scan.
+"""
+
+import threading
+import numpy as np
+
+# Imported both from the scripts package (search.py) and as a top-level module (embedding scripts)
+try:
+    from .metadata_store import metadata_column
+except ImportError:
+    from metadata_store import metadata_column
+
+FACET_FIELDS = ('author', 'group', 'book_title')
+
+# Facets are shared by all request threads; serializes building the ones for other fields
+facet_build_lock = threading.Lock()
+
+
+def ids_to_bitmap(ids, num_rows):
+    mask = np.zeros(num_rows, dtype=bool)
+    mask[ids] = True
+    return np.packbits(mask, bitorder='little')
+
+
+def bitmap_to_ids(bitmap, num_rows):
+    return np.flatnonzero(np.unpackbits(bitmap, count=num_rows, bitorder='little'))
+
+
+def bitmap_contains(bitmap, ids):
+    """
+    Returns a boolean mask telling which of the given row ids are set in bitmap.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    return ((bitmap[ids >> 3] >> (ids & 7)) & 1).astype(bool)
+
+
+def build_facet(metadata, field):
+    """
+    Builds the value -> bitset mapping for one metadata field.
+    """
+    value_ids = {}
+    for idx, value in enumerate(metadata_column(metadata, field)):
+        if isinstance(value, (str, int, float)):
+            value_ids.setdefault(value, []).append(idx)
+    return {value: ids_to_bitmap(ids, len(metadata)) for value, ids in value_ids.items()}
+
+
+def build_facets(metadata, fields=FACET_FIELDS):
+    return {field: build_facet(metadata, field) for field in fields}
+
+
+def get_filter_bitmap(facets, metadata, filters):
+    """
+    Combines the bitsets of all filter values, with the same semantics as utils.apply_filters.
+
+    Returns None when there are no filters. Facets for fields outside
+    FACET_FIELDS are built on first use, under facet_build_lock, and kept in facets.
+    """
+    if not filters:
+        return None
+    bitmap = None
+    for key, value in filters.items():
+        if key not in facets:
+            with facet_build_lock:
+                if key not in facets:
+                    facets[key] = build_facet(metadata, key)
+        value_bitmap = facets[key].get(value)
+        if value_bitmap is None:
+            return np.zeros((len(metadata) + 7) // 8, dtype=np.uint8)
+        bitmap = value_bitmap if bitmap is None else bitmap & value_bitmap
+    return bitmap
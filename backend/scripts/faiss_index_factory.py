@@ -0,0 +1,192 @@
+# faiss_index_factory.py
+"""
+Builds the FAISS index used for semantic search.
+
+Supported index types:
+- flat: exact brute-force search (IndexFlatIP / IndexFlatL2).
+- ivf: inverted file with flat lists (IndexIVFFlat), trained on a sample of the vectors.
+- hnsw: graph-based search (IndexHNSWFlat), no training needed.
+- sq8 / fp16: scalar-quantized vectors (IndexScalarQuantizer), 4x / 2x smaller than float32.
+- pq: product-quantized vectors (IndexPQ), pq_m bytes per vector.
+
+The quantized types are lossy, so their config names a full-precision
+copy of the vectors (embeddings.npy) that search.py memory-maps to
+re-rank the top candidates exactly.
+
+The returned config is stored in the index manifest so that search.py can
+restore the search-time parameters (nprobe, efSearch) when it loads the index.
+"""
+
+import math
+import logging
+import numpy as np
+import faiss
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ('flat', 'ivf', 'hnsw', 'sq8', 'fp16', 'pq')
+RERANK_VECTORS_FILENAME = 'embeddings.npy'
+DEFAULT_RERANK_FACTOR = 4
+METRIC_NAMES = {
+    faiss.METRIC_INNER_PRODUCT: 'inner_product',
+    faiss.METRIC_L2: 'l2',
+}
+
+# FAISS warns when there are fewer than 39 training points per IVF list
+MIN_POINTS_PER_LIST = 39
+TRAINING_POINTS_PER_LIST = 256
+MAX_QUANTIZER_TRAINING_POINTS = 65536
+
+
+def default_nlist(num_vectors):
+    nlist = int(4 * math.sqrt(num_vectors))
+    return max(1, min(nlist, num_vectors // MIN_POINTS_PER_LIST))
+
+
+def sample_training_vectors(embeddings_np, sample_size, seed=1234):
+    if sample_size >= len(embeddings_np):
+        return embeddings_np
+    rng = np.random.default_rng(seed)
+    sample_ids = np.sort(rng.choice(len(embeddings_np), size=sample_size, replace=False))
+    return embeddings_np[sample_ids]
+
+
+def default_pq_m(dim):
+    # Prefer 8 dimensions per sub-quantizer (96 bytes per 768-dim vector)
+    for pq_m in range(max(1, dim // 8), dim + 1):
+        if dim % pq_m == 0:
+            return pq_m
+    return dim
+
+
+def build_faiss_index(embeddings_np, index_type='flat', metric=faiss.METRIC_INNER_PRODUCT,
+                      nlist=None, nprobe=None, hnsw_m=32, ef_construction=200, ef_search=128,
+                      pq_m=None, pq_nbits=8, rerank_factor=DEFAULT_RERANK_FACTOR):
+    """
+    Creates an index of the requested type and adds embeddings_np to it.
+
+    Returns the index and a JSON-serializable config describing it.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    num_vectors, dim = embeddings_np.shape
+    config = {'type': index_type, 'metric': METRIC_NAMES[metric]}
+
+    if index_type == 'flat':
+        index = faiss.IndexFlat(dim, metric)
+    elif index_type == 'ivf':
+        nlist = nlist or default_nlist(num_vectors)
+        nprobe = nprobe or max(1, nlist // 16)
+        quantizer = faiss.IndexFlat(dim, metric)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+        training_vectors = sample_training_vectors(embeddings_np, nlist * TRAINING_POINTS_PER_LIST)
+        logger.info(f"Training IVF index with {nlist} lists on {len(training_vectors)} vectors...")
+        index.train(training_vectors)
+        index.nprobe = nprobe
+        config.update({'nlist': nlist, 'nprobe': nprobe})
+    elif index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, metric)
+        index.hnsw.efConstruction = ef_construction
+        index.hnsw.efSearch = ef_search
+        config.update({'hnsw_m': hnsw_m, 'ef_construction': ef_construction, 'ef_search': ef_search})
+    else:
+        if index_type == 'pq':
+            pq_m = pq_m or default_pq_m(dim)
+            index = faiss.IndexPQ(dim, pq_m, pq_nbits, metric)
+            config.update({'pq_m': pq_m, 'pq_nbits': pq_nbits})
+        else:
+            quantizer_type = faiss.ScalarQuantizer.QT_8bit if index_type == 'sq8' else faiss.ScalarQuantizer.QT_fp16
+            index = faiss.IndexScalarQuantizer(dim, quantizer_type, metric)
+        training_vectors = sample_training_vectors(embeddings_np, MAX_QUANTIZER_TRAINING_POINTS)
+        logger.info(f"Training {index_type} quantizer on {len(training_vectors)} vectors...")
+        index.train(training_vectors)
+        config.update({'rerank_vectors': RERANK_VECTORS_FILENAME, 'rerank_factor': rerank_factor})
+
+    index.add(embeddings_np)
+    logger.info(f"FAISS {index_type} index created with {index.ntotal} embeddings.")
+    return index, config
+
+
+def apply_search_config(index, config):
+    """
+    Restores the search-time parameters recorded in config on a loaded index.
+    """
+    if not config:
+        return index
+    ivf_index = faiss.try_extract_index_ivf(index)
+    if ivf_index is not None and 'nprobe' in config:
+        ivf_index.nprobe = config['nprobe']
+    if hasattr(index, 'hnsw') and 'ef_search' in config:
+        index.hnsw.efSearch = config['ef_search']
+    return index
+
+
+def supports_selector(index):
+    """
+    False for index types whose search() rejects search parameters, and with them ID selectors (IndexPQ).
+    """
+    return not isinstance(index, faiss.IndexPQ)
+
+
+def make_search_params(index, selector=None):
+    """
+    Returns search parameters of the right type for index, or None if there is nothing to set.
+
+    Also None when index cannot take a selector (see supports_selector):
+    the caller then has to filter its results itself.
+    """
+    if selector is None or not supports_selector(index):
+        return None
+    ivf_index = faiss.try_extract_index_ivf(index)
+    if ivf_index is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf_index.nprobe)
+    if hasattr(index, 'hnsw'):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def get_flat_vectors(index):
+    """
+    Returns a (ntotal, d) view of the raw float32 vectors held by index, or None if it has none.
+    """
+    storage = index
+    if hasattr(index, 'hnsw'):
+        storage = faiss.downcast_index(index.storage)
+    if not isinstance(storage, faiss.IndexFlat):
+        return None
+    return faiss.rev_swig_ptr(storage.get_xb(), storage.ntotal * storage.d).reshape(storage.ntotal, storage.d)
+
+
+def exact_top_k(vectors, ids, metric, query_embeddings, k):
+    """
+    Scores vectors (the rows of ids) exactly against each query and keeps the best k.
+
+    Returns distances and indices shaped like index.search, padded with -1.
+    """
+    inner_product = metric == faiss.METRIC_INNER_PRODUCT
+    vectors = np.asarray(vectors, dtype='float32')
+    if inner_product:
+        scores = -(query_embeddings @ vectors.T)
+    else:
+        scores = np.stack([((vectors - query_embedding) ** 2).sum(axis=1) for query_embedding in query_embeddings])
+    num_queries = len(query_embeddings)
+    k_found = min(k, len(ids))
+    distances = np.full((num_queries, k), -np.inf if inner_product else np.inf, dtype='float32')
+    indices = np.full((num_queries, k), -1, dtype=np.int64)
+    if k_found:
+        top = np.argpartition(scores, k_found - 1, axis=1)[:, :k_found]
+        top = np.take_along_axis(top, np.argsort(np.take_along_axis(scores, top, axis=1), axis=1, kind='stable'), axis=1)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        distances[:, :k_found] = -top_scores if inner_product else top_scores
+        indices[:, :k_found] = np.asarray(ids)[top]
+    return distances, indices
+
+
+def rerank(vectors, metric, query_embedding, indices, k):
+    """
+    Re-scores the candidate ids returned by a quantized index against full-precision vectors.
+    """
+    candidates = indices[0][indices[0] >= 0]
+    # Sorted ids keep reads from a memory-mapped array sequential
+    candidates = np.sort(candidates)
+    return exact_top_k(vectors[candidates], candidates, metric, query_embedding, k)
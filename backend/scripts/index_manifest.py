@@ -0,0 +1,208 @@
+# index_manifest.py
+"""
+Manifest written by the embedding scripts next to the FAISS index.
+
+The manifest describes how the saved artifacts are laid out. Chunks are
+stored book-contiguously: every group (CWSA, CWM, Disciples) and every book
+inside it occupies one contiguous id range, so a group or book_title filter
+maps to a slice of the index instead of a scattered set of ids.
+
+The manifest also pins what the artifacts were built with: the embedding
+model and whether its vectors were normalized, the metric, dimension and
+size of the FAISS index, the number of metadata rows, and the size and
+SHA-256 of every artifact file. search.py checks these pins when it loads
+an index (see manifest_mismatches) and refuses artifacts that do not match
+instead of serving degraded results.
+
+Artifacts are replaced atomically (see replace_file) because servers may
+have the previous generation memory-mapped.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime, timezone
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = 'manifest.json'
+INDEX_FILENAME = 'faiss_index.bin'
+METADATA_FILENAME = 'metadata.json'
+GROUP_ORDER = ["CWSA", "CWM", "Disciples"]
+
+
+def group_rank(group):
+    return GROUP_ORDER.index(group) if group in GROUP_ORDER else len(GROUP_ORDER)
+
+
+def layout_order(metadata):
+    """
+    Returns the row order that makes every group and book contiguous.
+
+    Rows are ordered by group, then by descending book priority and title,
+    keeping the original page and chunk order inside each book.
+    """
+    return sorted(
+        range(len(metadata)),
+        key=lambda i: (
+            group_rank(metadata[i].get('group')),
+            -metadata[i].get('priority', 0),
+            metadata[i].get('book_title', ''),
+            i
+        )
+    )
+
+
+def contiguous_ranges(values):
+    """
+    Maps each value to its [start, end) range, skipping values that are not contiguous.
+    """
+    ranges = {}
+    split = set()
+    for idx, value in enumerate(values):
+        if value in ranges and ranges[value][1] != idx:
+            split.add(value)
+        if value not in ranges:
+            ranges[value] = [idx, idx + 1]
+        else:
+            ranges[value][1] = idx + 1
+    for value in split:
+        logger.warning(f"Rows for '{value}' are not contiguous; no range recorded.")
+        del ranges[value]
+    return ranges
+
+
+def compute_layout(metadata):
+    """
+    Records the id range of every group and book of metadata (already in layout order).
+    """
+    return {
+        'groups': contiguous_ranges([meta.get('group', 'Unknown') for meta in metadata]),
+        'books': contiguous_ranges([meta.get('book_title', 'Unknown') for meta in metadata]),
+    }
+
+
+def replace_file(path, write):
+    """
+    Writes a file through write(tmp_path) and moves it into place atomically.
+
+    Servers that have the old file memory-mapped keep reading it safely: the
+    rename gives the new file a new inode instead of truncating the old one.
+    """
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_array(path, array):
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as array_file:
+            np.save(array_file, array)
+    replace_file(path, write)
+
+
+def write_manifest(index_output_dir, manifest):
+    def write(path):
+        with open(path, 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, ensure_ascii=False, indent=4)
+    replace_file(os.path.join(index_output_dir, MANIFEST_FILENAME), write)
+    logger.info("Index manifest saved successfully.")
+
+
+def file_checksum(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as artifact_file:
+        for block in iter(lambda: artifact_file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def artifact_checksums(index_dir, filenames):
+    """
+    Records the size and SHA-256 of each of filenames present in index_dir.
+    """
+    artifacts = {}
+    for filename in filenames:
+        path = os.path.join(index_dir, filename)
+        if os.path.exists(path):
+            artifacts[filename] = {'size': os.path.getsize(path), 'sha256': file_checksum(path)}
+    return artifacts
+
+
+def build_pins(index_dir, model_name, normalized, index, num_chunks, filenames):
+    """
+    Returns the manifest entries pinning a finished build: call it once every artifact in filenames is written.
+    """
+    return {
+        'model': {'name': model_name, 'normalized': normalized},
+        'dim': index.d,
+        'ntotal': index.ntotal,
+        'num_chunks': num_chunks,
+        'artifacts': artifact_checksums(index_dir, filenames),
+        'built_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+
+
+def manifest_mismatches(manifest, index_dir, ntotal, dim, metric, num_rows, verify_checksums=False):
+    """
+    Compares the loaded artifacts with the pins of manifest and returns a description of every mismatch.
+
+    Pins missing from older manifests are not checked. ntotal, dim and metric
+    describe the loaded FAISS index and num_rows the loaded metadata.
+    Artifacts are checked by size; verify_checksums also hashes each of them,
+    which reads every page of every artifact from disk.
+    """
+    problems = []
+    if ntotal != num_rows:
+        problems.append(f"the FAISS index holds {ntotal} vectors but the metadata has {num_rows} rows")
+    if manifest is None:
+        return problems
+    pinned = [
+        ('ntotal', manifest.get('ntotal'), ntotal),
+        ('dim', manifest.get('dim'), dim),
+        ('metric', (manifest.get('index') or {}).get('metric'), metric),
+        ('num_chunks', manifest.get('num_chunks'), num_rows),
+    ]
+    for name, expected, actual in pinned:
+        if expected is not None and expected != actual:
+            problems.append(f"{name} is {actual} but the manifest pins {expected}")
+    if (manifest.get('model') or {}).get('normalized') is False:
+        problems.append("the index vectors were not normalized but query vectors are")
+    for filename, pin in (manifest.get('artifacts') or {}).items():
+        path = os.path.join(index_dir, filename)
+        if not os.path.exists(path):
+            problems.append(f"{filename} is missing")
+        elif os.path.getsize(path) != pin['size']:
+            problems.append(f"{filename} is {os.path.getsize(path)} bytes but the manifest pins {pin['size']}")
+        elif verify_checksums and file_checksum(path) != pin['sha256']:
+            problems.append(f"{filename} does not match its pinned SHA-256")
+    return problems
+
+
+def load_manifest(index_dir):
+    """
+    Loads the manifest from index_dir, or returns None for indexes built without one.
+    """
+    manifest_path = os.path.join(index_dir, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
+
+
+def get_filter_range(layout, filters):
+    """
+    Returns the [start, end) id range containing every row that passes filters,
+    or None if the filters do not map to a recorded range.
+    """
+    if not layout or not filters:
+        return None
+    if 'book_title' in filters:
+        id_range = layout['books'].get(filters['book_title'])
+    elif 'group' in filters:
+        id_range = layout['groups'].get(filters['group'])
+    else:
+        return None
+    return tuple(id_range) if id_range else None
@@ -0,0 +1,301 @@
+# lexical_index.py
+"""
+Lexical indexes over the normalized chunk texts.
+
+The embedding scripts write these next to the FAISS index so that exact
+and all-words search no longer have to scan every metadata row per query.
+
+Exact match index:
+- corpus_normalized.bin: the normalized snippets (see utils.prepare_text_for_matching)
+  encoded as UTF-8 and joined with a NUL separator.
+- chunk_offsets.npy: byte offset of each chunk inside the corpus.
+- suffix_array.npy: suffix array over the corpus bytes.
+
+Because UTF-8 is self-synchronizing, a byte-level substring match of the
+encoded query is exactly a character-level substring match, so the
+semantics of `query_normalized in snippet_normalized` are preserved.
+
+All-words index:
+- vocabulary.json: the sorted list of distinct tokens and the chunk count.
+- postings.npy: sorted chunk ids of every token, concatenated in vocabulary order.
+- postings_offsets.npy: start of each token's posting list inside postings.npy.
+
+Tokens are `snippet_normalized.split()`, the same tokenization the all-words
+scan uses, so intersecting posting lists gives the same chunks as the
+`issubset` test.
+"""
+
+import os
+import json
+import bisect
+import mmap
+import logging
+from collections.abc import Sequence
+import numpy as np
+
+# Imported both from the scripts package (search.py) and as a top-level module (embedding scripts)
+try:
+    from .index_manifest import replace_file, save_array
+except ImportError:
+    from index_manifest import replace_file, save_array
+
+logger = logging.getLogger(__name__)
+
+CORPUS_FILENAME = 'corpus_normalized.bin'
+CHUNK_OFFSETS_FILENAME = 'chunk_offsets.npy'
+SUFFIX_ARRAY_FILENAME = 'suffix_array.npy'
+CHUNK_SEPARATOR = b'\x00'
+VOCABULARY_FILENAME = 'vocabulary.json'
+POSTINGS_FILENAME = 'postings.npy'
+POSTINGS_OFFSETS_FILENAME = 'postings_offsets.npy'
+LEXICAL_INDEX_FILENAMES = (
+    CORPUS_FILENAME, CHUNK_OFFSETS_FILENAME, SUFFIX_ARRAY_FILENAME, VOCABULARY_FILENAME, POSTINGS_FILENAME,
+    POSTINGS_OFFSETS_FILENAME,
+)
+
+
+def build_corpus(normalized_snippets):
+    """
+    Joins the normalized snippets into a single UTF-8 corpus.
+
+    Returns the corpus bytes and the byte offset at which each chunk starts.
+    """
+    offsets = np.zeros(len(normalized_snippets), dtype=np.int64)
+    parts = []
+    position = 0
+    for i, snippet in enumerate(normalized_snippets):
+        offsets[i] = position
+        encoded = snippet.encode('utf-8').replace(CHUNK_SEPARATOR, b'')
+        parts.append(encoded)
+        position += len(encoded) + len(CHUNK_SEPARATOR)
+    return CHUNK_SEPARATOR.join(parts), offsets
+
+
+def build_suffix_array(data):
+    """
+    Builds the suffix array of a bytes object using prefix doubling.
+
+    Each round sorts suffixes by their first 2k bytes using the ranks from
+    the previous round, so the work is a handful of vectorized argsorts.
+    """
+    text = np.frombuffer(data, dtype=np.uint8)
+    n = len(text)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    index_dtype = np.int32 if n < 2 ** 31 else np.int64
+
+    rank = text.astype(np.int64)
+    suffix_array = np.argsort(rank, kind='stable')
+    k = 1
+    while True:
+        # Rank of the suffix starting k bytes later, 0 past the end of the text
+        second = np.zeros(n, dtype=np.int64)
+        if k < n:
+            second[:n - k] = rank[k:] + 1
+        key = rank * (n + 1) + second
+        suffix_array = np.argsort(key, kind='stable')
+        sorted_key = key[suffix_array]
+        boundaries = np.empty(n, dtype=bool)
+        boundaries[0] = True
+        boundaries[1:] = sorted_key[1:] != sorted_key[:-1]
+        sorted_rank = np.cumsum(boundaries, dtype=np.int64) - 1
+        rank = np.empty(n, dtype=np.int64)
+        rank[suffix_array] = sorted_rank
+        if sorted_rank[-1] == n - 1:
+            break
+        k *= 2
+    return suffix_array.astype(index_dtype)
+
+
+def write_exact_index(index_output_dir, normalized_snippets):
+    """
+    Builds and saves the exact match index for the given normalized snippets.
+    """
+    corpus, offsets = build_corpus(normalized_snippets)
+    logger.info(f"Building suffix array over {len(corpus)} bytes of normalized text...")
+    suffix_array = build_suffix_array(corpus)
+
+    def write_corpus(path):
+        with open(path, 'wb') as corpus_file:
+            corpus_file.write(corpus)
+
+    replace_file(os.path.join(index_output_dir, CORPUS_FILENAME), write_corpus)
+    save_array(os.path.join(index_output_dir, CHUNK_OFFSETS_FILENAME), offsets)
+    save_array(os.path.join(index_output_dir, SUFFIX_ARRAY_FILENAME), suffix_array)
+    logger.info(f"Exact match index saved with {len(offsets)} chunks.")
+
+
+def read_corpus(corpus_path, use_mmap=False):
+    with open(corpus_path, 'rb') as corpus_file:
+        if use_mmap and os.path.getsize(corpus_path) > 0:
+            return mmap.mmap(corpus_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return corpus_file.read()
+
+
+def load_exact_index(index_dir, use_mmap=False):
+    """
+    Loads the exact match index from index_dir, memory-mapped if use_mmap is set.
+
+    Returns a (corpus, suffix_array, chunk_offsets) tuple, or None if the
+    index has not been built.
+    """
+    paths = [os.path.join(index_dir, name)
+             for name in (CORPUS_FILENAME, SUFFIX_ARRAY_FILENAME, CHUNK_OFFSETS_FILENAME)]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    mmap_mode = 'r' if use_mmap else None
+    corpus = read_corpus(paths[0], use_mmap)
+    suffix_array = np.load(paths[1], mmap_mode=mmap_mode)
+    chunk_offsets = np.load(paths[2], mmap_mode=mmap_mode)
+    return corpus, suffix_array, chunk_offsets
+
+
+class CorpusSnippets(Sequence):
+    """
+    Read-only list of the normalized snippets of a (memory-mapped) corpus, decoded on access.
+    """
+
+    def __init__(self, corpus, chunk_offsets):
+        self.corpus = corpus
+        self.chunk_offsets = chunk_offsets
+
+    def __len__(self):
+        return len(self.chunk_offsets)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f"chunk index {idx} out of range")
+        end = self.chunk_offsets[idx + 1] - len(CHUNK_SEPARATOR) if idx + 1 < len(self) else len(self.corpus)
+        return self.corpus[self.chunk_offsets[idx]:end].decode('utf-8')
+
+
+def load_normalized_snippets(index_dir, use_mmap=False):
+    """
+    Loads the persisted normalized snippets from the exact match corpus.
+
+    Returns a list with one normalized string per chunk, or None if the
+    corpus has not been built. With use_mmap the corpus is memory-mapped
+    and each snippet is decoded when it is read, instead of keeping a
+    decoded copy of the whole corpus per process.
+    """
+    corpus_path = os.path.join(index_dir, CORPUS_FILENAME)
+    if not os.path.exists(corpus_path):
+        return None
+    chunk_offsets_path = os.path.join(index_dir, CHUNK_OFFSETS_FILENAME)
+    if use_mmap and os.path.exists(chunk_offsets_path):
+        return CorpusSnippets(read_corpus(corpus_path, use_mmap), np.load(chunk_offsets_path, mmap_mode='r'))
+    with open(corpus_path, 'rb') as corpus_file:
+        corpus = corpus_file.read()
+    if not corpus:
+        return ['']
+    return [part.decode('utf-8') for part in corpus.split(CHUNK_SEPARATOR)]
+
+
+def find_exact_match_chunks(query_normalized, corpus, suffix_array, chunk_offsets):
+    """
+    Returns the sorted ids of all chunks whose normalized text contains query_normalized.
+
+    Runs two binary searches over the suffix array, O(|query| log N).
+    """
+    pattern = query_normalized.encode('utf-8')
+    if not pattern:
+        return np.arange(len(chunk_offsets))
+    if CHUNK_SEPARATOR in pattern:
+        return np.zeros(0, dtype=np.int64)
+
+    length = len(pattern)
+    key = lambda position: corpus[position:position + length]
+    lo = bisect.bisect_left(suffix_array, pattern, key=key)
+    hi = bisect.bisect_right(suffix_array, pattern, lo=lo, key=key)
+    if lo == hi:
+        return np.zeros(0, dtype=np.int64)
+
+    positions = suffix_array[lo:hi]
+    chunk_ids = np.searchsorted(chunk_offsets, positions, side='right') - 1
+    return np.unique(chunk_ids)
+
+
+def build_inverted_index(normalized_snippets):
+    """
+    Builds token -> chunk id posting lists for the given normalized snippets.
+
+    Returns the sorted vocabulary, the concatenated postings and the offset
+    of each token's posting list (with a trailing end offset).
+    """
+    token_chunks = {}
+    for chunk_id, snippet in enumerate(normalized_snippets):
+        for token in set(snippet.split()):
+            token_chunks.setdefault(token, []).append(chunk_id)
+    vocabulary = sorted(token_chunks)
+    lengths = np.array([len(token_chunks[token]) for token in vocabulary], dtype=np.int64)
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    postings = np.zeros(offsets[-1], dtype=np.int32)
+    for i, token in enumerate(vocabulary):
+        # Chunk ids were appended in increasing order, so each list is already sorted
+        postings[offsets[i]:offsets[i + 1]] = token_chunks[token]
+    return vocabulary, postings, offsets
+
+
+def write_inverted_index(index_output_dir, normalized_snippets):
+    """
+    Builds and saves the all-words inverted index for the given normalized snippets.
+    """
+    vocabulary, postings, offsets = build_inverted_index(normalized_snippets)
+
+    def write_vocabulary(path):
+        with open(path, 'w', encoding='utf-8') as vocab_file:
+            json.dump({'num_chunks': len(normalized_snippets), 'terms': vocabulary}, vocab_file, ensure_ascii=False)
+
+    replace_file(os.path.join(index_output_dir, VOCABULARY_FILENAME), write_vocabulary)
+    save_array(os.path.join(index_output_dir, POSTINGS_FILENAME), postings)
+    save_array(os.path.join(index_output_dir, POSTINGS_OFFSETS_FILENAME), offsets)
+    logger.info(f"Inverted index saved with {len(vocabulary)} terms and {len(postings)} postings.")
+
+
+def load_inverted_index(index_dir, use_mmap=False):
+    """
+    Loads the all-words inverted index from index_dir, memory-mapping the postings if use_mmap is set.
+
+    Returns a (term_ids, postings, postings_offsets, num_chunks) tuple, or None
+    if the index has not been built.
+    """
+    paths = [os.path.join(index_dir, name)
+             for name in (VOCABULARY_FILENAME, POSTINGS_FILENAME, POSTINGS_OFFSETS_FILENAME)]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    with open(paths[0], 'r', encoding='utf-8') as vocab_file:
+        vocabulary = json.load(vocab_file)
+    term_ids = {term: i for i, term in enumerate(vocabulary['terms'])}
+    mmap_mode = 'r' if use_mmap else None
+    postings = np.load(paths[1], mmap_mode=mmap_mode)
+    postings_offsets = np.load(paths[2], mmap_mode=mmap_mode)
+    return term_ids, postings, postings_offsets, vocabulary['num_chunks']
+
+
+def find_all_words_match_chunks(query_words_set, term_ids, postings, postings_offsets, num_chunks):
+    """
+    Returns the sorted ids of all chunks that contain every word of query_words_set.
+
+    Posting lists are intersected starting from the rarest word, so the cost
+    is bounded by the shortest list rather than by the corpus size.
+    """
+    if not query_words_set:
+        return np.arange(num_chunks)
+    lists = []
+    for word in query_words_set:
+        term_id = term_ids.get(word)
+        if term_id is None:
+            return np.zeros(0, dtype=np.int64)
+        lists.append(postings[postings_offsets[term_id]:postings_offsets[term_id + 1]])
+    lists.sort(key=len)
+    chunk_ids = lists[0]
+    for posting_list in lists[1:]:
+        if chunk_ids.size == 0:
+            break
+        chunk_ids = np.intersect1d(chunk_ids, posting_list, assume_unique=True)
+    return chunk_ids.astype(np.int64)
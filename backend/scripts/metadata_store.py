@@ -0,0 +1,282 @@
+# metadata_store.py
+"""
+Columnar, dictionary-encoded copy of metadata.json.
+
+Every chunk of a book repeats the same file_path, pdf_url, book_title,
+author, group and priority, so those fields are stored once per book and
+each row keeps only small integers:
+
+- metadata_tables.json: the book table, the chapter-name table and the row count.
+- metadata_columns.bin: three int32 columns back to back (book id, chapter id, page number).
+- metadata_snippets.bin: every snippet as UTF-8, back to back.
+- metadata_snippet_offsets.npy: byte offset of each snippet in the heap (with a trailing end offset).
+- metadata_snippets_html.bin / metadata_snippet_html_offsets.npy: the same for each snippet
+  rendered as HTML (escaped, line breaks as <br>), so that a search only has to insert <mark>
+  tags and never sanitizes HTML. Stores built before these files existed render it on access.
+
+A row's pdf_url is its book's pdf_url, plus '#page=N' for books whose
+chunks all link to their page. Rows are only turned into dicts when they
+are accessed, so a search builds dicts for the rows it returns and never
+for the whole corpus.
+"""
+
+import os
+import html
+import json
+import mmap
+import logging
+from array import array
+from collections.abc import Sequence
+import numpy as np
+
+# Imported both from the scripts package (search.py) and as a top-level module (embedding scripts)
+try:
+    from .index_manifest import replace_file, save_array
+except ImportError:
+    from index_manifest import replace_file, save_array
+
+logger = logging.getLogger(__name__)
+
+TABLES_FILENAME = 'metadata_tables.json'
+COLUMNS_FILENAME = 'metadata_columns.bin'
+SNIPPETS_FILENAME = 'metadata_snippets.bin'
+SNIPPET_OFFSETS_FILENAME = 'metadata_snippet_offsets.npy'
+SNIPPETS_HTML_FILENAME = 'metadata_snippets_html.bin'
+SNIPPET_HTML_OFFSETS_FILENAME = 'metadata_snippet_html_offsets.npy'
+STORE_FILENAMES = (
+    TABLES_FILENAME, COLUMNS_FILENAME, SNIPPETS_FILENAME, SNIPPET_OFFSETS_FILENAME, SNIPPETS_HTML_FILENAME,
+    SNIPPET_HTML_OFFSETS_FILENAME,
+)
+
+# Fields stored per row; every other field belongs to the book table
+ROW_FIELDS = ('pdf_url', 'chapter_name', 'page_number', 'snippet')
+# Column value for a row without a chapter_name or page_number
+MISSING = -1
+
+
+def render_snippet_html(text):
+    """
+    Renders chunk text as HTML: special characters escaped and newlines turned into <br>.
+    """
+    return html.escape(text, quote=False).replace('\n', '<br>')
+
+
+def html_offsets(text, positions):
+    """
+    Maps sorted positions in text to the matching positions in render_snippet_html(text).
+    """
+    mapped, previous, shift = [], 0, 0
+    for position in positions:
+        part = text[previous:position]
+        # '&' becomes '&amp;'; '<', '>' and '\n' become four characters
+        shift += 4 * part.count('&') + 3 * (part.count('<') + part.count('>') + part.count('\n'))
+        mapped.append(position + shift)
+        previous = position
+    return mapped
+
+
+def split_pdf_url(pdf_url, page_number):
+    """
+    Splits a row's pdf_url into the book's URL and whether it ends with the row's page anchor.
+    """
+    anchor = f"#page={page_number}"
+    if pdf_url is not None and page_number is not None and pdf_url.endswith(anchor):
+        return pdf_url[:-len(anchor)], True
+    return pdf_url, False
+
+
+def encode_metadata(metadata):
+    """
+    Dictionary-encodes metadata into the book and chapter tables and the int32 columns.
+    """
+    books, page_anchored, book_ids_by_key = [], [], {}
+    chapters, chapter_ids_by_name = [], {}
+    book_ids, chapter_ids, page_numbers = array('i'), array('i'), array('i')
+    for meta in metadata:
+        page_number = meta.get('page_number')
+        book = {field: value for field, value in meta.items() if field not in ROW_FIELDS}
+        pdf_url, anchored = split_pdf_url(meta.get('pdf_url'), page_number)
+        if 'pdf_url' in meta:
+            book['pdf_url'] = pdf_url
+        book_key = (json.dumps(book, sort_keys=True), anchored)
+        if book_key not in book_ids_by_key:
+            book_ids_by_key[book_key] = len(books)
+            books.append(book)
+            page_anchored.append(anchored)
+        book_ids.append(book_ids_by_key[book_key])
+
+        chapter_name = meta.get('chapter_name')
+        if chapter_name is None:
+            chapter_ids.append(MISSING)
+        else:
+            if chapter_name not in chapter_ids_by_name:
+                chapter_ids_by_name[chapter_name] = len(chapters)
+                chapters.append(chapter_name)
+            chapter_ids.append(chapter_ids_by_name[chapter_name])
+
+        page_numbers.append(MISSING if page_number is None else page_number)
+
+    tables = {'num_rows': len(metadata), 'books': books, 'page_anchored': page_anchored, 'chapters': chapters}
+    return tables, (book_ids, chapter_ids, page_numbers)
+
+
+def write_heap(path, offsets_path, values):
+    # values back to back as UTF-8, and the offset of each one (with a trailing end offset)
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    encoded = []
+    for i, value in enumerate(values):
+        encoded.append(value.encode('utf-8'))
+        offsets[i + 1] = offsets[i] + len(encoded[-1])
+
+    def write_values(heap_path):
+        with open(heap_path, 'wb') as heap_file:
+            heap_file.writelines(encoded)
+
+    replace_file(path, write_values)
+    save_array(offsets_path, offsets)
+
+
+def write_metadata_store(index_output_dir, metadata):
+    tables, columns = encode_metadata(metadata)
+    snippets = [meta.get('snippet', '') for meta in metadata]
+
+    def write_tables(path):
+        with open(path, 'w', encoding='utf-8') as tables_file:
+            json.dump(tables, tables_file, ensure_ascii=False)
+
+    def write_columns(path):
+        with open(path, 'wb') as columns_file:
+            for column in columns:
+                column.tofile(columns_file)
+
+    replace_file(os.path.join(index_output_dir, COLUMNS_FILENAME), write_columns)
+    write_heap(os.path.join(index_output_dir, SNIPPETS_FILENAME),
+               os.path.join(index_output_dir, SNIPPET_OFFSETS_FILENAME), snippets)
+    write_heap(os.path.join(index_output_dir, SNIPPETS_HTML_FILENAME),
+               os.path.join(index_output_dir, SNIPPET_HTML_OFFSETS_FILENAME),
+               [render_snippet_html(snippet) for snippet in snippets])
+    # Written last: the store is only picked up once its tables exist
+    replace_file(os.path.join(index_output_dir, TABLES_FILENAME), write_tables)
+    logger.info(f"Metadata store saved with {len(metadata)} rows and {len(tables['books'])} books.")
+
+
+class ColumnarMetadata(Sequence):
+    """
+    Read-only list of metadata dicts backed by the columnar store.
+    """
+
+    def __init__(self, tables, book_ids, chapter_ids, page_numbers, snippets, snippet_offsets,
+                 snippets_html=None, snippet_html_offsets=None):
+        self.books = tables['books']
+        self.page_anchored = tables['page_anchored']
+        self.chapters = tables['chapters']
+        self.book_ids = book_ids
+        self.chapter_ids = chapter_ids
+        self.page_numbers = page_numbers
+        self._snippets = snippets
+        self._snippet_offsets = snippet_offsets
+        self._snippets_html = snippets_html
+        self._snippet_html_offsets = snippet_html_offsets
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f"metadata index {idx} out of range")
+        book_id = self.book_ids[idx]
+        meta = dict(self.books[book_id])
+        page_number = self.page_numbers[idx]
+        if page_number != MISSING:
+            meta['page_number'] = page_number
+        if self.page_anchored[book_id]:
+            meta['pdf_url'] = f"{meta['pdf_url']}#page={page_number}"
+        chapter_id = self.chapter_ids[idx]
+        if chapter_id != MISSING:
+            meta['chapter_name'] = self.chapters[chapter_id]
+        meta['snippet'] = self.snippet(idx)
+        return meta
+
+    def snippet(self, idx):
+        return self._snippets[self._snippet_offsets[idx]:self._snippet_offsets[idx + 1]].decode('utf-8')
+
+    def snippet_html(self, idx):
+        if self._snippets_html is None:
+            return render_snippet_html(self.snippet(idx))
+        return self._snippets_html[self._snippet_html_offsets[idx]:self._snippet_html_offsets[idx + 1]].decode('utf-8')
+
+    def column(self, field):
+        """
+        Returns the value of field for every row (None where it is missing) without building row dicts.
+        """
+        if field == 'snippet':
+            return [self.snippet(idx) for idx in range(len(self))]
+        if field == 'page_number':
+            return [None if page_number == MISSING else page_number for page_number in self.page_numbers]
+        if field == 'chapter_name':
+            return [None if chapter_id == MISSING else self.chapters[chapter_id] for chapter_id in self.chapter_ids]
+        if field == 'pdf_url':
+            return [meta.get('pdf_url') for meta in self]
+        book_values = [book.get(field) for book in self.books]
+        return [book_values[book_id] for book_id in self.book_ids]
+
+
+def metadata_column(metadata, field):
+    """
+    Returns the value of field for every row of metadata, a ColumnarMetadata or a list of dicts.
+    """
+    if isinstance(metadata, ColumnarMetadata):
+        return metadata.column(field)
+    return [meta.get(field) for meta in metadata]
+
+
+def metadata_snippet_html(metadata, idx):
+    """
+    Returns the HTML rendering of row idx's snippet, prebuilt when metadata is a ColumnarMetadata.
+    """
+    if isinstance(metadata, ColumnarMetadata):
+        return metadata.snippet_html(idx)
+    return render_snippet_html(metadata[idx].get('snippet', ''))
+
+
+def load_heap(path, offsets_path, use_mmap):
+    offsets = np.load(offsets_path, mmap_mode='r' if use_mmap else None)
+    with open(path, 'rb') as heap_file:
+        if not use_mmap:
+            return heap_file.read(), offsets
+        if offsets[-1] > 0:
+            return mmap.mmap(heap_file.fileno(), 0, access=mmap.ACCESS_READ), offsets
+        # mmap cannot map an empty file
+        return b'', offsets
+
+
+def load_metadata_store(index_dir, use_mmap=False):
+    """
+    Loads the columnar metadata store in index_dir, or returns None if it has not been built.
+
+    With use_mmap the snippet heap is memory-mapped instead of read into memory.
+    """
+    tables_path = os.path.join(index_dir, TABLES_FILENAME)
+    if not os.path.exists(tables_path):
+        return None
+    with open(tables_path, 'r', encoding='utf-8') as tables_file:
+        tables = json.load(tables_file)
+    num_rows = tables['num_rows']
+
+    book_ids, chapter_ids, page_numbers = array('i'), array('i'), array('i')
+    with open(os.path.join(index_dir, COLUMNS_FILENAME), 'rb') as columns_file:
+        for column in (book_ids, chapter_ids, page_numbers):
+            column.fromfile(columns_file, num_rows)
+
+    snippets, snippet_offsets = load_heap(os.path.join(index_dir, SNIPPETS_FILENAME),
+                                          os.path.join(index_dir, SNIPPET_OFFSETS_FILENAME), use_mmap)
+    snippets_html = snippet_html_offsets = None
+    if os.path.exists(os.path.join(index_dir, SNIPPET_HTML_OFFSETS_FILENAME)):
+        snippets_html, snippet_html_offsets = load_heap(os.path.join(index_dir, SNIPPETS_HTML_FILENAME),
+                                                        os.path.join(index_dir, SNIPPET_HTML_OFFSETS_FILENAME), use_mmap)
+    return ColumnarMetadata(tables, book_ids, chapter_ids, page_numbers, snippets, snippet_offsets,
+                            snippets_html, snippet_html_offsets)
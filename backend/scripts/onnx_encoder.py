@@ -0,0 +1,182 @@
+# onnx_encoder.py
+"""
+Quantized ONNX query encoder for CPU-only hosts.
+
+export_quantized_encoder() exports the transformer of a SentenceTransformer
+model to ONNX and applies dynamic int8 quantization to its weights. The
+output directory holds:
+
+- encoder_int8.onnx: the quantized transformer (token embeddings out).
+- the tokenizer files.
+- encoder_config.json: the source model, max_seq_length and pooling.
+
+OnnxQueryEncoder runs it with ONNX Runtime and applies the model's own
+mean pooling and normalization. Its encode() matches SentenceTransformer.encode
+for the way search.py calls it, so it can stand in for the torch model.
+onnxruntime and the export tools are optional: search.py falls back to
+the torch model when they are missing.
+
+Usage:
+    python onnx_encoder.py /path/to/onnx_encoder [--model sentence-transformers/all-mpnet-base-v2] [--check]
+"""
+
+import os
+import json
+import time
+import importlib.util
+import argparse
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ENCODER_FILENAME = 'encoder_int8.onnx'
+ENCODER_CONFIG_FILENAME = 'encoder_config.json'
+DEFAULT_MODEL_NAME = 'sentence-transformers/all-mpnet-base-v2'
+
+
+def export_quantized_encoder(output_dir, model_name=DEFAULT_MODEL_NAME, opset_version=14):
+    """
+    Exports model_name's transformer to ONNX in output_dir and quantizes its weights to int8.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(output_dir, exist_ok=True)
+    model = SentenceTransformer(model_name, device='cpu')
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    pooling = model[1].get_config_dict() if len(model) > 1 else {}
+    if not pooling.get('pooling_mode_mean_tokens', True):
+        raise ValueError(f"Only mean pooling is supported, '{model_name}' uses {pooling}")
+
+    sample = tokenizer(['a sample query'], return_tensors='pt')
+    fp32_path = os.path.join(output_dir, 'encoder_fp32.onnx')
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer, (sample['input_ids'], sample['attention_mask']), fp32_path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['token_embeddings'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'token_embeddings': {0: 'batch', 1: 'sequence'},
+            },
+            opset_version=opset_version,
+        )
+    quantize_dynamic(fp32_path, os.path.join(output_dir, ENCODER_FILENAME), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, ENCODER_CONFIG_FILENAME), 'w', encoding='utf-8') as config_file:
+        json.dump({
+            'model_name': model_name,
+            'max_seq_length': model.max_seq_length,
+            'normalize': any(type(module).__name__ == 'Normalize' for module in model),
+            'quantization': 'dynamic-int8',
+        }, config_file, indent=2)
+    logger.info(f"Quantized ONNX encoder for '{model_name}' saved to {output_dir}")
+
+
+class OnnxQueryEncoder:
+    def __init__(self, model_dir, num_threads=0):
+        """
+        Loads an encoder exported by export_quantized_encoder(); num_threads=0 lets ONNX Runtime decide.
+        """
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, ENCODER_CONFIG_FILENAME), 'r', encoding='utf-8') as config_file:
+            self.config = json.load(config_file)
+        self.model_name = self.config['model_name']
+        self.max_seq_length = self.config['max_seq_length']
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, ENCODER_FILENAME), options, providers=['CPUExecutionProvider']
+        )
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, **kwargs):
+        """
+        Embeds sentences (a string or a list of strings) like SentenceTransformer.encode.
+        """
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        embeddings = []
+        for start in range(0, len(sentences), batch_size):
+            tokens = self.tokenizer(sentences[start:start + batch_size], padding=True, truncation=True,
+                                    max_length=self.max_seq_length, return_tensors='np')
+            attention_mask = tokens['attention_mask'].astype(np.int64)
+            token_embeddings = self.session.run(['token_embeddings'], {
+                'input_ids': tokens['input_ids'].astype(np.int64),
+                'attention_mask': attention_mask,
+            })[0]
+            # Mean pooling over the real tokens
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.config.get('normalize', True):
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            embeddings.append(pooled.astype(np.float32))
+        embeddings = np.vstack(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+
+def onnx_encoder_usable(model_dir, model_name):
+    """
+    True when model_dir holds an ONNX export of model_name and ONNX Runtime is installed; logs why not otherwise.
+    """
+    config_path = os.path.join(model_dir, ENCODER_CONFIG_FILENAME)
+    if not os.path.exists(config_path):
+        logger.warning(f"No ONNX encoder found in {model_dir}; using the torch model.")
+        return False
+    if importlib.util.find_spec('onnxruntime') is None:
+        logger.warning("ONNX Runtime is not installed; using the torch model.")
+        return False
+    with open(config_path, 'r', encoding='utf-8') as config_file:
+        exported_from = json.load(config_file).get('model_name')
+    if exported_from != model_name:
+        logger.warning(f"ONNX encoder in {model_dir} was exported from '{exported_from}', "
+                       f"not '{model_name}'; using the torch model.")
+        return False
+    return True
+
+
+def compare_encoders(model_dir, model_name, queries, repeat=20):
+    """
+    Returns the min cosine similarity between the ONNX and torch embeddings of queries, and each backend's ms per query.
+    """
+    from sentence_transformers import SentenceTransformer
+    torch_model = SentenceTransformer(model_name, device='cpu')
+    onnx_model = OnnxQueryEncoder(model_dir)
+    torch_embeddings = torch_model.encode(queries, convert_to_numpy=True, normalize_embeddings=True)
+    onnx_embeddings = onnx_model.encode(queries)
+    cosines = (torch_embeddings * onnx_embeddings).sum(axis=1) / (
+        np.linalg.norm(torch_embeddings, axis=1) * np.linalg.norm(onnx_embeddings, axis=1))
+    timings = {}
+    for name, model in (('torch', torch_model), ('onnx-int8', onnx_model)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for query in queries:
+                model.encode([query], convert_to_numpy=True)
+        timings[name] = (time.perf_counter() - start) * 1000 / (repeat * len(queries))
+    return float(cosines.min()), timings
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    parser = argparse.ArgumentParser(description="Export a quantized ONNX query encoder.")
+    parser.add_argument('output_dir')
+    parser.add_argument('--model', default=DEFAULT_MODEL_NAME)
+    parser.add_argument('--check', action='store_true', help="Compare with the torch model after exporting")
+    args = parser.parse_args()
+
+    export_quantized_encoder(args.output_dir, args.model)
+    if args.check:
+        min_cosine, timings = compare_encoders(args.output_dir, args.model, [
+            'psychic being', 'what is the supramental consciousness', 'Savitri', 'the divine mother and surrender',
+        ])
+        print(f"min cosine vs torch: {min_cosine:.4f}")
+        for name, ms in timings.items():
+            print(f"{name:<10} {ms:.1f} ms/query")
@@ -0,0 +1,224 @@
+# parallel_scan.py
+"""
+Multi-core lexical scan for indexes built without the suffix array or inverted index.
+
+The normalized chunks are copied once, in ranking order, into
+multiprocessing.shared_memory partitions of roughly equal size. Each
+partition holds the UTF-8 text (chunks separated by NUL) and an int64
+table of chunk ids and start offsets. A persistent process pool attaches
+the partitions without copying them and scans them with compiled byte
+regexes:
+
+- exact: one pattern for the whole query, as `query in snippet`.
+- all words: one substring pattern per word, rarest first as found; the
+  per-word chunk sets are intersected and only the chunks left are split
+  into tokens to check `words.issubset(snippet.split())`. Searching the
+  whole partition for a substring is far cheaper than splitting every chunk.
+
+Partitions are scanned concurrently and their hits are returned in
+partition order, so the hits stay in ranking order. Only a window of
+partitions is queued ahead of the one the caller waits for, so a caller
+that stops early leaves the partitions past the window unscanned. The
+server process has FAISS (OpenMP) and model threads running, so it is not
+forked: workers are forked from a fresh forkserver process that has
+preloaded only this module (or spawned where forkserver is not available).
+multiprocessing would re-run the server's main module (app.py) in each of
+them; ScanProcess starts them with the main module hidden instead.
+"""
+
+import re
+import sys
+import types
+import atexit
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from itertools import islice
+from contextlib import contextmanager
+from multiprocessing import context, shared_memory
+import numpy as np
+
+# Imported both from the scripts package (search.py) and as a top-level module (benchmarks)
+try:
+    from .lexical_index import CHUNK_SEPARATOR
+except ImportError:
+    from lexical_index import CHUNK_SEPARATOR
+
+logger = logging.getLogger(__name__)
+
+# Partitions per worker: more partitions balance the load and let early termination skip more work
+PARTITIONS_PER_WORKER = 4
+# Partitions queued per worker ahead of the one being read
+WINDOW_PER_WORKER = 2
+
+# Shared memory segments attached by this worker process, by name
+_attached = {}
+
+
+def attach(name):
+    # Workers share the parent's resource tracker, so the parent's unlink() covers these segments too
+    if name not in _attached:
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    return _attached[name]
+
+
+def scan_partition(task):
+    """
+    Returns the ids of the chunks of one partition that match every pattern, in partition order.
+    """
+    text_name, text_size, table_name, num_chunks, patterns, words = task
+    text = attach(text_name).buf[:text_size]
+    table = np.ndarray((2, num_chunks), dtype=np.int64, buffer=attach(table_name).buf)
+    chunk_ids, chunk_starts = table[0], table[1]
+    if not patterns:
+        text.release()
+        return chunk_ids.copy()
+    matches = None
+    for pattern in patterns:
+        positions = np.fromiter((match.start() for match in pattern.finditer(text)), dtype=np.int64)
+        chunks = np.unique(np.searchsorted(chunk_starts, positions, side='right') - 1)
+        matches = chunks if matches is None else np.intersect1d(matches, chunks, assume_unique=True)
+        if len(matches) == 0:
+            break
+    if words and len(matches):
+        chunk_ends = np.append(chunk_starts[1:], text_size) - 1
+        matches = np.asarray([
+            chunk for chunk in matches.tolist()
+            if words.issubset(bytes(text[chunk_starts[chunk]:chunk_ends[chunk]]).split(b' '))
+        ], dtype=np.int64)
+    text.release()
+    return chunk_ids[matches].copy()
+
+
+main_module_lock = threading.Lock()
+
+
+@contextmanager
+def main_module_hidden():
+    """
+    Replaces __main__ with an empty module, so that processes started meanwhile do not re-run it.
+    """
+    with main_module_lock:
+        main_module = sys.modules['__main__']
+        sys.modules['__main__'] = types.ModuleType('__main__')
+        try:
+            yield
+        finally:
+            sys.modules['__main__'] = main_module
+
+
+class MainHiddenProcess:
+    # Also covers the workers the pool starts later to replace dead ones
+    def start(self):
+        with main_module_hidden():
+            super().start()
+
+
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    class ScanProcess(MainHiddenProcess, context.ForkServerProcess):
+        pass
+
+    class ScanContext(context.ForkServerContext):
+        Process = ScanProcess
+else:
+    class ScanProcess(MainHiddenProcess, context.SpawnProcess):
+        pass
+
+    class ScanContext(context.SpawnContext):
+        Process = ScanProcess
+
+
+def scan_context():
+    """
+    Returns the multiprocessing context the scan workers are started with.
+    """
+    scan_ctx = ScanContext()
+    if scan_ctx.get_start_method() == 'forkserver':
+        # The workers need this module (and numpy), not what the server process has imported
+        scan_ctx.set_forkserver_preload([__name__])
+    return scan_ctx
+
+
+def exact_patterns(query_normalized):
+    query_bytes = query_normalized.encode('utf-8')
+    return [re.compile(re.escape(query_bytes))]
+
+
+def all_words_patterns(query_words_set):
+    # Longer words tend to be rarer, so they narrow the candidates first
+    return [re.compile(re.escape(word.encode('utf-8'))) for word in sorted(query_words_set, key=len, reverse=True)]
+
+
+class ParallelLexicalScanner:
+    def __init__(self, normalized_snippets, chunk_order, num_workers):
+        """
+        Copies normalized_snippets, in chunk_order, into shared memory and starts num_workers processes.
+        """
+        self.num_workers = num_workers
+        self._segments = []
+        self._tasks = []
+        encoded = [normalized_snippets[idx].encode('utf-8') for idx in chunk_order]
+        total_size = sum(len(chunk) + 1 for chunk in encoded)
+        target_size = max(1, total_size // (num_workers * PARTITIONS_PER_WORKER))
+        start = 0
+        while start < len(encoded):
+            end, size = start, 0
+            while end < len(encoded) and (size < target_size or end == start):
+                size += len(encoded[end]) + 1
+                end += 1
+            self._add_partition(encoded[start:end], np.asarray(chunk_order[start:end], dtype=np.int64))
+            start = end
+        self._pool = scan_context().Pool(num_workers)
+        atexit.register(self.close)
+        logger.info(f"Parallel lexical scan ready: {len(self._tasks)} partitions, {num_workers} workers.")
+
+    def _add_partition(self, chunks, chunk_ids):
+        data = CHUNK_SEPARATOR.join(chunks) + CHUNK_SEPARATOR
+        starts = np.zeros(len(chunks), dtype=np.int64)
+        starts[1:] = np.cumsum([len(chunk) + 1 for chunk in chunks[:-1]])
+        text = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        text.buf[:len(data)] = data
+        table = shared_memory.SharedMemory(create=True, size=2 * len(chunks) * 8)
+        np.ndarray((2, len(chunks)), dtype=np.int64, buffer=table.buf)[:] = (chunk_ids, starts)
+        self._segments.extend([text, table])
+        self._tasks.append((text.name, len(data), table.name, len(chunks)))
+
+    def scan(self, patterns, words=None):
+        """
+        Yields the matching chunk ids of each partition, in ranking order.
+
+        Chunks must contain every pattern and, if words is given, every word
+        as a whole token. Partitions are submitted WINDOW_PER_WORKER per worker
+        ahead of the one yielded next; once the caller stops (closes the
+        generator), no more are submitted.
+        """
+        tasks = (task + (patterns, words) for task in self._tasks)
+        pending = deque(self._pool.apply_async(scan_partition, (task,))
+                        for task in islice(tasks, WINDOW_PER_WORKER * self.num_workers))
+        while pending:
+            chunk_ids = pending.popleft().get()
+            task = next(tasks, None)
+            if task is not None:
+                pending.append(self._pool.apply_async(scan_partition, (task,)))
+            yield chunk_ids
+
+    def find_exact_match_chunks(self, query_normalized):
+        if CHUNK_SEPARATOR.decode() in query_normalized:
+            return iter(())
+        return self.scan(exact_patterns(query_normalized))
+
+    def find_all_words_match_chunks(self, query_words_set):
+        if any(CHUNK_SEPARATOR.decode() in word for word in query_words_set):
+            return iter(())
+        words = frozenset(word.encode('utf-8') for word in query_words_set)
+        return self.scan(all_words_patterns(query_words_set), words)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
@@ -0,0 +1,108 @@
+# result_cache.py
+"""
+In-process cache of complete search results.
+
+Entries are keyed on the normalized query, filters, search type, top_k and
+the index generation, expire after a TTL, and the least recently used ones
+are evicted beyond max_entries. search.py passes the number of the index
+generation a result was computed on, so swapping in a reloaded index
+invalidates the cache, and searches still finishing on the previous
+generation can neither read nor store entries.
+"""
+
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def index_generation(paths):
+    """
+    Identifies the current version of the given index files by their size and modification time.
+    """
+    generation = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            generation.append((path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            generation.append((path, None, None))
+    return tuple(generation)
+
+
+class ResultCache:
+    def __init__(self, max_entries=1000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = None
+        self.retired_generations = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_generation(self, generation):
+        """
+        Switches to generation if it is new; returns False for a generation the cache already moved past.
+        """
+        if generation in self.retired_generations:
+            return False
+        # Entries of an older index can never be hit again, so drop them all at once
+        if generation != self.generation:
+            if self._entries:
+                self.invalidations += 1
+                logger.info(f"Index generation changed; dropping {len(self._entries)} cached results.")
+            self._entries.clear()
+            if self.generation is not None:
+                self.retired_generations.add(self.generation)
+            self.generation = generation
+        return True
+
+    def get(self, key, generation):
+        with self._lock:
+            if not self._check_generation(generation):
+                self.misses += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, generation, results):
+        with self._lock:
+            if not self._check_generation(generation):
+                return
+            self._entries[key] = (time.monotonic(), results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
@@ -1,12 +1,35 @@
 # search.py
 
+import os
+import time
 import faiss
 import json
 import numpy as np
+import uuid
+import base64
 import logging
+import threading
+import itertools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from sentence_transformers import SentenceTransformer
 from functools import lru_cache
-from .utils import extract_matching_sentences, apply_filters, prepare_text_for_matching
+from .utils import extract_matching_sentences, prepare_text_for_matching
+from .lexical_index import (
+    load_exact_index, find_exact_match_chunks, load_inverted_index, find_all_words_match_chunks,
+    load_normalized_snippets
+)
+from .facets import build_facets, get_filter_bitmap, bitmap_contains, bitmap_to_ids
+from .index_manifest import load_manifest, get_filter_range, manifest_mismatches, MANIFEST_FILENAME
+from .metadata_store import load_metadata_store, metadata_column, metadata_snippet_html
+from .embedding_cache import QueryEmbeddingCache, normalize_query, read_logged_queries
+from .result_cache import ResultCache, index_generation
+from .parallel_scan import ParallelLexicalScanner
+from .micro_batcher import MicroBatcher
+from .onnx_encoder import OnnxQueryEncoder, onnx_encoder_usable
+from .faiss_index_factory import (
+    apply_search_config, make_search_params, get_flat_vectors, exact_top_k, rerank, DEFAULT_RERANK_FACTOR, METRIC_NAMES
+)
 
 # Initialize the logger
 logger = logging.getLogger(__name__)
@@ -19,21 +42,86 @@ logging.basicConfig(
     ]
 )
 
+DEFAULT_MODEL_NAME = 'sentence-transformers/all-mpnet-base-v2'
+
+def use_mmap():
+    """
+    True when INDEX_LOAD_MODE=mmap: index artifacts are memory-mapped read-only
+    instead of read into private memory, so workers on one host share their pages.
+
+    What FAISS can map depends on its version; see read_faiss_index.
+    """
+    return os.getenv('INDEX_LOAD_MODE', 'memory').lower() == 'mmap'
+
+def read_faiss_index(index_path):
+    """
+    Reads the FAISS index at index_path, memory-mapped in mmap load mode where FAISS supports it.
+
+    IO_FLAG_MMAP alone only maps the inverted lists of IVF indexes; the
+    vectors of flat, HNSW and quantized indexes are mapped only by FAISS
+    builds that have IO_FLAG_MMAP_IFC, and are read into private memory
+    otherwise (logged as a warning).
+    """
+    if use_mmap():
+        mmap_codes_flag = getattr(faiss, 'IO_FLAG_MMAP_IFC', None)
+        io_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | (mmap_codes_flag or 0)
+        try:
+            index = faiss.read_index(index_path, io_flags)
+            if mmap_codes_flag is None and faiss.try_extract_index_ivf(index) is None:
+                logger.warning(f"faiss {faiss.__version__} has no IO_FLAG_MMAP_IFC and cannot memory-map "
+                               f"{type(index).__name__} vectors; they were read into private memory.")
+            return index
+        except Exception as e:
+            logger.warning(f"Could not memory-map FAISS index ({e}); reading it into memory.")
+    return faiss.read_index(index_path)
+
 @lru_cache(maxsize=1)
-def load_faiss_index_cached(index_path):
+def load_faiss_index_cached(index_path, generation):
     try:
         logger.info(f"Loading FAISS index from {index_path}")
-        index = faiss.read_index(index_path)
-        logger.info("FAISS index loaded successfully.")
+        index = read_faiss_index(index_path)
+        # Restore the search-time parameters of approximate indexes (IVF nprobe, HNSW efSearch)
+        manifest = load_manifest(os.path.dirname(index_path))
+        if manifest is not None:
+            apply_search_config(index, manifest.get('index'))
+        logger.info(f"FAISS index loaded successfully ({type(index).__name__}).")
         return index
     except Exception as e:
         logger.error(f"Error loading FAISS index: {e}", exc_info=True)
         raise RuntimeError(f"Error loading FAISS index: {e}")
 
 @lru_cache(maxsize=1)
-def load_metadata_cached(metadata_path):
+def load_rerank_vectors_cached(index_path, generation):
+    """
+    Memory-maps the full-precision vectors named by the manifest of a quantized index.
+
+    Returns the vectors and the re-rank factor, or (None, None) if the index is not quantized.
+    """
+    try:
+        index_dir = os.path.dirname(index_path)
+        manifest = load_manifest(index_dir)
+        index_config = (manifest or {}).get('index') or {}
+        if not index_config.get('rerank_vectors'):
+            return None, None
+        vectors_path = os.path.join(index_dir, index_config['rerank_vectors'])
+        if not os.path.exists(vectors_path):
+            logger.warning(f"Re-rank vectors not found at {vectors_path}; using quantized distances.")
+            return None, None
+        logger.info(f"Memory-mapping re-rank vectors from {vectors_path}")
+        return np.load(vectors_path, mmap_mode='r'), index_config.get('rerank_factor', DEFAULT_RERANK_FACTOR)
+    except Exception as e:
+        logger.error(f"Error loading re-rank vectors: {e}", exc_info=True)
+        raise RuntimeError(f"Error loading re-rank vectors: {e}")
+
+@lru_cache(maxsize=1)
+def load_metadata_cached(metadata_path, generation):
     try:
         logger.info(f"Loading metadata from {metadata_path}")
+        metadata = load_metadata_store(os.path.dirname(metadata_path), use_mmap())
+        if metadata is not None:
+            logger.info(f"Columnar metadata store loaded successfully ({len(metadata)} rows, {len(metadata.books)} books).")
+            return metadata
+        logger.warning("Columnar metadata store not found; parsing metadata JSON.")
         with open(metadata_path, 'r', encoding='utf-8') as f:
             metadata = json.load(f)
         logger.info("Metadata loaded successfully.")
@@ -42,9 +130,328 @@ def load_metadata_cached(metadata_path):
         logger.error(f"Error loading metadata: {e}", exc_info=True)
         raise RuntimeError(f"Error loading metadata: {e}")
 
+@lru_cache(maxsize=1)
+def load_normalized_snippets_cached(metadata_path, generation):
+    """
+    Returns the normalized text of every chunk, aligned with the metadata.
+
+    The text is read from the sidecar written by the embedding scripts; for
+    older indexes without it, it is computed once here instead of on every query.
+    """
+    try:
+        metadata = load_metadata_cached(metadata_path, generation)
+        normalized_snippets = load_normalized_snippets(os.path.dirname(metadata_path), use_mmap())
+        if normalized_snippets is not None and len(normalized_snippets) == len(metadata):
+            logger.info("Normalized snippets loaded successfully.")
+            return normalized_snippets
+        logger.warning("Normalized snippets not found or out of date; normalizing metadata snippets.")
+        return [prepare_text_for_matching(snippet) for snippet in metadata_column(metadata, 'snippet')]
+    except Exception as e:
+        logger.error(f"Error loading normalized snippets: {e}", exc_info=True)
+        raise RuntimeError(f"Error loading normalized snippets: {e}")
+
+@lru_cache(maxsize=1)
+def load_priorities_cached(metadata_path, generation):
+    """
+    Returns the book priority of every chunk, used to rank hits without building their metadata dicts.
+    """
+    try:
+        priorities = metadata_column(load_metadata_cached(metadata_path, generation), 'priority')
+        return [0 if priority is None else priority for priority in priorities]
+    except Exception as e:
+        logger.error(f"Error loading chunk priorities: {e}", exc_info=True)
+        raise RuntimeError(f"Error loading chunk priorities: {e}")
+
+@lru_cache(maxsize=1)
+def load_priority_order_cached(metadata_path, generation):
+    """
+    Precomputes the chunk ids in ranking order (descending book priority, then id) and each chunk's rank.
+
+    Book priorities are static, so the lexical stages can walk candidates in
+    this order and stop as soon as top_k results are found.
+    """
+    try:
+        priorities = np.asarray(load_priorities_cached(metadata_path, generation))
+        priority_order = np.argsort(-priorities, kind='stable')
+        priority_rank = np.empty_like(priority_order)
+        priority_rank[priority_order] = np.arange(len(priority_order))
+        return priority_order, priority_rank
+    except Exception as e:
+        logger.error(f"Error computing priority order: {e}", exc_info=True)
+        raise RuntimeError(f"Error computing priority order: {e}")
+
+@lru_cache(maxsize=1)
+def load_parallel_scanner_cached(metadata_path, generation):
+    """
+    Starts the multi-core lexical scan used by stages without an index, when LEXICAL_SCAN_WORKERS > 0.
+    """
+    num_workers = int(os.getenv('LEXICAL_SCAN_WORKERS', 0))
+    if num_workers <= 0:
+        return None
+    try:
+        priority_order, _ = load_priority_order_cached(metadata_path, generation)
+        return ParallelLexicalScanner(load_normalized_snippets_cached(metadata_path, generation), priority_order.tolist(), num_workers)
+    except Exception as e:
+        logger.warning(f"Parallel lexical scan unavailable ({e}); scanning in-process.")
+        return None
+
+@lru_cache(maxsize=1)
+def load_facets_cached(metadata_path, generation):
+    try:
+        logger.info("Building facet bitsets for filtering...")
+        facets = build_facets(load_metadata_cached(metadata_path, generation))
+        logger.info("Facet bitsets built successfully.")
+        return facets
+    except Exception as e:
+        logger.error(f"Error building facet bitsets: {e}", exc_info=True)
+        raise RuntimeError(f"Error building facet bitsets: {e}")
+
+@lru_cache(maxsize=1)
+def load_manifest_cached(index_dir, generation):
+    try:
+        manifest = load_manifest(index_dir)
+        if manifest is None:
+            logger.warning(f"No index manifest found in {index_dir}.")
+        return manifest
+    except Exception as e:
+        logger.error(f"Error loading index manifest: {e}", exc_info=True)
+        raise RuntimeError(f"Error loading index manifest: {e}")
+
+@lru_cache(maxsize=1)
+def load_exact_index_cached(index_dir, generation):
+    try:
+        logger.info(f"Loading exact match index from {index_dir}")
+        exact_index = load_exact_index(index_dir, use_mmap())
+        if exact_index is None:
+            logger.warning("Exact match index not found; exact search will scan all metadata.")
+        else:
+            logger.info("Exact match index loaded successfully.")
+        return exact_index
+    except Exception as e:
+        logger.error(f"Error loading exact match index: {e}", exc_info=True)
+        raise RuntimeError(f"Error loading exact match index: {e}")
+
+@lru_cache(maxsize=1)
+def load_inverted_index_cached(index_dir, generation):
+    try:
+        logger.info(f"Loading inverted index from {index_dir}")
+        inverted_index = load_inverted_index(index_dir, use_mmap())
+        if inverted_index is None:
+            logger.warning("Inverted index not found; all words search will scan all metadata.")
+        else:
+            logger.info("Inverted index loaded successfully.")
+        return inverted_index
+    except Exception as e:
+        logger.error(f"Error loading inverted index: {e}", exc_info=True)
+        raise RuntimeError(f"Error loading inverted index: {e}")
+
+# Loaders of the artifacts of one IndexGeneration, which holds them once it is built
+GENERATION_LOADERS = (
+    load_manifest_cached, load_faiss_index_cached, load_rerank_vectors_cached, load_metadata_cached,
+    load_normalized_snippets_cached, load_priorities_cached, load_priority_order_cached, load_facets_cached,
+    load_exact_index_cached, load_inverted_index_cached, load_parallel_scanner_cached,
+)
+
+def clear_generation_caches():
+    for loader in GENERATION_LOADERS:
+        loader.cache_clear()
+
+def find_artifact_mismatches(index_dir, manifest, index, metadata):
+    """
+    Compares a loaded index and metadata with the pins of their manifest, and returns the mismatches found.
+
+    Artifact sizes are always checked; their checksums only with INDEX_VERIFY_CHECKSUMS=1,
+    since hashing reads every artifact in full (and defeats INDEX_LOAD_MODE=mmap).
+    """
+    try:
+        verify_checksums = os.getenv('INDEX_VERIFY_CHECKSUMS', '0') == '1'
+        problems = manifest_mismatches(manifest, index_dir, index.ntotal, index.d, METRIC_NAMES.get(index.metric_type),
+                                       len(metadata), verify_checksums)
+    except Exception as e:
+        logger.error(f"Error validating index artifacts: {e}", exc_info=True)
+        raise RuntimeError(f"Error validating index artifacts: {e}")
+    if problems:
+        logger.error(f"Index artifacts in {index_dir} do not match: {'; '.join(problems)}")
+    elif manifest is None or 'artifacts' not in manifest:
+        logger.warning(f"Index in {index_dir} has no pinned manifest; rebuild it to validate its artifacts.")
+    else:
+        logger.info(f"Index artifacts match the manifest built at {manifest.get('built_at')}.")
+    return tuple(problems)
+
+def pinned_model_name(manifest, model_name=None):
+    """
+    Returns the model manifest pins, or model_name (by default DEFAULT_MODEL_NAME) for unpinned indexes.
+
+    Raises RuntimeError when model_name is given and is not the pinned model.
+    """
+    pinned = ((manifest or {}).get('model') or {}).get('name')
+    if pinned is None:
+        return model_name or DEFAULT_MODEL_NAME
+    if model_name is not None and model_name != pinned:
+        raise RuntimeError(f"Index was built with '{pinned}'; refusing to query it with '{model_name}'.")
+    return pinned
+
+def manifest_stamp(index_path):
+    return index_generation([os.path.join(os.path.dirname(index_path), MANIFEST_FILENAME)])
+
+class IndexGeneration:
+    def __init__(self, index_path, metadata_path, number):
+        """
+        Loads and validates every artifact of the index at index_path and metadata_path, as generation number.
+
+        A search takes the current generation once and reads all artifacts
+        from it, so swapping in a new generation never changes the artifacts
+        under a running search; the old one is freed when its last search
+        ends. The loader caches only share artifacts between loaders while
+        the generation is built, and are cleared afterwards, so a generation
+        that is rejected or replaced is not kept alive by them.
+        """
+        self.index_path = index_path
+        self.metadata_path = metadata_path
+        self.number = number
+        self.index_dir = os.path.dirname(index_path)
+        # Taken first, so that a rebuild finishing during the load is seen by the next check
+        self.manifest_stamp = manifest_stamp(index_path)
+        self.checked_at = time.monotonic()
+        logger.info(f"Loading index generation {number} from {self.index_dir}")
+        try:
+            self.manifest = load_manifest_cached(self.index_dir, number)
+            self.index = load_faiss_index_cached(index_path, number)
+            self.rerank_vectors, self.rerank_factor = load_rerank_vectors_cached(index_path, number)
+            self.metadata = load_metadata_cached(metadata_path, number)
+            self.normalized_snippets = load_normalized_snippets_cached(metadata_path, number)
+            self.priorities = load_priorities_cached(metadata_path, number)
+            self.priority_order, self.priority_rank = load_priority_order_cached(metadata_path, number)
+            self.facets = load_facets_cached(metadata_path, number)
+            self.exact_index, self.inverted_index, self.scanner = load_lexical_indexes(metadata_path, self.metadata, number)
+            if self.scanner is not None:
+                # Stops the scan workers and frees their shared memory with the generation
+                weakref.finalize(self, self.scanner.close)
+            self.problems = find_artifact_mismatches(self.index_dir, self.manifest, self.index, self.metadata)
+        finally:
+            clear_generation_caches()
+        self.model_name = pinned_model_name(self.manifest)
+        self.loaded_at = time.time()
+
+    def search_model(self, model_name=None):
+        """
+        Refuses artifacts that do not match their manifest, and returns the model to encode queries with.
+        """
+        if self.problems:
+            raise RuntimeError(f"Index artifacts do not match their manifest: {'; '.join(self.problems)}")
+        return pinned_model_name(self.manifest, model_name)
+
+# The generation searches use and the state of its reloads, per (index_path, metadata_path)
+generations = {}
+reload_states = {}
+generations_lock = threading.Lock()
+generation_numbers = itertools.count(1)
+
+def current_generation(index_path, metadata_path):
+    """
+    Returns the index generation new searches use, loading the first one on demand.
+
+    With INDEX_RELOAD_CHECK_INTERVAL set (in seconds), the manifest is checked
+    that often, as searches come in, and a rebuilt index is reloaded in the background.
+    """
+    key = (index_path, metadata_path)
+    generation = generations.get(key)
+    if generation is None:
+        with generations_lock:
+            generation = generations.get(key)
+            if generation is None:
+                generation = IndexGeneration(index_path, metadata_path, next(generation_numbers))
+                generations[key] = generation
+        return generation
+    check_interval = float(os.getenv('INDEX_RELOAD_CHECK_INTERVAL', 0))
+    if check_interval > 0 and time.monotonic() - generation.checked_at >= check_interval:
+        generation.checked_at = time.monotonic()
+        stamp = manifest_stamp(index_path)
+        # A rebuild that failed validation is not retried until the manifest changes again
+        if stamp != generation.manifest_stamp and stamp != reload_states.get(key, {}).get('failed_stamp'):
+            logger.info(f"Index manifest in {generation.index_dir} changed; reloading.")
+            start_index_reload(index_path, metadata_path)
+    return generation
+
+def reload_index(index_path, metadata_path):
+    """
+    Loads a new generation of the index artifacts, validates it and swaps it in.
+
+    Searches already running finish on the generation they started with.
+    Raises RuntimeError, and keeps the current generation, when the new
+    artifacts do not match their manifest.
+    """
+    generation = IndexGeneration(index_path, metadata_path, next(generation_numbers))
+    if generation.problems:
+        raise RuntimeError(f"Index artifacts do not match their manifest: {'; '.join(generation.problems)}")
+    # Load the pinned encoder before the generation takes searches
+    initialize_model_cached(generation.model_name)
+    with generations_lock:
+        previous = generations.get((index_path, metadata_path))
+        generations[(index_path, metadata_path)] = generation
+    logger.info(f"Index generation {generation.number} swapped in"
+                f"{f', replacing generation {previous.number}' if previous else ''}.")
+    return generation
+
+def start_index_reload(index_path, metadata_path):
+    """
+    Runs reload_index() on a background thread; returns False if a reload of this index is already running.
+    """
+    key = (index_path, metadata_path)
+    with generations_lock:
+        state = reload_states.setdefault(key, {'reloading': False, 'last_error': None, 'failed_stamp': None})
+        if state['reloading']:
+            return False
+        state['reloading'] = True
+
+    def run():
+        stamp = manifest_stamp(index_path)
+        try:
+            reload_index(index_path, metadata_path)
+            state.update(last_error=None, failed_stamp=None)
+        except Exception as e:
+            logger.error(f"Index reload failed; still serving the current generation: {e}", exc_info=True)
+            state.update(last_error=str(e), failed_stamp=stamp)
+        finally:
+            state['reloading'] = False
+
+    threading.Thread(target=run, name='index-reload', daemon=True).start()
+    return True
+
+def get_index_status(index_path, metadata_path):
+    """
+    Describes the generation being served and the state of its reloads.
+    """
+    key = (index_path, metadata_path)
+    generation = generations.get(key)
+    state = reload_states.get(key, {})
+    status = {'generation': None, 'reloading': state.get('reloading', False), 'last_error': state.get('last_error')}
+    if generation is not None:
+        status.update({
+            'generation': generation.number,
+            'built_at': (generation.manifest or {}).get('built_at'),
+            'loaded_at': generation.loaded_at,
+            'model_name': generation.model_name,
+            'num_chunks': len(generation.metadata),
+        })
+    return status
+
+@lru_cache(maxsize=4)
+def use_onnx_encoder(model_name):
+    """
+    True when ONNX_ENCODER_DIR holds a usable quantized ONNX export of model_name.
+    """
+    onnx_dir = os.getenv('ONNX_ENCODER_DIR')
+    return bool(onnx_dir) and onnx_encoder_usable(onnx_dir, model_name)
+
 @lru_cache(maxsize=1)
 def initialize_model_cached(model_name='sentence-transformers/all-mpnet-base-v2'):
     try:
+        if use_onnx_encoder(model_name):
+            logger.info(f"Loading ONNX int8 encoder for '{model_name}' from {os.getenv('ONNX_ENCODER_DIR')}")
+            model = OnnxQueryEncoder(os.getenv('ONNX_ENCODER_DIR'), int(os.getenv('ONNX_ENCODER_THREADS', 0)))
+            logger.info("ONNX encoder loaded successfully.")
+            return model
         logger.info(f"Loading SentenceTransformer model '{model_name}'")
         model = SentenceTransformer(model_name)
         logger.info("Model loaded successfully.")
@@ -53,406 +460,885 @@ def initialize_model_cached(model_name='sentence-transformers/all-mpnet-base-v2'
         logger.error(f"Error loading model: {e}", exc_info=True)
         raise RuntimeError(f"Error loading model: {e}")
 
-@lru_cache(maxsize=1024)
-def get_query_embedding_cached(query, model_name='sentence-transformers/all-mpnet-base-v2'):
+def encoder_cache_name(model_name):
+    """
+    Name the query-embedding cache files embeddings under: ONNX embeddings are close to, not equal to, torch ones.
+    """
+    return f"{model_name}#onnx-int8" if use_onnx_encoder(model_name) else model_name
+
+@lru_cache(maxsize=1)
+def load_embedding_cache_cached():
+    """
+    Opens the on-disk query-embedding cache shared by all workers, at QUERY_EMBEDDING_CACHE_PATH.
+
+    Returns None when QUERY_EMBEDDING_CACHE_PATH is not set or the cache
+    cannot be opened; embeddings are then only cached in memory.
+    """
+    cache_path = os.getenv('QUERY_EMBEDDING_CACHE_PATH')
+    if not cache_path:
+        return None
     try:
+        cache = QueryEmbeddingCache(cache_path, int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 100000)))
+        logger.info(f"Query embedding cache opened at {cache_path}")
+        return cache
+    except Exception as e:
+        logger.warning(f"Query embedding cache unavailable ({e}); caching embeddings in memory only.")
+        return None
+
+@lru_cache(maxsize=1)
+def load_result_cache_cached():
+    """
+    Creates the search-result cache, or returns None when RESULT_CACHE_SIZE is 0.
+    """
+    max_entries = int(os.getenv('RESULT_CACHE_SIZE', 1000))
+    if max_entries <= 0:
+        return None
+    ttl = float(os.getenv('RESULT_CACHE_TTL', 3600))
+    logger.info(f"Search result cache enabled ({max_entries} entries, {ttl}s TTL).")
+    return ResultCache(max_entries, ttl)
+
+@lru_cache(maxsize=1)
+def load_search_executor_cached():
+    """
+    Creates the thread pool that runs query encoding and FAISS searches alongside the lexical stages,
+    or returns None when SEARCH_THREADS is 0.
+    """
+    max_workers = int(os.getenv('SEARCH_THREADS', os.cpu_count() or 4))
+    if max_workers <= 0:
+        return None
+    logger.info(f"Search thread pool started with {max_workers} threads.")
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='search')
+
+@lru_cache(maxsize=1)
+def load_batch_search_executor_cached():
+    """
+    Creates the thread pool that runs the FAISS searches of a micro-batch in parallel,
+    or returns None when SEARCH_THREADS is 0.
+
+    It is not the search pool: those threads may be waiting for the micro-batch itself.
+    """
+    max_workers = int(os.getenv('SEARCH_THREADS', os.cpu_count() or 4))
+    if max_workers <= 0:
+        return None
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch-search')
+
+@lru_cache(maxsize=1)
+def load_encoding_batcher_cached():
+    """
+    Creates the scheduler that encodes and searches concurrent semantic queries together,
+    or returns None when ENCODE_BATCH_MAX_WAIT_MS is 0.
+    """
+    max_wait_ms = float(os.getenv('ENCODE_BATCH_MAX_WAIT_MS', 2))
+    if max_wait_ms <= 0:
+        return None
+    max_batch_size = max(1, int(os.getenv('ENCODE_BATCH_SIZE', 16)))
+    logger.info(f"Query encoding micro-batching enabled (up to {max_batch_size} queries, {max_wait_ms} ms wait).")
+    return MicroBatcher(run_semantic_batch, max_batch_size, max_wait_ms / 1000)
+
+@lru_cache(maxsize=1)
+def load_cursor_cache_cached():
+    """
+    Creates the cache of paginated searches that cursors resume from.
+    """
+    max_entries = max(1, int(os.getenv('SEARCH_CURSOR_CACHE_SIZE', 1000)))
+    ttl = float(os.getenv('SEARCH_CURSOR_TTL', 900))
+    logger.info(f"Search cursor cache enabled ({max_entries} entries, {ttl}s TTL).")
+    return ResultCache(max_entries, ttl)
+
+def get_result_cache_stats():
+    cache = load_result_cache_cached()
+    return {'enabled': False} if cache is None else {'enabled': True, **cache.stats()}
+
+def result_cache_key(query, top_k, filters, search_type, model_name, min_snippet_length):
+    return (normalize_query(query), tuple(sorted((filters or {}).items())), search_type, top_k, model_name,
+            min_snippet_length)
+
+def encode_queries(queries, model_name, dim):
+    """
+    Embeds normalized queries, encoding only those missing from the on-disk cache in one batch.
+
+    dim is the dimension of the index searched; cache entries of another
+    dimension are ignored, and RuntimeError is raised if the model encodes
+    another one. Returns {query: (1, dim) float32 embedding}.
+    """
+    cache = load_embedding_cache_cached()
+    cache_name = encoder_cache_name(model_name)
+    embeddings = {}
+    if cache is not None:
+        try:
+            embeddings = cache.get_many(cache_name, dim, queries)
+        except Exception as e:
+            logger.warning(f"Query embedding cache lookup failed: {e}")
+    missing = [query for query in dict.fromkeys(queries) if query not in embeddings]
+    if missing:
         model = initialize_model_cached(model_name)
-        embedding = model.encode([query], convert_to_numpy=True).astype('float32')
-        faiss.normalize_L2(embedding)
-        return embedding
+        encoded = model.encode(missing, convert_to_numpy=True).astype('float32')
+        if encoded.shape[1] != dim:
+            raise RuntimeError(f"Model '{model_name}' encodes {encoded.shape[1]} dimensions but the index has {dim}.")
+        faiss.normalize_L2(encoded)
+        encoded = {query: encoded[i:i + 1] for i, query in enumerate(missing)}
+        embeddings.update(encoded)
+        if cache is not None:
+            try:
+                cache.put_many(cache_name, encoded)
+            except Exception as e:
+                logger.warning(f"Query embedding cache update failed: {e}")
+    return embeddings
+
+@lru_cache(maxsize=1024)
+def get_query_embedding_cached(query, model_name, dim):
+    try:
+        query_key = normalize_query(query)
+        return encode_queries([query_key], model_name, dim)[query_key]
     except Exception as e:
         logger.error(f"Error generating embedding for query '{query}': {e}", exc_info=True)
         raise RuntimeError(f"Error generating embedding for query '{query}': {e}")
 
+def prewarm_query_embedding_cache(log_path, limit, model_name, dim):
+    """
+    Embeds the most frequent queries of the search log that are not in the on-disk cache yet (see encode_queries).
+    """
+    try:
+        if load_embedding_cache_cached() is None:
+            return
+        queries = read_logged_queries(log_path, limit)
+        if queries:
+            encode_queries(queries, model_name, dim)
+            logger.info(f"Query embedding cache prewarmed with {len(queries)} logged queries.")
+    except Exception as e:
+        logger.warning(f"Could not prewarm query embedding cache: {e}")
+
+
+def filter_candidates(candidate_indices, filter_bitmap):
+    """
+    Keeps the candidate row ids that are set in filter_bitmap (all of them if there is no filter).
+    """
+    if filter_bitmap is None or len(candidate_indices) == 0:
+        return candidate_indices
+    return candidate_indices[bitmap_contains(filter_bitmap, candidate_indices)]
+
+def priority_ordered_candidates(candidate_indices, priority_rank):
+    """
+    Orders candidate row ids by descending book priority, keeping id order within a priority.
+    """
+    return candidate_indices[np.argsort(priority_rank[candidate_indices], kind='stable')]
+
+def perform_exact_match_search(query_normalized, normalized_snippets, filter_bitmap, priority_order, priority_rank,
+                               exact_index=None, scanner=None):
+    """
+    Yields the exact-match hits as {'idx', 'category_priority', 'distance'} dicts in ranking order.
 
-def perform_exact_match_search(query_normalized, metadata, filters, min_snippet_length):
+    Hits are produced lazily, so a caller that stops after top_k never scans the rest of the corpus.
+    """
     logger.info("Performing exact match search...")
-    exact_matches = []
-    matched_indices = set()
-    for idx, meta in enumerate(metadata):
-        if apply_filters([meta], filters):
-            snippet_normalized = prepare_text_for_matching(meta['snippet'])
-            if query_normalized in snippet_normalized:
-                snippet = extract_matching_sentences(meta['snippet'], query_normalized)
-                if len(snippet) >= min_snippet_length:
-                    exact_matches.append({
-                        'idx': idx,
-                        'author': meta.get('author', 'Unknown'),
-                        'book_title': meta.get('book_title', 'Unknown'),
-                        'chapter_name': meta.get('chapter_name', 'N/A'),
-                        'file_path': meta.get('file_path', ''),
-                        'group': meta.get('group', 'Unknown'),
-                        'page_number': meta.get('page_number', 'N/A'),
-                        'pdf_url': meta.get('pdf_url', ''),
-                        'priority': meta.get('priority', 0),
-                        'category_priority': 1,
-                        'snippet': snippet,
-                        'distance': 0.0
-                    })
-                    matched_indices.add(idx)
-                    logger.debug(f"Exact match found at index {idx}")
-        else:
-            logger.debug(f"Metadata at index {idx} did not pass filters.")
-    logger.info(f"Exact matches found: {len(exact_matches)}")
-    return exact_matches, matched_indices
+    if exact_index is None and scanner is not None:
+        # Scan the shared-memory partitions on all cores
+        for chunk_ids in scanner.find_exact_match_chunks(query_normalized):
+            for idx in filter_candidates(chunk_ids, filter_bitmap).tolist():
+                yield {'idx': idx, 'category_priority': 1, 'distance': 0.0}
+        return
+    if exact_index is not None:
+        # Only the chunks found through the suffix array need to be checked
+        candidate_indices = filter_candidates(find_exact_match_chunks(query_normalized, *exact_index), filter_bitmap)
+        candidate_indices = priority_ordered_candidates(candidate_indices, priority_rank)
+    else:
+        candidate_indices = filter_candidates(priority_order, filter_bitmap)
+    for idx in candidate_indices.tolist():
+        if exact_index is not None or query_normalized in normalized_snippets[idx]:
+            yield {'idx': idx, 'category_priority': 1, 'distance': 0.0}
 
-def perform_all_words_match_search(query_words_set, metadata, filters, min_snippet_length, exclude_indices):
+def perform_all_words_match_search(query_words_set, normalized_snippets, filter_bitmap, exclude_indices,
+                                   priority_order, priority_rank, inverted_index=None, scanner=None):
+    """
+    Yields the all-words hits (chunks containing every query word) lazily, in ranking order.
+    """
     logger.info("Performing all words match search...")
-    all_words_matches = []
-    matched_indices = set()
-    for idx, meta in enumerate(metadata):
+    if inverted_index is None and scanner is not None:
+        # Scan the shared-memory partitions on all cores
+        for chunk_ids in scanner.find_all_words_match_chunks(query_words_set):
+            for idx in filter_candidates(chunk_ids, filter_bitmap).tolist():
+                if idx not in exclude_indices:
+                    yield {'idx': idx, 'category_priority': 3, 'distance': 0.1}
+        return
+    if inverted_index is not None:
+        # Intersect the posting lists instead of tokenizing every chunk
+        candidate_indices = filter_candidates(find_all_words_match_chunks(query_words_set, *inverted_index), filter_bitmap)
+        candidate_indices = priority_ordered_candidates(candidate_indices, priority_rank)
+    else:
+        candidate_indices = filter_candidates(priority_order, filter_bitmap)
+    for idx in candidate_indices.tolist():
         if idx in exclude_indices:
             continue
-        if apply_filters([meta], filters):
-            snippet_normalized = prepare_text_for_matching(meta['snippet'])
-            snippet_words_set = set(snippet_normalized.split())
-            if query_words_set.issubset(snippet_words_set):
-                snippet = extract_matching_sentences(meta['snippet'], ' '.join(query_words_set))
-                if len(snippet) >= min_snippet_length:
-                    all_words_matches.append({
-                        'idx': idx,
-                        'author': meta.get('author', 'Unknown'),
-                        'book_title': meta.get('book_title', 'Unknown'),
-                        'chapter_name': meta.get('chapter_name', 'N/A'),
-                        'file_path': meta.get('file_path', ''),
-                        'group': meta.get('group', 'Unknown'),
-                        'page_number': meta.get('page_number', 'N/A'),
-                        'pdf_url': meta.get('pdf_url', ''),
-                        'priority': meta.get('priority', 0),
-                        'category_priority': 3,  # Will update if also semantic match
-                        'snippet': snippet,
-                        'distance': 0.1  # Default small distance
-                    })
-                    matched_indices.add(idx)
-                    logger.debug(f"All words match found at index {idx}")
-        else:
-            logger.debug(f"Metadata at index {idx} did not pass filters.")
-    logger.info(f"All words matches found: {len(all_words_matches)}")
-    return all_words_matches, matched_indices
+        if inverted_index is not None or query_words_set.issubset(normalized_snippets[idx].split()):
+            yield {'idx': idx, 'category_priority': 3, 'distance': 0.1}
 
-def perform_semantic_search(query, index, metadata, filters, min_snippet_length, exclude_indices, model_name, top_k):
-    logger.info("Performing semantic search using FAISS...")
-    semantic_matches = []
-    matched_indices = set()
+def search_flat_range(vectors, metric, query_embeddings, k, start, end, filter_bitmap=None):
+    """
+    Exact brute-force search over the full-precision vectors with ids in [start, end).
+
+    Returns distances and indices shaped like index.search, padded with -1.
+    """
+    ids = np.arange(start, end)
+    vectors = vectors[start:end]
+    if filter_bitmap is not None:
+        keep = bitmap_contains(filter_bitmap, ids)
+        vectors, ids = vectors[keep], ids[keep]
+    return exact_top_k(vectors, ids, metric, query_embeddings, k)
+
+def search_without_selector(query_embeddings, index, faiss_k, filter_bitmap, rerank_vectors=None,
+                            rerank_factor=DEFAULT_RERANK_FACTOR):
+    """
+    Filtered search for indexes that take no ID selector (IndexPQ).
+
+    Over-fetches unfiltered and drops the rows outside filter_bitmap before
+    re-ranking. A query left with fewer than faiss_k candidates (a narrow
+    filter) is answered by an exact scan of the filtered rows instead, when
+    the full-precision vectors are available.
+    """
+    num_queries = len(query_embeddings)
+    fetch_k = min(index.ntotal, faiss_k * (rerank_factor if rerank_vectors is not None else DEFAULT_RERANK_FACTOR))
+    candidate_distances, candidate_indices = index.search(query_embeddings, fetch_k)
+    inner_product = index.metric_type == faiss.METRIC_INNER_PRODUCT
+    distances = np.full((num_queries, faiss_k), -np.inf if inner_product else np.inf, dtype='float32')
+    indices = np.full((num_queries, faiss_k), -1, dtype=np.int64)
+    filter_ids = None
+    for i in range(num_queries):
+        keep = candidate_indices[i] >= 0
+        keep[keep] = bitmap_contains(filter_bitmap, candidate_indices[i][keep])
+        row_distances, row_indices = candidate_distances[i][keep], candidate_indices[i][keep]
+        if rerank_vectors is not None:
+            if len(row_indices) < faiss_k:
+                if filter_ids is None:
+                    filter_ids = bitmap_to_ids(filter_bitmap, index.ntotal)
+                row_distances, row_indices = exact_top_k(rerank_vectors[filter_ids], filter_ids, index.metric_type,
+                                                         query_embeddings[i:i + 1], faiss_k)
+            else:
+                row_distances, row_indices = rerank(rerank_vectors, index.metric_type, query_embeddings[i:i + 1],
+                                                    row_indices[None], faiss_k)
+            row_distances, row_indices = row_distances[0], row_indices[0]
+        found = min(faiss_k, len(row_indices))
+        distances[i, :found], indices[i, :found] = row_distances[:found], row_indices[:found]
+    return distances, indices
+
+def search_semantic_candidates(query_embeddings, index, faiss_k, filter_bitmap=None, filter_range=None,
+                               rerank_vectors=None, rerank_factor=DEFAULT_RERANK_FACTOR):
+    """
+    Runs one FAISS search for a batch of query embeddings that share the same filters.
+
+    Returns distances and indices shaped (len(query_embeddings), faiss_k), padded with -1.
+    """
+    num_queries = len(query_embeddings)
+    search_params = None
+    if filter_bitmap is not None:
+        if not filter_bitmap.any():
+            logger.info("No rows pass the filters; skipping FAISS search.")
+            return np.zeros((num_queries, faiss_k), dtype='float32'), np.full((num_queries, faiss_k), -1, dtype=np.int64)
+        # Restrict the scan to the filtered rows so narrow filters still fill top_k
+        selector = faiss.IDSelectorBitmap(len(filter_bitmap), faiss.swig_ptr(filter_bitmap))
+        search_params = make_search_params(index, selector)
+    full_vectors = get_flat_vectors(index)
+    if full_vectors is None:
+        full_vectors = rerank_vectors
+    if filter_range is not None and full_vectors is not None:
+        # The filtered rows live in one contiguous slice: scan only that slice, exactly
+        return search_flat_range(full_vectors, index.metric_type, query_embeddings, faiss_k, *filter_range, filter_bitmap)
+    if filter_bitmap is not None and search_params is None:
+        # The index takes no selector: filter its results instead
+        return search_without_selector(query_embeddings, index, faiss_k, filter_bitmap, rerank_vectors, rerank_factor)
+    if rerank_vectors is not None:
+        # Over-fetch from the quantized index, then rescore against the full-precision vectors
+        _, candidate_indices = index.search(query_embeddings, faiss_k * rerank_factor, params=search_params)
+        reranked = [
+            rerank(rerank_vectors, index.metric_type, query_embeddings[i:i + 1], candidate_indices[i:i + 1], faiss_k)
+            for i in range(num_queries)
+        ]
+        return np.vstack([distances for distances, _ in reranked]), np.vstack([indices for _, indices in reranked])
+    return index.search(query_embeddings, faiss_k, params=search_params)
+
+def find_semantic_hits(query, index, model_name, top_k, filter_bitmap=None, filter_range=None, rerank_vectors=None,
+                       rerank_factor=DEFAULT_RERANK_FACTOR):
+    """
+    Encodes the query and returns the (distances, indices) of its FAISS search, before exclusions.
+
+    With micro-batching enabled the query joins the next batch of concurrent
+    requests (see run_semantic_batch).
+    """
     try:
-        query_embedding = get_query_embedding_cached(query, model_name)
-        # Limit the number of results to retrieve
-        faiss_k = top_k * 5  # Adjust the multiplier as needed
-        distances, indices = index.search(query_embedding, faiss_k)
+        batcher = load_encoding_batcher_cached()
+        if batcher is not None:
+            distances, indices = batcher.submit({
+                'query': query, 'index': index, 'model_name': model_name, 'top_k': top_k,
+                'filter_bitmap': filter_bitmap, 'filter_range': filter_range, 'rerank_vectors': rerank_vectors,
+                'rerank_factor': rerank_factor,
+            }).result()
+        else:
+            query_embedding = get_query_embedding_cached(query, model_name, index.d)
+            # Limit the number of results to retrieve
+            faiss_k = top_k * 5  # Adjust the multiplier as needed
+            distances, indices = search_semantic_candidates(
+                query_embedding, index, faiss_k, filter_bitmap, filter_range, rerank_vectors, rerank_factor
+            )
         logger.info(f"FAISS search completed. Retrieved {len(indices[0])} results.")
+        return distances, indices
     except Exception as e:
         logger.error(f"Error during FAISS search: {e}", exc_info=True)
         raise RuntimeError(f"Error during FAISS search: {e}")
-    for distance, idx in zip(distances[0], indices[0]):
-        if idx in exclude_indices:
+
+def run_semantic_batch(requests):
+    """
+    Answers a micro-batch of find_semantic_hits() requests.
+
+    The queries of each model are encoded in one call (cache misses only),
+    and the requests with the same index, top_k and filters share one
+    nq x d FAISS search; the searches of different groups run in parallel.
+    Returns one (distances, indices) per request, or the exception that
+    failed its encoding or search, so that a failure only reaches the
+    requests it concerns.
+    """
+    query_keys = [normalize_query(request['query']) for request in requests]
+    hits = [None] * len(requests)
+    embeddings = {}
+    # Indexes of different dimensions need embeddings (and cache entries) of their own
+    encoders = [(request['model_name'], request['index'].d) for request in requests]
+    for encoder in set(encoders):
+        positions = [i for i in range(len(requests)) if encoders[i] == encoder]
+        try:
+            embeddings[encoder] = encode_queries([query_keys[i] for i in positions], *encoder)
+        except Exception as e:
+            logger.error(f"Error encoding {len(positions)} queries of a micro-batch: {e}", exc_info=True)
+            for i in positions:
+                hits[i] = e
+
+    groups = {}
+    for i, request in enumerate(requests):
+        if hits[i] is not None:
             continue
-        if idx >= len(metadata):
-            logger.warning(f"FAISS index {idx} out of bounds for metadata length {len(metadata)}")
+        filter_bitmap = request['filter_bitmap']
+        group_key = (id(request['index']), request['model_name'], request['top_k'], request['filter_range'],
+                     None if filter_bitmap is None else filter_bitmap.tobytes())
+        groups.setdefault(group_key, []).append(i)
+
+    def search_group(positions):
+        first = requests[positions[0]]
+        query_embeddings = np.vstack([embeddings[encoders[i]][query_keys[i]] for i in positions])
+        return search_semantic_candidates(
+            query_embeddings, first['index'], first['top_k'] * 5, first['filter_bitmap'], first['filter_range'],
+            first['rerank_vectors'], first['rerank_factor']
+        )
+
+    executor = load_batch_search_executor_cached()
+    group_futures = None
+    if executor is not None and len(groups) > 1:
+        group_futures = [executor.submit(search_group, positions) for positions in groups.values()]
+    for group, positions in enumerate(groups.values()):
+        try:
+            distances, indices = group_futures[group].result() if group_futures else search_group(positions)
+        except Exception as e:
+            logger.error(f"Error during FAISS search for {len(positions)} queries of a micro-batch: {e}", exc_info=True)
+            for i in positions:
+                hits[i] = e
             continue
-        meta = metadata[idx]
-        if apply_filters([meta], filters):
-            snippet = extract_matching_sentences(meta['snippet'], query)
-            if len(snippet) >= min_snippet_length:
-                semantic_matches.append({
-                    'idx': idx,
-                    'author': meta.get('author', 'Unknown'),
-                    'book_title': meta.get('book_title', 'Unknown'),
-                    'chapter_name': meta.get('chapter_name', 'N/A'),
-                    'file_path': meta.get('file_path', ''),
-                    'group': meta.get('group', 'Unknown'),
-                    'page_number': meta.get('page_number', 'N/A'),
-                    'pdf_url': meta.get('pdf_url', ''),
-                    'priority': meta.get('priority', 0),
-                    'category_priority': 4,
-                    'snippet': snippet,
-                    'distance': float(distance)
-                })
-                matched_indices.add(idx)
-                logger.debug(f"Semantic match found at index {idx} with distance {distance}")
-            # Stop if we have enough matches
-            if len(semantic_matches) >= top_k:
-                break
-        else:
-            logger.debug(f"Metadata at index {idx} did not pass filters.")
-    logger.info(f"Semantic matches found: {len(semantic_matches)}")
-    return semantic_matches, matched_indices
+        for row, i in enumerate(positions):
+            hits[i] = (distances[row:row + 1], indices[row:row + 1])
+    logger.info(f"Micro-batch of {len(requests)} semantic queries answered with {len(groups)} FAISS searches.")
+    return hits
+
+def perform_semantic_search(query, index, metadata, filter_bitmap, exclude_indices, model_name, top_k,
+                            filter_range=None, rerank_vectors=None, rerank_factor=DEFAULT_RERANK_FACTOR,
+                            semantic_hits=None):
+    """
+    Returns the FAISS hits outside exclude_indices, nearest first, and their ids.
 
-def perform_semantic_search_old(query, index, metadata, filters, min_snippet_length, exclude_indices, model_name):
+    All top_k * 5 hits are returned, not just top_k: hits whose snippet turns
+    out too short are skipped when rendering, and the next ones take their place.
+    semantic_hits, if given, are this query's (distances, indices) from a batched FAISS search.
+    """
     logger.info("Performing semantic search using FAISS...")
     semantic_matches = []
-    matched_indices = set()
-    try:
-        query_embedding = get_query_embedding_cached(query, model_name)
-        distances, indices = index.search(query_embedding, len(metadata))
-        logger.info(f"FAISS search completed. Retrieved {len(indices[0])} results.")
-    except Exception as e:
-        logger.error(f"Error during FAISS search: {e}", exc_info=True)
-        raise RuntimeError(f"Error during FAISS search: {e}")
-    for distance, idx in zip(distances[0], indices[0]):
+    if semantic_hits is not None:
+        distances, indices = semantic_hits
+    else:
+        distances, indices = find_semantic_hits(query, index, model_name, top_k, filter_bitmap, filter_range,
+                                                rerank_vectors, rerank_factor)
+    for distance, idx in zip(distances[0].tolist(), indices[0].tolist()):
+        if idx < 0:
+            # FAISS pads with -1 when fewer than faiss_k rows pass the filters
+            break
         if idx in exclude_indices:
             continue
         if idx >= len(metadata):
             logger.warning(f"FAISS index {idx} out of bounds for metadata length {len(metadata)}")
             continue
-        meta = metadata[idx]
-        if apply_filters([meta], filters):
-            snippet = extract_matching_sentences(meta['snippet'], query)
-            if len(snippet) >= min_snippet_length:
-                semantic_matches.append({
-                    'idx': idx,
-                    'author': meta.get('author', 'Unknown'),
-                    'book_title': meta.get('book_title', 'Unknown'),
-                    'chapter_name': meta.get('chapter_name', 'N/A'),
-                    'file_path': meta.get('file_path', ''),
-                    'group': meta.get('group', 'Unknown'),
-                    'page_number': meta.get('page_number', 'N/A'),
-                    'pdf_url': meta.get('pdf_url', ''),
-                    'priority': meta.get('priority', 0),
-                    'category_priority': 4,
-                    'snippet': snippet,
-                    'distance': float(distance)
-                })
-                matched_indices.add(idx)
-                logger.debug(f"Semantic match found at index {idx} with distance {distance}")
-        else:
-            logger.debug(f"Metadata at index {idx} did not pass filters.")
+        semantic_matches.append({'idx': idx, 'category_priority': 4, 'distance': distance})
     logger.info(f"Semantic matches found: {len(semantic_matches)}")
-    return semantic_matches, matched_indices
+    return semantic_matches, {match['idx'] for match in semantic_matches}
 
-def search(query, index_path, metadata_path, top_k=50, filters=None, search_type='all',
-           model_name='sentence-transformers/all-mpnet-base-v2', min_snippet_length=10):
-    logger.info(f"Starting search for query: '{query}' with top_k={top_k}, filters={filters}, search_type={search_type}")
+def render_match(match, metadata, highlight_queries, min_snippet_length):
+    """
+    Builds the result dict for one hit, or returns None when its snippet is shorter than min_snippet_length.
 
-    if filters is None:
-        filters = {}
+    highlight_queries maps a category_priority to the text to highlight: the
+    whole phrase for exact matches, every query word otherwise.
+    """
+    meta = metadata[match['idx']]
+    snippet = extract_matching_sentences(meta['snippet'], highlight_queries[match['category_priority']],
+                                         highlight_terms=match['category_priority'] != 1,
+                                         html=metadata_snippet_html(metadata, match['idx']))
+    if len(snippet) < min_snippet_length:
+        return None
+    return {
+        'author': meta.get('author', 'Unknown'),
+        'book_title': meta.get('book_title', 'Unknown'),
+        'chapter_name': meta.get('chapter_name', 'N/A'),
+        'file_path': meta.get('file_path', ''),
+        'group': meta.get('group', 'Unknown'),
+        'page_number': meta.get('page_number', 'N/A'),
+        'pdf_url': meta.get('pdf_url', ''),
+        'priority': meta.get('priority', 0),
+        'category_priority': match['category_priority'],
+        'snippet': snippet,
+        'distance': match['distance']
+    }
 
-    # Load FAISS index and metadata using caching
-    index = load_faiss_index_cached(index_path)
-    metadata = load_metadata_cached(metadata_path)
+def iter_rendered_matches(ranked_matches, metadata, highlight_queries, top_k, min_snippet_length):
+    """
+    Yields (result, match) for ranked hits, in order, until top_k of them have a long enough snippet.
 
-    # Initialize the model using caching
-    model = initialize_model_cached(model_name)
+    Rendering is the only step that reads chunk text, so the cost does not
+    depend on how many chunks matched, and a hit is only rendered once the
+    caller asks for the next result.
+    """
+    if top_k <= 0:
+        return
+    num_results = 0
+    for match in ranked_matches:
+        result = render_match(match, metadata, highlight_queries, min_snippet_length)
+        if result is None:
+            continue
+        yield result, match
+        num_results += 1
+        if num_results >= top_k:
+            return
 
-    # Normalize the query
-    query_normalized = prepare_text_for_matching(query)
-    query_words = query_normalized.split()
-    query_words_set = set(query_words)
+def render_results(ranked_matches, metadata, highlight_queries, top_k, min_snippet_length):
+    """
+    Builds the result dicts for ranked hits, in order, until top_k of them have a long enough snippet.
+    """
+    return [result for result, _ in iter_rendered_matches(ranked_matches, metadata, highlight_queries, top_k,
+                                                          min_snippet_length)]
 
-    combined_results = []
-    matched_indices = set()
-
-    if search_type in ['all', 'exact']:
-        # Perform exact match search
-        exact_matches, exact_matched_indices = perform_exact_match_search(query_normalized, metadata, filters, min_snippet_length)
-        combined_results.extend(exact_matches)
-        matched_indices.update(exact_matched_indices)
-
-        if search_type == 'exact':
-            # Remove 'idx' from results
-            for res in combined_results:
-                res.pop('idx', None)
-            # Sort and return
-            sorted_results = sorted(
-                combined_results,
-                key=lambda x: (
-                    x['category_priority'],
-                    -x['priority'],
-                    x['distance']
-                )
-            )
-            return sorted_results[:top_k]
+def iter_semantic_results(semantic_matches, metadata, highlight_queries, top_k, limit, min_snippet_length, priorities):
+    """
+    Yields (result, match) for up to limit semantic hits, in ranking order.
 
-    if search_type in ['all', 'all_words']:
-        # Perform all words match search
-        all_words_matches, all_words_matched_indices = perform_all_words_match_search(
-            query_words_set, metadata, filters, min_snippet_length, matched_indices
-        )
-        combined_results.extend(all_words_matches)
-        matched_indices.update(all_words_matched_indices)
-
-        if search_type == 'all_words':
-            # Remove 'idx' from results
-            for res in combined_results:
-                res.pop('idx', None)
-            # Sort and return
-            sorted_results = sorted(
-                combined_results,
-                key=lambda x: (
-                    x['category_priority'],
-                    -x['priority'],
-                    x['distance']
-                )
-            )
-            return sorted_results[:top_k]
+    The stage keeps the nearest top_k hits with a long enough snippet and
+    ranks them by (-priority, -distance), ties nearest first. Hits are taken
+    in that order, and a hit is kept if fewer than top_k hits nearer than it
+    have a long snippet. That is always true of the nearest top_k hits;
+    beyond them, the nearer hits are rendered to count.
+    """
+    ranking = sorted(range(len(semantic_matches)), key=lambda position: (
+        -priorities[semantic_matches[position]['idx']], -semantic_matches[position]['distance'], position
+    ))
+    rendered = {}
 
-    if search_type in ['all', 'semantic']:
-        # Perform semantic search
-        semantic_matches, semantic_matched_indices = perform_semantic_search(
-            query, index, metadata, filters, min_snippet_length, matched_indices, model_name, top_k
-        )
+    def render_at(position):
+        if position not in rendered:
+            rendered[position] = render_match(semantic_matches[position], metadata, highlight_queries,
+                                              min_snippet_length)
+        return rendered[position]
 
-        if search_type == 'all':
-            # Update category_priority for all words matches that are also in semantic matches
-            semantic_indices = {res['idx'] for res in semantic_matches}
-            for result in combined_results:
-                if result.get('category_priority') == 3 and result['idx'] in semantic_indices:
-                    result['category_priority'] = 2  # Combined match
-                    # Update distance from semantic match
-                    for sem_result in semantic_matches:
-                        if sem_result['idx'] == result['idx']:
-                            result['distance'] = sem_result['distance']
-                            break
-            # Remove duplicates from semantic matches
-            existing_indices = {res['idx'] for res in combined_results}
-            semantic_matches = [res for res in semantic_matches if res['idx'] not in existing_indices]
-            combined_results.extend(semantic_matches)
-            # Now update matched_indices
-            matched_indices.update(semantic_matched_indices)
-        else:
-            combined_results.extend(semantic_matches)
-            matched_indices.update(semantic_matched_indices)
-
-    # Remove 'idx' from results as it's no longer needed
-    for res in combined_results:
-        res.pop('idx', None)
-
-    # Sort combined results
-    sorted_results = sorted(
-        combined_results,
-        key=lambda x: (
-            x['category_priority'],
-            -x['priority'],
-            -x['distance'] if x['distance'] is not None else float('-inf')
-        )
-    )
+    # semantic_matches[:scanned] are rendered, and num_long of them have a long snippet
+    scanned = num_long = num_results = 0
+    for position in ranking:
+        if num_results >= limit:
+            return
+        # Fewer than top_k hits are nearer than the first top_k, so only later ones need the count
+        if position >= top_k:
+            while scanned < position and num_long < top_k:
+                num_long += render_at(scanned) is not None
+                scanned += 1
+            if position >= scanned and num_long >= top_k:
+                # top_k nearer hits have a long snippet
+                continue
+        result = render_at(position)
+        if result is not None:
+            yield result, semantic_matches[position]
+            num_results += 1
 
+def get_query_embeddings_batch(queries, model_name, dim):
+    """
+    Embeds many queries, encoding the uncached ones in one model.encode call.
 
-    # Return top_k results
-    final_results = sorted_results[:top_k]
-    logger.info(f"Returning combined and sorted results. Total results: {len(final_results)}")
-    return final_results
+    Returns a (len(queries), d) float32 array.
+    """
+    try:
+        query_keys = [normalize_query(query) for query in queries]
+        embeddings = encode_queries(query_keys, model_name, dim)
+        return np.vstack([embeddings[query_key] for query_key in query_keys])
+    except Exception as e:
+        logger.error(f"Error generating embeddings for {len(queries)} queries: {e}", exc_info=True)
+        raise RuntimeError(f"Error generating embeddings for {len(queries)} queries: {e}")
+
+def load_lexical_indexes(metadata_path, metadata, generation):
+    """
+    Returns (exact_index, inverted_index, scanner) for the lexical stages; the indexes are None when missing or stale.
+    """
+    exact_index = load_exact_index_cached(os.path.dirname(metadata_path), generation)
+    if exact_index is not None and len(exact_index[2]) != len(metadata):
+        logger.warning(f"Exact match index covers {len(exact_index[2])} chunks but metadata has {len(metadata)}; ignoring it.")
+        exact_index = None
+    inverted_index = load_inverted_index_cached(os.path.dirname(metadata_path), generation)
+    if inverted_index is not None and inverted_index[3] != len(metadata):
+        logger.warning(f"Inverted index covers {inverted_index[3]} chunks but metadata has {len(metadata)}; ignoring it.")
+        inverted_index = None
+
+    # Stages without an index fall back to a full scan, on all cores if LEXICAL_SCAN_WORKERS is set
+    scanner = None
+    if exact_index is None or inverted_index is None:
+        scanner = load_parallel_scanner_cached(metadata_path, generation)
+    return exact_index, inverted_index, scanner
 
-def search_last(query, index_path, metadata_path, top_k=10, filters=None, search_type='all',
-           model_name='sentence-transformers/all-mpnet-base-v2', min_snippet_length=20):
+def resolve_filters(generation, filters):
+    """
+    Resolves filters to a row bitset, and to a contiguous id range when the manifest records one.
+    """
+    filter_bitmap = get_filter_bitmap(generation.facets, generation.metadata, filters)
+    manifest = generation.manifest
+    filter_range = None
+    if manifest is not None and manifest.get('num_chunks') == len(generation.metadata):
+        filter_range = get_filter_range(manifest.get('layout'), filters)
+    return filter_bitmap, filter_range
+
+def search(query, index_path, metadata_path, top_k=50, filters=None, search_type='all',
+           model_name=None, min_snippet_length=10, semantic_hits=None):
     """
-    Performs a search with options for exact match, all words match, and semantic matching.
+    Returns the results of run_search(), served from the result cache when the same search ran before.
 
-    Parameters:
-    - query (str): The search query.
-    - index_path (str): Path to the FAISS index file.
-    - metadata_path (str): Path to the metadata JSON file.
-    - top_k (int): Number of top results to return.
-    - filters (dict): Filters to apply on the search results.
-    - search_type (str): 'all', 'exact', 'semantic', or 'all_words'.
-    - model_name (str): Name of the SentenceTransformer model to use.
-    - min_snippet_length (int): Minimum length of snippet to include.
+    model_name defaults to the model pinned by the index manifest. Cached
+    results belong to the index generation they were computed on.
+    """
+    generation = current_generation(index_path, metadata_path)
+    model_name = generation.search_model(model_name)
+    cache = load_result_cache_cached()
+    if cache is None:
+        return run_search(query, index_path, metadata_path, top_k, filters, search_type, model_name,
+                          min_snippet_length, semantic_hits, generation)
+    key = result_cache_key(query, top_k, filters, search_type, model_name, min_snippet_length)
+    results = cache.get(key, generation.number)
+    if results is not None:
+        logger.info(f"Returning {len(results)} cached results for query: '{query}'")
+    else:
+        results = run_search(query, index_path, metadata_path, top_k, filters, search_type, model_name,
+                             min_snippet_length, semantic_hits, generation)
+        cache.put(key, generation.number, results)
+    # Callers get their own copies so that the cached results stay intact
+    return [dict(result) for result in results]
+
+# Category of a result, by its category_priority
+CATEGORY_NAMES = {1: 'exact', 3: 'all_words', 4: 'semantic'}
+
+def stream_search(query, index_path, metadata_path, top_k=50, filters=None, search_type='all',
+                  model_name=None, min_snippet_length=10):
+    """
+    Yields (category, results) stage by stage, like iter_search_stages(), sharing search()'s result cache.
+    """
+    generation = current_generation(index_path, metadata_path)
+    model_name = generation.search_model(model_name)
+    cache = load_result_cache_cached()
+    key = result_cache_key(query, top_k, filters, search_type, model_name, min_snippet_length)
+    results = None if cache is None else cache.get(key, generation.number)
+    if results is not None:
+        logger.info(f"Streaming {len(results)} cached results for query: '{query}'")
+        for category_priority, name in CATEGORY_NAMES.items():
+            category_results = [dict(result) for result in results if result['category_priority'] == category_priority]
+            if category_results:
+                yield name, category_results
+        return
+    results = []
+    for category, stage_results in iter_search_stages(query, index_path, metadata_path, top_k, filters, search_type,
+                                                       model_name, min_snippet_length, generation=generation):
+        results.extend(stage_results)
+        yield category, [dict(result) for result in stage_results]
+    if cache is not None:
+        cache.put(key, generation.number, results)
+
+def run_search(query, index_path, metadata_path, top_k=50, filters=None, search_type='all',
+               model_name=None, min_snippet_length=10, semantic_hits=None, generation=None):
+    results = []
+    for _, stage_results in iter_search_stages(query, index_path, metadata_path, top_k, filters, search_type,
+                                               model_name, min_snippet_length, semantic_hits, generation):
+        results.extend(stage_results)
+    logger.info(f"Returning combined and sorted results. Total results: {len(results)}")
+    return results
+
+def iter_search_stages(query, index_path, metadata_path, top_k=50, filters=None, search_type='all',
+                       model_name=None, min_snippet_length=10, semantic_hits=None, generation=None):
+    """
+    Runs a search stage by stage, yielding (category, results) as soon as each stage is rendered.
 
-    Returns:
-    - List of search results containing metadata and relevance scores.
+    Categories come in ranking order ('exact', 'all_words', 'semantic'), so
+    the concatenated results are those of run_search(). The lexical stages
+    do not need the model, so their results are out before the query is encoded.
+    """
+    stage_results = []
+    search_results = iter_search_results(query, index_path, metadata_path, top_k, filters, search_type, model_name,
+                                         min_snippet_length, semantic_hits, generation)
+    try:
+        for category, result, _ in search_results:
+            if result is None:
+                yield category, stage_results
+                stage_results = []
+            else:
+                stage_results.append(result)
+    finally:
+        search_results.close()
+
+def iter_search_results(query, index_path, metadata_path, top_k=50, filters=None, search_type='all',
+                        model_name=None, min_snippet_length=10, semantic_hits=None, generation=None):
+    """
+    Runs a search lazily, yielding (category, result, match) for each result in ranking order.
+
+    (category, None, None) marks the end of each stage that ran. A result is
+    only rendered when the caller asks for it, so a caller that stops early
+    (see search_page) renders no more than it returns. Every stage reads the
+    same index generation (by default the current one).
     """
     logger.info(f"Starting search for query: '{query}' with top_k={top_k}, filters={filters}, search_type={search_type}")
 
     if filters is None:
         filters = {}
 
-    # Load FAISS index and metadata using caching
-    index = load_faiss_index_cached(index_path)
-    metadata = load_metadata_cached(metadata_path)
+    # Take the FAISS index and metadata from one generation, and refuse them if they do not match the manifest
+    if generation is None:
+        generation = current_generation(index_path, metadata_path)
+    model_name = generation.search_model(model_name)
+    index = generation.index
+    rerank_vectors, rerank_factor = generation.rerank_vectors, generation.rerank_factor
+    metadata = generation.metadata
+    normalized_snippets = generation.normalized_snippets
+    exact_index, inverted_index, scanner = generation.exact_index, generation.inverted_index, generation.scanner
 
-    # Initialize the model using caching
-    model = initialize_model_cached(model_name)
+    # Resolve the filters to a row bitset once for all stages
+    filter_bitmap, filter_range = resolve_filters(generation, filters)
 
     # Normalize the query
     query_normalized = prepare_text_for_matching(query)
     query_words = query_normalized.split()
     query_words_set = set(query_words)
 
-    combined_results = []
-    matched_indices = set()
-
-    if search_type in ['all', 'exact']:
-        # Perform exact match search
-        exact_matches, exact_matched_indices = perform_exact_match_search(query_normalized, metadata, filters, min_snippet_length)
-        combined_results.extend(exact_matches)
-        matched_indices.update(exact_matched_indices)
-
-        if search_type == 'exact':
-            # Remove 'idx' from results
-            for res in combined_results:
-                res.pop('idx', None)
-            # Sort and return
-            sorted_results = sorted(
-                combined_results,
-                key=lambda x: (
-                    x['category_priority'],
-                    -x['priority'],
-                    x['distance']
-                )
+    # The model forward pass and FAISS release the GIL, so the semantic stage's
+    # encoding and search run on the shared pool while the lexical stages scan.
+    # Only the exclusion of lexical hits has to wait for them.
+    semantic_future = None
+    executor = load_search_executor_cached()
+    if search_type == 'all' and semantic_hits is None and executor is not None:
+        semantic_future = executor.submit(find_semantic_hits, query, index, model_name, top_k, filter_bitmap,
+                                          filter_range, rerank_vectors, rerank_factor)
+    try:
+        # The hits behind the results so far; later stages exclude them (and only them, not hits dropped for a short snippet)
+        accepted_matches = []
+        # Candidates are ranked as ids and scores; only the top_k survivors get a snippet
+        priority_order, priority_rank = generation.priority_order, generation.priority_rank
+        highlight_queries = {1: query_normalized, 3: ' '.join(query_words_set), 4: query}
+
+        # Categories rank strictly (exact, then all words, then semantic), and the
+        # lexical stages yield their hits in priority order: once top_k results are
+        # rendered, the remaining candidates and stages cannot change the answer.
+        if search_type in ['all', 'exact']:
+            # Perform exact match search
+            exact_matches = perform_exact_match_search(
+                query_normalized, normalized_snippets, filter_bitmap, priority_order, priority_rank, exact_index, scanner
             )
-            return sorted_results[:top_k]
+            for result, match in iter_rendered_matches(exact_matches, metadata, highlight_queries, top_k,
+                                                       min_snippet_length):
+                accepted_matches.append(match)
+                yield 'exact', result, match
+            logger.info(f"Exact matches returned: {len(accepted_matches)}")
+            yield 'exact', None, None
+            if search_type == 'exact' or len(accepted_matches) >= top_k:
+                return
 
-    if search_type in ['all', 'all_words']:
-        # Perform all words match search
-        all_words_matches, all_words_matched_indices = perform_all_words_match_search(
-            query_words_set, metadata, filters, min_snippet_length, matched_indices
-        )
-        combined_results.extend(all_words_matches)
-        matched_indices.update(all_words_matched_indices)
-
-        if search_type == 'all_words':
-            # Remove 'idx' from results
-            for res in combined_results:
-                res.pop('idx', None)
-            # Sort and return
-            sorted_results = sorted(
-                combined_results,
-                key=lambda x: (
-                    x['category_priority'],
-                    -x['priority'],
-                    x['distance']
+        if search_type in ['all', 'all_words']:
+            # Perform all words match search
+            all_words_matches = perform_all_words_match_search(
+                query_words_set, normalized_snippets, filter_bitmap, {match['idx'] for match in accepted_matches},
+                priority_order, priority_rank, inverted_index, scanner
+            )
+            num_lexical = len(accepted_matches)
+            for result, match in iter_rendered_matches(all_words_matches, metadata, highlight_queries,
+                                                       top_k - num_lexical, min_snippet_length):
+                accepted_matches.append(match)
+                yield 'all_words', result, match
+            logger.info(f"All words matches returned: {len(accepted_matches) - num_lexical}")
+            yield 'all_words', None, None
+            if search_type == 'all_words' or len(accepted_matches) >= top_k:
+                return
+
+        if search_type in ['all', 'semantic']:
+            # Both lexical stages ran to completion, so accepted_matches holds every lexical result
+            if semantic_future is not None:
+                semantic_hits = semantic_future.result()
+            semantic_matches, _ = perform_semantic_search(
+                query, index, metadata, filter_bitmap, {match['idx'] for match in accepted_matches}, model_name,
+                top_k, filter_range, rerank_vectors, rerank_factor, semantic_hits
+            )
+            num_lexical = len(accepted_matches)
+            for result, match in iter_semantic_results(semantic_matches, metadata, highlight_queries, top_k,
+                                                       top_k - num_lexical, min_snippet_length, generation.priorities):
+                accepted_matches.append(match)
+                yield 'semantic', result, match
+            yield 'semantic', None, None
+    finally:
+        # Not needed when the lexical stages alone filled top_k
+        if semantic_future is not None:
+            semantic_future.cancel()
+
+def search_batch(requests, index_path, metadata_path, model_name=None, min_snippet_length=10):
+    """
+    Runs many searches at once.
+
+    Each request is a dict with 'query' and optional 'top_k', 'filters' and
+    'search_type' (same defaults as search()). All semantic queries are
+    encoded in one model.encode call, and queries sharing the same filters
+    and top_k are answered by one nq x d FAISS search; the lexical stages
+    then run per query. Returns one result list per request, in order.
+    """
+    logger.info(f"Starting batch search for {len(requests)} queries")
+    generation = current_generation(index_path, metadata_path)
+    model_name = generation.search_model(model_name)
+    index = generation.index
+    rerank_vectors, rerank_factor = generation.rerank_vectors, generation.rerank_factor
+
+    # Queries answered from the result cache skip the batched encoding and FAISS search
+    cache = load_result_cache_cached()
+    cache_keys = [
+        result_cache_key(request['query'], request.get('top_k', 50), request.get('filters'),
+                         request.get('search_type', 'all'), model_name, min_snippet_length)
+        for request in requests
+    ]
+    cached_results = [None if cache is None else cache.get(key, generation.number) for key in cache_keys]
+
+    semantic_positions = [
+        i for i, request in enumerate(requests)
+        if cached_results[i] is None and request.get('search_type', 'all') in ['all', 'semantic']
+    ]
+    semantic_hits = {}
+    if semantic_positions:
+        unique_queries = list(dict.fromkeys(requests[i]['query'] for i in semantic_positions))
+        embeddings = get_query_embeddings_batch(unique_queries, model_name, index.d)
+        embedding_rows = {query: row for row, query in enumerate(unique_queries)}
+
+        # Queries with the same filters and top_k share one FAISS search
+        groups = {}
+        for i in semantic_positions:
+            filters = requests[i].get('filters') or {}
+            group_key = (tuple(sorted(filters.items())), requests[i].get('top_k', 50))
+            groups.setdefault(group_key, []).append(i)
+        try:
+            for (filter_items, top_k), positions in groups.items():
+                filter_bitmap, filter_range = resolve_filters(generation, dict(filter_items))
+                query_embeddings = embeddings[[embedding_rows[requests[i]['query']] for i in positions]]
+                distances, indices = search_semantic_candidates(
+                    query_embeddings, index, top_k * 5, filter_bitmap, filter_range, rerank_vectors, rerank_factor
                 )
+                for row, i in enumerate(positions):
+                    semantic_hits[i] = (distances[row:row + 1], indices[row:row + 1])
+            logger.info(f"Batched FAISS search completed: {len(semantic_positions)} queries in {len(groups)} searches.")
+        except Exception as e:
+            logger.error(f"Error during batched FAISS search: {e}", exc_info=True)
+            raise RuntimeError(f"Error during batched FAISS search: {e}")
+
+    batch_results = []
+    for i, request in enumerate(requests):
+        results = cached_results[i]
+        if results is None:
+            results = run_search(
+                request['query'], index_path, metadata_path,
+                top_k=request.get('top_k', 50),
+                filters=request.get('filters'),
+                search_type=request.get('search_type', 'all'),
+                model_name=model_name,
+                min_snippet_length=min_snippet_length,
+                semantic_hits=semantic_hits.get(i),
+                generation=generation
             )
-            return sorted_results[:top_k]
+            if cache is not None:
+                cache.put(cache_keys[i], generation.number, results)
+        batch_results.append([dict(result) for result in results])
+    return batch_results
 
-    if search_type in ['all', 'semantic']:
-        # Perform semantic search
-        semantic_matches, semantic_matched_indices = perform_semantic_search(
-            query, index, metadata, filters, min_snippet_length, matched_indices, model_name
-        )
-        #matched_indices.update(semantic_matched_indices)
-
-        if search_type == 'all':
-            # Update category_priority for all words matches that are also in semantic matches
-            semantic_indices = {res['idx'] for res in semantic_matches}
-            for result in combined_results:
-                if result.get('category_priority') == 3 and result['idx'] in semantic_indices:
-                    result['category_priority'] = 2  # Combined match
-                    # Update distance from semantic match
-                    for sem_result in semantic_matches:
-                        if sem_result['idx'] == result['idx']:
-                            result['distance'] = sem_result['distance']
-                            break
-            # Remove duplicates from semantic matches
-            semantic_matches = [res for res in semantic_matches if res['idx'] not in matched_indices]
-            combined_results.extend(semantic_matches)
-        else:
-            combined_results.extend(semantic_matches)
-
-    # Remove 'idx' from results as it's no longer needed
-    for res in combined_results:
-        res.pop('idx', None)
-
-    # Sort combined results
-    sorted_results = sorted(
-        combined_results,
-        key=lambda x: (
-            x['category_priority'],
-            -x['priority'],
-            x['distance'] if x['distance'] is not None else float('inf')
-        )
-    )
+def encode_cursor(search_id, offset):
+    payload = json.dumps({'search_id': search_id, 'offset': offset}).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return str(payload['search_id']), int(payload['offset'])
+    except Exception as e:
+        raise ValueError(f"Malformed search cursor: {e}")
+
+def search_page(query, index_path, metadata_path, page_size, top_k=50, filters=None, search_type='all',
+                model_name=None, min_snippet_length=10, cursor=None):
+    """
+    Returns one page of a search as (results, next_cursor).
+
+    Without a cursor the search starts, and runs only far enough to render
+    the first page_size results (see iter_search_results); the running search
+    is kept in the cursor cache with the hits behind the results so far. With
+    a cursor (query, filters and the other parameters are then taken from
+    the first call) the search resumes from there to render the next page;
+    hits an earlier call already accepted are rendered again from their ids.
+    The pages add up to the results of search(); next_cursor is None after
+    the last one. Raises ValueError for a malformed cursor and LookupError
+    for one that expired or whose index was reloaded since.
+    """
+    cache = load_cursor_cache_cached()
+    generation = current_generation(index_path, metadata_path)
+    if cursor is None:
+        search_id, offset = uuid.uuid4().hex, 0
+        logger.info(f"Starting paginated search for query: '{query}' with top_k={top_k}, page_size={page_size}, "
+                    f"filters={filters}, search_type={search_type}")
+        search_results = iter_search_results(query, index_path, metadata_path, top_k, filters, search_type,
+                                             model_name, min_snippet_length, generation=generation)
+        state = {
+            'query': query, 'min_snippet_length': min_snippet_length, 'candidates': [],
+            'pending': ((result, match) for _, result, match in search_results if result is not None),
+            'lock': threading.Lock(),
+        }
+        cache.put(search_id, generation.number, state)
+    else:
+        search_id, offset = decode_cursor(cursor)
+        state = cache.get(search_id, generation.number)
+        if state is None:
+            raise LookupError("Search cursor expired; run the search again.")
+
+    with state['lock']:
+        if state.get('failed'):
+            raise LookupError("Search cursor expired; run the search again.")
+        candidates = state['candidates']
+        query_normalized = prepare_text_for_matching(state['query'])
+        highlight_queries = {1: query_normalized, 3: ' '.join(set(query_normalized.split())), 4: state['query']}
+        # Every accepted hit had a long enough snippet, so each one renders to a result
+        results = render_results(iter(candidates[offset:offset + page_size]), generation.metadata, highlight_queries,
+                                 page_size, state['min_snippet_length'])
+        # Resume the search for the rest of the page, and one hit beyond it to tell whether another page follows
+        while state['pending'] is not None and len(candidates) <= offset + page_size:
+            try:
+                result, match = next(state['pending'])
+            except StopIteration:
+                state['pending'] = None
+                break
+            except Exception:
+                # A generator cannot resume after raising; the later pages of this search are lost
+                state['pending'], state['failed'] = None, True
+                raise
+            if offset <= len(candidates) < offset + page_size:
+                results.append(result)
+            candidates.append(match)
+        offset += len(results)
 
-    # Return top_k results
-    final_results = sorted_results[:top_k]
-    logger.info(f"Returning combined and sorted results. Total results: {len(final_results)}")
-    return final_results
+    next_cursor = encode_cursor(search_id, offset) if offset < len(candidates) else None
+    logger.info(f"Returning page of {len(results)} results ({offset} of {len(candidates)} so far).")
+    return results, next_cursor
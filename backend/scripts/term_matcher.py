@@ -0,0 +1,78 @@
+# term_matcher.py
+"""
+Aho-Corasick automaton over the terms of a query.
+
+A query is compiled once into an automaton over its normalized words and
+the whole normalized phrase. One scan of a normalized text then reports
+every occurrence of every term, however many terms the query has. The
+same occurrences select the snippet lines to show and give the spans to
+highlight, either per word or for the whole phrase.
+"""
+
+from collections import deque
+
+
+def is_word_char(char):
+    # Same definition as \w in str regular expressions
+    return char.isalnum() or char == '_'
+
+
+class TermAutomaton:
+    def __init__(self, terms):
+        """
+        Builds the automaton over the non-empty terms, as a full transition table.
+        """
+        self.terms = sorted({term for term in terms if term})
+        goto = [{}]
+        outputs = [()]
+        for term in self.terms:
+            state = 0
+            for char in term:
+                if char not in goto[state]:
+                    goto.append({})
+                    outputs.append(())
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            outputs[state] += (term,)
+
+        # Breadth-first, so the failure state of every state is complete before its children need it
+        fail = [0] * len(goto)
+        transitions = [None] * len(goto)
+        transitions[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            transitions[state] = {**transitions[fail[state]], **goto[state]}
+            for char, child in goto[state].items():
+                fail[child] = transitions[fail[state]].get(char, 0) if state else 0
+                outputs[child] += outputs[fail[child]]
+                queue.append(child)
+        self._transitions = transitions
+        self._outputs = outputs
+
+    def finditer(self, text):
+        """
+        Yields (start, end, term) for every occurrence of every term in text, including overlapping ones.
+        """
+        transitions, outputs = self._transitions, self._outputs
+        state = 0
+        for position, char in enumerate(text, 1):
+            state = transitions[state].get(char, 0)
+            for term in outputs[state]:
+                yield position - len(term), position, term
+
+
+def whole_word_spans(text, occurrences):
+    """
+    Keeps the occurrences that \\b...\\b would match, leftmost-longest and without overlaps.
+    """
+    spans = []
+    for start, end, _ in sorted(occurrences, key=lambda occurrence: (occurrence[0], -occurrence[1])):
+        if spans and start < spans[-1][1]:
+            continue
+        before = start > 0 and is_word_char(text[start - 1])
+        after = end < len(text) and is_word_char(text[end])
+        if before == is_word_char(text[start]) or after == is_word_char(text[end - 1]):
+            continue
+        spans.append((start, end))
+    return spans
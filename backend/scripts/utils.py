@@ -1,8 +1,16 @@
 import logging
 import re
-import bleach
-from nltk.tokenize import sent_tokenize
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate
 import unicodedata 
+# Imported both from the scripts package (search.py) and as a top-level module (index builders)
+try:
+    from .term_matcher import TermAutomaton, whole_word_spans
+    from .metadata_store import render_snippet_html, html_offsets
+except ImportError:
+    from term_matcher import TermAutomaton, whole_word_spans
+    from metadata_store import render_snippet_html, html_offsets
 
 
 # Configure Logging
@@ -15,38 +23,39 @@ logging.basicConfig(
     ]
 )
 
+# Replace specific ligature characters
+LIGATURES = {
+    'ﬁ': 'fi',
+    'ﬂ': 'fl',
+    'ﬀ': 'ff',
+    'ﬃ': 'ffi',
+    'ﬄ': 'ffl',
+    'ﬅ': 'st',
+    'ﬆ': 'st',
+    '\ufb01': 'fi',
+    '\ufb02': 'fl',
+}
+# Replace curly quotes and other special characters
+CURLY_QUOTES = {
+    '“': '"',
+    '”': '"',
+    '‘': "'",
+    '’': "'",   # This replaces curly apostrophe with straight apostrophe
+    '–': '-',   # En dash
+    '—': '-',   # Em dash
+    '…': '...', # Ellipsis
+    '′': "'",   # Prime
+    '″': '"',   # Double Prime
+}
+
 def normalize_text(text):
     """
     Normalize Unicode characters and replace special characters.
     """
     text = unicodedata.normalize('NFKC', text)
-    # Replace specific ligature characters
-    ligatures = {
-        'ﬁ': 'fi',
-        'ﬂ': 'fl',
-        'ﬀ': 'ff',
-        'ﬃ': 'ffi',
-        'ﬄ': 'ffl',
-        'ﬅ': 'st',
-        'ﬆ': 'st',
-        '\ufb01': 'fi',
-        '\ufb02': 'fl',
-    }
-    for ligature, replacement in ligatures.items():
+    for ligature, replacement in LIGATURES.items():
         text = text.replace(ligature, replacement)
-    # Replace curly quotes and other special characters
-    curly_quotes = {
-        '“': '"',
-        '”': '"',
-        '‘': "'",
-        '’': "'",   # This replaces curly apostrophe with straight apostrophe
-        '–': '-',   # En dash
-        '—': '-',   # Em dash
-        '…': '...', # Ellipsis
-        '′': "'",   # Prime
-        '″': '"',   # Double Prime
-    }
-    for curly, straight in curly_quotes.items():
+    for curly, straight in CURLY_QUOTES.items():
         text = text.replace(curly, straight)
     return text
 
@@ -60,183 +69,209 @@ def prepare_text_for_matching(text):
     return text.lower()
 
 
+# Runs of printable ASCII (unchanged by normalize_text), of whitespace, and of anything else
+ASCII_RUN = re.compile(r'[\x21-\x7e]+')
+WHITESPACE_RUN = re.compile(r'\s+')
+NON_WHITESPACE_RUN = re.compile(r'\S+')
+
+
+def normalize_with_offsets(text):
+    """
+    prepare_text_for_matching, also returning an offset map back to the original text.
+
+    The map is a list of segments (normalized_start, original_start, original_end, one_to_one),
+    ordered by normalized_start. Printable ASCII maps one to one; a character that NFKC or a
+    ligature replacement expands, and a collapsed run of whitespace, map as a whole.
+    """
+    pieces, segments = [], []
+    length = 0  # Length of the normalized text so far
+    space = None  # Span of the whitespace run waiting to be emitted as one space
+
+    def emit(normalized, start, end, one_to_one):
+        nonlocal length, space
+        if space is not None and pieces:
+            # A whitespace run becomes one space between words, and is dropped at the start
+            pieces.append(' ')
+            segments.append((length, space[0], space[1], False))
+            length += 1
+        space = None
+        pieces.append(normalized)
+        segments.append((length, start, end, one_to_one))
+        length += len(normalized)
+
+    if text.isascii():
+        # Only whitespace changes: words map one to one, and each gap becomes one space
+        runs = [run.span() for run in NON_WHITESPACE_RUN.finditer(text)]
+        normalized_starts = accumulate((end - start + 1 for start, end in runs[:-1]), initial=0)
+        segments = [(normalized_start, start, end, True) for normalized_start, (start, end) in zip(normalized_starts, runs)]
+        return ' '.join(text[start:end] for start, end in runs).lower(), segments
+
+    pos, text_length = 0, len(text)
+    while pos < text_length:
+        run = WHITESPACE_RUN.match(text, pos)
+        if run:
+            if space is None:
+                space = run.span()
+            pos = run.end()
+            continue
+        run = ASCII_RUN.match(text, pos)
+        end = run.end() if run else pos
+        # A combining mark composes with the character before it, so they are normalized together
+        if run and end < text_length and unicodedata.combining(text[end]):
+            end -= 1
+        if end > pos:
+            emit(text[pos:end], pos, end, True)
+            pos = end
+            continue
+        end = pos + 1
+        while end < text_length and unicodedata.combining(text[end]):
+            end += 1
+        for char in normalize_text(text[pos:end]):
+            if char.isspace():
+                if space is None:
+                    space = (pos, end)
+                continue
+            emit(char, pos, end, False)
+        pos = end
+    normalized = ''.join(pieces)
+    lowered = normalized.lower()
+    if len(lowered) != len(normalized):
+        # A few characters lowercase to more than one character, which shifts the segments after them
+        shifted, shift = [], 0
+        for index, (start, original_start, original_end, one_to_one) in enumerate(segments):
+            next_start = segments[index + 1][0] if index + 1 < len(segments) else len(normalized)
+            width = len(normalized[start:next_start].lower())
+            shifted.append((start + shift, original_start, original_end, one_to_one and width == next_start - start))
+            shift += width - (next_start - start)
+        segments = shifted
+    return lowered, segments
+
+
+def original_span(segments, start, end):
+    """
+    Maps the normalized span [start, end) to the span of original text it was produced from.
+    """
+    first = segments[bisect_right(segments, (start, float('inf'))) - 1]
+    last = segments[bisect_right(segments, (end - 1, float('inf'))) - 1]
+    original_start = first[1] + (start - first[0]) if first[3] else first[1]
+    original_end = last[1] + (end - last[0]) if last[3] else last[2]
+    return original_start, original_end
+
+
+@lru_cache(maxsize=1024)
+def compile_query_matcher(query):
+    """
+    Compiles the pattern that highlights the normalized query as a whole word sequence.
+    """
+    return re.compile(r'\b' + re.escape(prepare_text_for_matching(query)) + r'\b', flags=re.IGNORECASE)
+
+
+def mark_spans(text, spans, start=0, end=None):
+    """
+    Returns text[start:end] with every (sorted, non-overlapping) original span inside it wrapped in <mark>.
+    """
+    end = len(text) if end is None else end
+    pieces = []
+    position = start
+    for span_start, span_end in spans:
+        if span_start < position or span_end > end:
+            continue
+        pieces.extend((text[position:span_start], '<mark>', text[span_start:span_end], '</mark>'))
+        position = span_end
+    pieces.append(text[position:end])
+    return ''.join(pieces)
+
+
+def highlight_matches(text, normalized, segments, matcher):
+    """
+    Wraps every match of matcher in the normalized text with <mark>, in one pass over the original text.
+    """
+    spans = [original_span(segments, *match.span()) for match in matcher.finditer(normalized) if match.end() > match.start()]
+    return mark_spans(text, spans) if spans else text
+
+
 def highlight_query(text, query):
     """
     Highlights exact matches of the query in the text.
     """
-    # Normalize text and query
-    normalized_text = prepare_text_for_matching(text)
-    normalized_query = prepare_text_for_matching(query)
-    
-    # Escape special characters in the query and add word boundaries
-    query_regex = r'\b' + re.escape(normalized_query) + r'\b'
-    
-    # Find all matches in the normalized text
-    matches = list(re.finditer(query_regex, normalized_text, flags=re.IGNORECASE))
-    
-    # Offset to adjust positions due to added <mark> tags
-    offset = 0
-    original_text = text
-    
-    for match in matches:
-        start, end = match.span()
-        # Adjust positions based on previous replacements
-        start += offset
-        end += offset
-        
-        # Extract the original text corresponding to the matched span
-        original_text_span = original_text[start:end]
-        
-        # Replace the original text with highlighted text
-        highlighted_span = f"<mark>{original_text_span}</mark>"
-        
-        # Update the text with the highlighted span
-        original_text = original_text[:start] + highlighted_span + original_text[end:]
-        
-        # Update the offset
-        offset += len(highlighted_span) - (end - start)
-    
-    return original_text
+    return highlight_matches(text, *normalize_with_offsets(text), compile_query_matcher(query))
 
 
-def extract_matching_sentences(text, query, max_lines=10, min_chars=200, max_chars=500):
-    lines = text.split('\n')
+@lru_cache(maxsize=1024)
+def compile_query_automaton(query):
+    """
+    Returns (normalized query, its words, the automaton over the words and the whole phrase).
+    """
     normalized_query = prepare_text_for_matching(query)
-    found_indices = []
-    
-    # Modified search logic
-    for i, line in enumerate(lines):
-        line_normalized = prepare_text_for_matching(line)
-        # Check if the entire normalized query appears in the normalized line
-        if normalized_query in line_normalized:
-            found_indices.append(i)
-        # As a fallback, check for individual words
-        elif any(word in line_normalized for word in normalized_query.split()):
-            found_indices.append(i)
-            
-    if found_indices:
-        start = max(0, found_indices[0] - 5)
-        end = min(len(lines), found_indices[-1] + 6)
-        context_lines = lines[start:end]
-        highlighted_lines = [highlight_query(line, query) for line in context_lines]
-        snippet = '\n'.join(highlighted_lines)
-        
-        # Ensure snippet meets min_chars requirement
-        if len(snippet) < min_chars:
-            start = max(0, start - 5)
-            end = min(len(lines), end + 5)
-            context_lines = lines[start:end]
-            highlighted_lines = [highlight_query(line, query) for line in context_lines]
-            snippet = '\n'.join(highlighted_lines)
-    else:
-        # If no matching line is found, return the beginning of the text
-        snippet = text[:max_chars]
-        snippet = highlight_query(snippet, query)
-        
-    # Replace newlines with '<br/>'
-    snippet = snippet.replace('\n', '<br/>')
-    # Allow only <br> and <mark> tags
-    allowed_tags = ['br', 'mark']
-    snippet = bleach.clean(snippet, tags=allowed_tags, strip=True)
-    # Truncate to max_chars
-    snippet = snippet[:max_chars]
-    return snippet
+    query_words = normalized_query.split()
+    return normalized_query, frozenset(query_words), TermAutomaton(query_words + [normalized_query])
 
 
-def extract_matching_sentences_last(text, query, max_lines=10, min_chars=200, max_chars=500):
+def extract_matching_sentences(text, query, max_lines=10, min_chars=200, max_chars=500, highlight_terms=False,
+                               html=None):
+    """
+    Returns the lines around the query matches in text as HTML, highlighted with <mark>.
+
+    Lines are selected when they contain any query word. The whole query phrase is
+    highlighted, or every query word when highlight_terms is set. html is the text
+    already rendered by render_snippet_html (prebuilt in the metadata store); the
+    <mark> tags are inserted into it at mapped offsets, so no HTML is parsed here.
+    """
     lines = text.split('\n')
-    query_words = prepare_text_for_matching(query).split()
-    found_indices = []
-    for i, line in enumerate(lines):
-        line_normalized = prepare_text_for_matching(line)
-        if all(word in line_normalized for word in query_words):
-            found_indices.append(i)
-            # Don't break here; we may want multiple matches
-        elif any(word in line_normalized for word in query_words):
-            found_indices.append(i)
+    line_starts = list(accumulate((len(line) + 1 for line in lines[:-1]), initial=0))
+    normalized_query, query_words, automaton = compile_query_automaton(query)
+
+    # A single scan of the normalized text finds every query term; the phrase is also a term
+    normalized, segments = normalize_with_offsets(text)
+    occurrences = list(automaton.finditer(normalized))
+    found_indices = sorted({
+        bisect_right(line_starts, original_span(segments, start, end)[0]) - 1
+        for start, end, term in occurrences if term in query_words
+    })
+    if not normalized_query:
+        # The empty query is in every line
+        found_indices = list(range(len(lines)))
+
+    highlighted_terms = query_words if highlight_terms else {normalized_query}
+    spans = [
+        original_span(segments, start, end)
+        for start, end in whole_word_spans(normalized, [occurrence for occurrence in occurrences
+                                                        if occurrence[2] in highlighted_terms])
+    ]
+    # Highlights stay within a line
+    spans = [(start, end) for start, end in spans if '\n' not in text[start:end]]
+
+    def line_range(start, end):
+        # Original text range of lines [start, end), and its length once highlighted
+        range_start, range_end = line_starts[start], line_starts[end - 1] + len(lines[end - 1])
+        marks = sum(1 for span_start, span_end in spans if span_start >= range_start and span_end <= range_end)
+        return range_start, range_end, range_end - range_start + len('<mark></mark>') * marks
+
     if found_indices:
         start = max(0, found_indices[0] - 5)
         end = min(len(lines), found_indices[-1] + 6)
-        context_lines = lines[start:end]
-        highlighted_lines = [highlight_query(line, query) for line in context_lines]
-        snippet = '\n'.join(highlighted_lines)
+        range_start, range_end, length = line_range(start, end)
+        
         # Ensure snippet meets min_chars requirement
-        if len(snippet) < min_chars:
+        if length < min_chars:
             start = max(0, start - 5)
             end = min(len(lines), end + 5)
-            context_lines = lines[start:end]
-            highlighted_lines = [highlight_query(line, query) for line in context_lines]
-            snippet = '\n'.join(highlighted_lines)
+            range_start, range_end, length = line_range(start, end)
     else:
-        # If no matching line is found, return the beginning of the text
-        snippet = text[:max_chars]
-        snippet = highlight_query(snippet, query)
-    # Replace newlines with '<br/>'
-    snippet = snippet.replace('\n', '<br/>')
-    # Allow only <br> and <mark> tags
-    allowed_tags = ['br', 'mark']
-    snippet = bleach.clean(snippet, tags=allowed_tags, strip=True)
+        # If no matching line is found, return the beginning of the text (no query word occurs in it)
+        range_start, range_end = 0, min(len(text), max_chars)
+
+    if html is None:
+        html = render_snippet_html(text)
+    positions = sorted({range_start, range_end, *(offset for span in spans for offset in span)})
+    html_position = dict(zip(positions, html_offsets(text, positions)))
+    html_spans = [(html_position[span_start], html_position[span_end]) for span_start, span_end in spans]
+    snippet = mark_spans(html, html_spans, html_position[range_start], html_position[range_end])
     # Truncate to max_chars
     snippet = snippet[:max_chars]
     return snippet
 
 
-def extract_matching_sentences_lm(text, query, max_lines=10, min_chars=200, max_chars=500):
-    query_lower = query.lower()
-    lines = text.split('\n')
-    for i, line in enumerate(lines):
-        if query_lower in line.lower():
-            start = max(0, i - 5)  # Adjust the number of lines before the match
-            end = min(len(lines), i + 5)  # Adjust the number of lines after the match
-            context_lines = lines[start:end]
-            highlighted_lines = [highlight_query(line.strip(), query) for line in context_lines]
-            snippet = '\n'.join(highlighted_lines)
-            # Ensure snippet meets min_chars requirement
-            if len(snippet) < min_chars:
-                start = max(0, start - 5)
-                end = min(len(lines), end + 5)
-                context_lines = lines[start:end]
-                highlighted_lines = [highlight_query(line.strip(), query) for line in context_lines]
-                snippet = '\n'.join(highlighted_lines)
-            # Replace newlines with '<br/>'
-            snippet = snippet.replace('\n', '<br/>')
-            # Allow only <br> and <mark> tags
-            allowed_tags = ['br', 'mark']
-            snippet = bleach.clean(snippet, tags=allowed_tags, strip=True)
-            # Truncate to max_chars
-            snippet = snippet[:max_chars]
-            return snippet
-    # If no matching line is found
-    snippet = text[:max_chars]
-    snippet = snippet.replace('\n', '<br/>')
-    allowed_tags = ['br', 'mark']
-    snippet = bleach.clean(snippet, tags=allowed_tags, strip=True)
-    return highlight_query(snippet, query)
-
-def extract_matching_sentences_tokenize(text, query, max_sentences=5, min_chars=200, max_chars=500):
-    query_lower = query.lower()
-    sentences = sent_tokenize(text)
-    for i, sentence in enumerate(sentences):
-        if query_lower in sentence.lower():
-            start = max(0, i - 2)
-            end = min(len(sentences), i + 3)
-            context_sentences = sentences[start:end]
-            highlighted_sentences = [highlight_query(s.strip(), query) for s in context_sentences]
-            snippet = ' '.join(highlighted_sentences)
-            if len(snippet) < min_chars:
-                start = max(0, start - 2)
-                end = min(len(sentences), end + 2)
-                context_sentences = sentences[start:end]
-                highlighted_sentences = [highlight_query(s.strip(), query) for s in context_sentences]
-                snippet = ' '.join(highlighted_sentences)
-            return snippet[:max_chars]
-    snippet = text[:max_chars]
-    snippet = snippet.replace('\n', '<br/>')
-    # Allow only <br> and <mark> tags
-    allowed_tags = ['br', 'mark']
-    snippet = bleach.clean(snippet, tags=allowed_tags, strip=True)    
-    return highlight_query(snippet, query)
-
 def apply_filters(results, filters):
     filtered = []
     for result in results:
@@ -3,6 +3,7 @@ import sys
 from pathlib import Path
 import pytest
 from app import create_app
+from scripts.search import load_embedding_cache_cached
 
 # Add the 'backend' directory to sys.path
 sys.path.append(str(Path(__file__).resolve().parent.parent))
@@ -13,3 +14,11 @@ def client():
     app.config['TESTING'] = True
     with app.test_client() as client:
         yield client
+
+@pytest.fixture(autouse=True)
+def query_embedding_cache(tmp_path, monkeypatch):
+    # Keeps the on-disk query-embedding cache out of the working directory
+    monkeypatch.setenv('QUERY_EMBEDDING_CACHE_PATH', str(tmp_path / 'query_embedding_cache.sqlite'))
+    load_embedding_cache_cached.cache_clear()
+    yield
+    load_embedding_cache_cached.cache_clear()
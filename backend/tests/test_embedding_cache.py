@@ -0,0 +1,47 @@
+# backend/tests/test_embedding_cache.py
+import numpy as np
+from scripts.embedding_cache import QueryEmbeddingCache, normalize_query, read_logged_queries
+
+
+def test_round_trip_and_persistence(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    embedding = np.arange(4, dtype='float32').reshape(1, -1)
+    QueryEmbeddingCache(path).put('model', 'psychic being', embedding)
+    cache = QueryEmbeddingCache(path)
+    assert np.array_equal(cache.get('model', 4, 'psychic being'), embedding)
+    assert cache.get('other-model', 4, 'psychic being') is None
+
+
+def test_entries_of_another_dimension_are_ignored(tmp_path):
+    cache = QueryEmbeddingCache(str(tmp_path / 'cache.sqlite'))
+    # Written for an earlier build of the model, with another dimension
+    cache.put('model', 'psychic being', np.ones((1, 32), dtype='float32'))
+    assert cache.get('model', 8, 'psychic being') is None
+    cache.put('model', 'psychic being', np.ones((1, 8), dtype='float32'))
+    assert cache.get('model', 8, 'psychic being').shape == (1, 8)
+    assert cache.get('model', 32, 'psychic being').shape == (1, 32)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = QueryEmbeddingCache(str(tmp_path / 'cache.sqlite'), max_entries=2)
+    embedding = np.ones((1, 4), dtype='float32')
+    cache.put('model', 'a', embedding)
+    cache.put('model', 'b', embedding)
+    cache.get('model', 4, 'a')
+    cache.put('model', 'c', embedding)
+    assert len(cache) == 2
+    assert set(cache.get_many('model', 4, ['a', 'b', 'c'])) == {'a', 'c'}
+
+
+def test_read_logged_queries(tmp_path):
+    log_path = tmp_path / 'search.log'
+    log_path.write_text(
+        "2024-01-01 [INFO] Starting search for query: 'savitri' with top_k=100, filters={}, search_type=all\n"
+        "2024-01-01 [INFO] Exact matches found: 3\n"
+        "2024-01-01 [INFO] Starting search for query: 'psychic  being' with top_k=100, filters={}, search_type=all\n"
+        "2024-01-01 [INFO] Starting search for query: 'psychic being' with top_k=20, filters={}, search_type=all\n",
+        encoding='utf-8'
+    )
+    assert read_logged_queries(str(log_path), 10) == ['psychic being', 'savitri']
+    assert read_logged_queries(str(tmp_path / 'missing.log'), 10) == []
+    assert normalize_query(' psychic\tbeing ') == 'psychic being'
@@ -0,0 +1,59 @@
+# backend/tests/test_facets.py
+import time
+import threading
+from scripts.facets import build_facets, get_filter_bitmap, bitmap_to_ids, bitmap_contains
+from scripts.utils import apply_filters
+
+METADATA = [
+    {'author': 'Sri Aurobindo', 'group': 'CWSA', 'book_title': 'Savitri', 'page_number': 1},
+    {'author': 'The Mother', 'group': 'CWM', 'book_title': 'Prayers and Meditations', 'page_number': 2},
+    {'author': 'Sri Aurobindo', 'group': 'CWSA', 'book_title': 'The Life Divine', 'page_number': 1},
+    {'author': 'Nirodbaran', 'group': 'Disciples', 'book_title': 'Talks', 'page_number': 3},
+    {'author': 'Sri Aurobindo', 'book_title': 'Savitri'},
+]
+
+
+def test_filter_bitmap_matches_apply_filters():
+    facets = build_facets(METADATA)
+    cases = [
+        {'author': 'Sri Aurobindo'},
+        {'author': 'Sri Aurobindo', 'group': 'CWSA'},
+        {'book_title': 'Savitri', 'group': 'CWSA'},
+        {'group': 'Unknown'},
+        {'page_number': 1},
+    ]
+    for filters in cases:
+        expected = [i for i, meta in enumerate(METADATA) if apply_filters([meta], filters)]
+        bitmap = get_filter_bitmap(facets, METADATA, filters)
+        assert bitmap_to_ids(bitmap, len(METADATA)).tolist() == expected, filters
+        assert bitmap_contains(bitmap, range(len(METADATA))).tolist() == [i in expected for i in range(len(METADATA))]
+
+
+def test_no_filters_returns_none():
+    assert get_filter_bitmap(build_facets(METADATA), METADATA, {}) is None
+
+
+def test_facet_for_another_field_is_built_once_across_threads(monkeypatch):
+    from scripts import facets as facets_module
+
+    facets = build_facets(METADATA)
+    build_facet = facets_module.build_facet
+    built = []
+
+    def slow_build_facet(metadata, field):
+        built.append(field)
+        time.sleep(0.05)
+        return build_facet(metadata, field)
+
+    monkeypatch.setattr(facets_module, 'build_facet', slow_build_facet)
+    bitmaps = []
+    threads = [
+        threading.Thread(target=lambda: bitmaps.append(get_filter_bitmap(facets, METADATA, {'page_number': 1})))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert built == ['page_number']
+    assert [bitmap_to_ids(bitmap, len(METADATA)).tolist() for bitmap in bitmaps] == [[0, 2]] * 8
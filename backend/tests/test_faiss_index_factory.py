@@ -0,0 +1,88 @@
+# backend/tests/test_faiss_index_factory.py
+import faiss
+import numpy as np
+import pytest
+from scripts.facets import ids_to_bitmap
+from scripts.faiss_index_factory import (
+    build_faiss_index, make_search_params, rerank, exact_top_k, apply_search_config, INDEX_TYPES
+)
+from scripts.search import search_semantic_candidates
+
+NUM_VECTORS = 2000
+
+
+@pytest.fixture(scope='module')
+def vectors():
+    vectors = np.random.default_rng(0).random((NUM_VECTORS, 16), dtype='float32')
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+@pytest.fixture(scope='module')
+def indexes(vectors):
+    return {index_type: build_faiss_index(vectors, index_type) for index_type in INDEX_TYPES}
+
+
+def test_build_faiss_index(indexes):
+    for index_type, (index, config) in indexes.items():
+        assert index.ntotal == NUM_VECTORS and index.d == 16
+        assert (config['type'], config['metric']) == (index_type, 'inner_product')
+        # Only the lossy types need the full-precision vectors for re-ranking
+        assert ('rerank_vectors' in config) == (index_type in ('sq8', 'fp16', 'pq'))
+    assert indexes['ivf'][1]['nprobe'] == faiss.extract_index_ivf(indexes['ivf'][0]).nprobe
+    with pytest.raises(ValueError):
+        build_faiss_index(np.zeros((10, 16), dtype='float32'), 'lsh')
+
+
+def test_search_config_is_restored(indexes):
+    index, config = indexes['hnsw']
+    restored = apply_search_config(faiss.deserialize_index(faiss.serialize_index(index)), config)
+    assert restored.hnsw.efSearch == config['ef_search']
+
+
+def test_make_search_params(indexes):
+    selector = faiss.IDSelectorRange(0, 10)
+    assert make_search_params(indexes['flat'][0]) is None
+    assert isinstance(make_search_params(indexes['ivf'][0], selector), faiss.SearchParametersIVF)
+    assert isinstance(make_search_params(indexes['hnsw'][0], selector), faiss.SearchParametersHNSW)
+    assert type(make_search_params(indexes['sq8'][0], selector)) is faiss.SearchParameters
+    # IndexPQ.search rejects search parameters
+    assert make_search_params(indexes['pq'][0], selector) is None
+
+
+def test_rerank_matches_exact_search(vectors):
+    query = vectors[:1]
+    candidates = np.array([[42, 7, -1, 1500, 0, 99]])
+    distances, indices = rerank(vectors, faiss.METRIC_INNER_PRODUCT, query, candidates, 3)
+    expected = sorted([0, 7, 42, 99, 1500], key=lambda idx: -float(vectors[idx] @ query[0]))[:3]
+    assert indices[0].tolist() == expected
+    np.testing.assert_allclose(distances[0], vectors[expected] @ query[0], rtol=1e-5)
+    # Fewer candidates than k are padded
+    _, indices = exact_top_k(vectors[[3, 4]], [3, 4], faiss.METRIC_L2, query, 3)
+    assert indices[0, 2] == -1
+
+
+@pytest.mark.parametrize('index_type', INDEX_TYPES)
+def test_filtered_search(vectors, indexes, index_type):
+    index, config = indexes[index_type]
+    rerank_vectors = vectors if config.get('rerank_vectors') else None
+    queries = vectors[[30, 300]]
+    for filter_ids in [np.arange(0, NUM_VECTORS, 3), np.array([5, 30, 31, 300, 1999])]:
+        filter_bitmap = ids_to_bitmap(filter_ids, NUM_VECTORS)
+        _, indices = search_semantic_candidates(queries, index, 10, filter_bitmap, None, rerank_vectors)
+        assert indices.shape == (2, 10)
+        found = indices[indices >= 0]
+        assert np.isin(found, filter_ids).all()
+        # Every query is a filtered row, so it is its own nearest neighbour
+        assert indices[:, 0].tolist() == [30, 300]
+        # PQ candidates are approximate, but a filter narrower than k is scanned exactly
+        if index_type in ('flat', 'sq8', 'fp16') or (index_type == 'pq' and len(filter_ids) < 10):
+            _, expected_indices = exact_top_k(vectors[filter_ids], filter_ids, faiss.METRIC_INNER_PRODUCT, queries, 10)
+            assert indices.tolist() == expected_indices.tolist()
+
+
+def test_filtered_pq_search_without_rerank_vectors(vectors, indexes):
+    filter_ids = np.arange(0, NUM_VECTORS, 3)
+    _, indices = search_semantic_candidates(vectors[[30]], indexes['pq'][0], 10, ids_to_bitmap(filter_ids, NUM_VECTORS))
+    assert len(indices[0][indices[0] >= 0]) > 0
+    assert np.isin(indices[indices >= 0], filter_ids).all()
@@ -0,0 +1,60 @@
+# backend/tests/test_highlight.py
+import pytest
+from scripts.term_matcher import TermAutomaton, whole_word_spans
+from scripts.utils import (
+    prepare_text_for_matching, normalize_with_offsets, highlight_query, extract_matching_sentences
+)
+
+
+@pytest.mark.parametrize('text', [
+    "the psychic being",
+    "  leading and  doubled\tspaces \n",
+    "the ﬁre of ﬂame and ﬃrm",
+    "“Quoted” — text … with primes ′ ″",
+    "ΟΔΟΣ and İstanbul",
+    "café composed by NFKC",
+    "",
+])
+def test_normalize_with_offsets_matches_prepare_text(text):
+    assert normalize_with_offsets(text)[0] == prepare_text_for_matching(text)
+
+
+def test_highlight_query_after_ligature():
+    # NFKC expands the ligature, so matches after it used to be shifted
+    assert highlight_query("the ﬁne fire", "fire") == "the ﬁne <mark>fire</mark>"
+    assert highlight_query("a ﬁre", "fire") == "a <mark>ﬁre</mark>"
+
+
+def test_highlight_query_after_collapsed_whitespace():
+    assert highlight_query("  the   psychic being", "psychic being") == "  the   <mark>psychic being</mark>"
+    assert highlight_query("The Psychic and the psychic", "psychic") == \
+        "The <mark>Psychic</mark> and the <mark>psychic</mark>"
+
+
+def test_extract_matching_sentences_highlights_every_line():
+    text = "first line\nthe soul\nno match\nsoul again"
+    snippet = extract_matching_sentences(text, "soul")
+    assert snippet == "first line<br>the <mark>soul</mark><br>no match<br><mark>soul</mark> again"
+
+
+def test_term_automaton_finds_overlapping_terms():
+    automaton = TermAutomaton(['he', 'she', 'his', 'hers', ''])
+    assert sorted(automaton.finditer('ushers')) == [(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')]
+
+
+def test_whole_word_spans():
+    text = 'the soul and soulful souls'
+    automaton = TermAutomaton(['soul', 'the soul'])
+    assert whole_word_spans(text, automaton.finditer(text)) == [(0, 8)]
+
+
+def test_extract_matching_sentences_highlights_terms():
+    text = "the being\nnothing here\npsychic life"
+    assert extract_matching_sentences(text, "psychic being", highlight_terms=True) == \
+        "the <mark>being</mark><br>nothing here<br><mark>psychic</mark> life"
+    assert extract_matching_sentences(text, "psychic being") == "the being<br>nothing here<br>psychic life"
+
+
+def test_extract_matching_sentences_escapes_text():
+    text = "R&D <i>soul</i>\nnext"
+    assert extract_matching_sentences(text, "soul") == "R&amp;D &lt;i&gt;<mark>soul</mark>&lt;/i&gt;<br>next"
@@ -0,0 +1,85 @@
+# backend/tests/test_index_manifest.py
+import faiss
+import numpy as np
+from scripts.index_manifest import build_pins, manifest_mismatches, layout_order, compute_layout, get_filter_range
+
+
+def build_index(tmp_path, num_vectors=10, dim=8):
+    vectors = np.random.default_rng(0).random((num_vectors, dim), dtype='float32')
+    faiss.normalize_L2(vectors)
+    index = faiss.IndexFlatIP(dim)
+    index.add(vectors)
+    faiss.write_index(index, str(tmp_path / 'faiss_index.bin'))
+    (tmp_path / 'metadata.json').write_text('[]')
+    manifest = {'index': {'type': 'flat', 'metric': 'inner_product'}}
+    manifest.update(build_pins(tmp_path, 'some/model', True, index, num_vectors, ['faiss_index.bin', 'metadata.json']))
+    return manifest
+
+
+def test_matching_artifacts(tmp_path):
+    manifest = build_index(tmp_path)
+    assert manifest['dim'] == 8 and manifest['ntotal'] == 10
+    assert set(manifest['artifacts']) == {'faiss_index.bin', 'metadata.json'}
+    assert manifest_mismatches(manifest, tmp_path, 10, 8, 'inner_product', 10) == []
+
+
+def test_mismatched_artifacts(tmp_path):
+    manifest = build_index(tmp_path)
+    assert manifest_mismatches(manifest, tmp_path, 10, 8, 'l2', 10) == ["metric is l2 but the manifest pins inner_product"]
+    assert len(manifest_mismatches(manifest, tmp_path, 10, 16, 'inner_product', 12)) == 3
+
+    (tmp_path / 'metadata.json').write_text('{}')
+    assert manifest_mismatches(manifest, tmp_path, 10, 8, 'inner_product', 10, verify_checksums=True) == \
+        ["metadata.json does not match its pinned SHA-256"]
+    # Checksums are opt-in; sizes are always checked
+    assert manifest_mismatches(manifest, tmp_path, 10, 8, 'inner_product', 10) == []
+    (tmp_path / 'metadata.json').write_text('{ }')
+    assert manifest_mismatches(manifest, tmp_path, 10, 8, 'inner_product', 10) == \
+        ["metadata.json is 3 bytes but the manifest pins 2"]
+    (tmp_path / 'metadata.json').write_text('{}')
+    (tmp_path / 'faiss_index.bin').unlink()
+    assert manifest_mismatches(manifest, tmp_path, 10, 8, 'inner_product', 10, verify_checksums=False) == \
+        ["faiss_index.bin is missing"]
+
+
+def test_unpinned_manifest(tmp_path):
+    # Indexes built before pinning only get the row count check
+    assert manifest_mismatches(None, tmp_path, 10, 8, 'l2', 10) == []
+    assert manifest_mismatches({'num_chunks': 10}, tmp_path, 11, 8, 'l2', 10) == \
+        ["the FAISS index holds 11 vectors but the metadata has 10 rows"]
+
+
+LAYOUT_METADATA = [
+    {'group': 'Disciples', 'book_title': 'Talks', 'priority': 1},
+    {'group': 'CWSA', 'book_title': 'Savitri', 'priority': 5},
+    {'group': 'CWM', 'book_title': 'Prayers and Meditations', 'priority': 3},
+    {'group': 'CWSA', 'book_title': 'The Life Divine', 'priority': 5},
+    {'group': 'CWSA', 'book_title': 'Savitri', 'priority': 5},
+    {'group': 'CWM', 'book_title': 'Prayers and Meditations', 'priority': 3},
+]
+
+
+def test_layout_maps_filters_to_ranges():
+    ordered = [LAYOUT_METADATA[i] for i in layout_order(LAYOUT_METADATA)]
+    # Books keep their original chunk order inside their range
+    assert layout_order(LAYOUT_METADATA) == [1, 4, 3, 2, 5, 0]
+    layout = compute_layout(ordered)
+    for filters in [{'group': 'CWSA'}, {'group': 'CWM'}, {'book_title': 'Savitri'}, {'book_title': 'Talks'},
+                    {'group': 'CWSA', 'book_title': 'The Life Divine'}, {'author': 'The Mother', 'group': 'CWM'}]:
+        start, end = get_filter_range(layout, filters)
+        # The range holds every row of the book (or group) filtered on, and nothing else
+        field, value = ('book_title', filters['book_title']) if 'book_title' in filters else ('group', filters['group'])
+        assert [i for i, meta in enumerate(ordered) if meta[field] == value] == list(range(start, end)), filters
+    assert get_filter_range(layout, {'author': 'The Mother'}) is None
+    assert get_filter_range(layout, {'group': 'Unknown'}) is None
+    assert get_filter_range(layout, {}) is None
+    assert get_filter_range(None, {'group': 'CWSA'}) is None
+
+
+def test_non_contiguous_values_get_no_range():
+    # Metadata that was not saved in layout order
+    layout = compute_layout(LAYOUT_METADATA)
+    assert get_filter_range(layout, {'group': 'CWSA'}) is None
+    assert get_filter_range(layout, {'book_title': 'Savitri'}) is None
+    assert get_filter_range(layout, {'book_title': 'The Life Divine'}) == (3, 4)
+    assert get_filter_range(layout, {'group': 'Disciples'}) == (0, 1)
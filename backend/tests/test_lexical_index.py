@@ -0,0 +1,69 @@
+# backend/tests/test_lexical_index.py
+import numpy as np
+from scripts.lexical_index import (
+    build_corpus, build_suffix_array, write_exact_index, load_exact_index, find_exact_match_chunks,
+    write_inverted_index, load_inverted_index, find_all_words_match_chunks, load_normalized_snippets
+)
+
+SNIPPETS = [
+    "the psychic being is the soul in evolution",
+    "savitri is a legend and a symbol",
+    "the supramental descent and the psychic transformation",
+    "naïve café — unicode text",
+    "",
+    "banana bandana",
+]
+
+
+def test_suffix_array_is_sorted():
+    data = b"banana\x00bandana\x00mississippi"
+    suffix_array = build_suffix_array(data)
+    suffixes = [data[i:] for i in suffix_array]
+    assert suffixes == sorted(suffixes)
+    assert sorted(suffix_array.tolist()) == list(range(len(data)))
+
+
+def test_exact_match_chunks_agree_with_substring_scan(tmp_path):
+    write_exact_index(str(tmp_path), SNIPPETS)
+    corpus, suffix_array, chunk_offsets = load_exact_index(str(tmp_path))
+    queries = ["psychic", "the psychic", "an", "ana", "café", "evolution", "a legend",
+               "n bandana", "not present", "e", ""]
+    for query in queries:
+        expected = [i for i, snippet in enumerate(SNIPPETS) if query in snippet]
+        found = find_exact_match_chunks(query, corpus, suffix_array, chunk_offsets)
+        assert found.tolist() == expected, query
+
+
+def test_matches_do_not_cross_chunk_boundaries():
+    corpus, offsets = build_corpus(["abc", "def"])
+    suffix_array = build_suffix_array(corpus)
+    assert find_exact_match_chunks("cd", corpus, suffix_array, offsets).size == 0
+    assert find_exact_match_chunks("c\x00d", corpus, suffix_array, offsets).size == 0
+    assert np.array_equal(find_exact_match_chunks("de", corpus, suffix_array, offsets), [1])
+
+
+def test_normalized_snippets_round_trip(tmp_path):
+    write_exact_index(str(tmp_path), SNIPPETS)
+    assert load_normalized_snippets(str(tmp_path)) == SNIPPETS
+    # Memory-mapped snippets are decoded on access
+    mapped = load_normalized_snippets(str(tmp_path), use_mmap=True)
+    assert len(mapped) == len(SNIPPETS) and list(mapped) == SNIPPETS
+    assert (mapped[-1], mapped[1:3]) == (SNIPPETS[-1], SNIPPETS[1:3])
+    write_exact_index(str(tmp_path), [''])
+    assert list(load_normalized_snippets(str(tmp_path), use_mmap=True)) == ['']
+
+
+def test_load_missing_index_returns_none(tmp_path):
+    assert load_exact_index(str(tmp_path)) is None
+    assert load_normalized_snippets(str(tmp_path)) is None
+
+
+def test_all_words_chunks_agree_with_subset_scan(tmp_path):
+    write_inverted_index(str(tmp_path), SNIPPETS)
+    inverted_index = load_inverted_index(str(tmp_path))
+    queries = [{"the", "psychic"}, {"psychic"}, {"a", "symbol"}, {"café", "naïve"},
+               {"the", "missing"}, {"psych"}, set()]
+    for words in queries:
+        expected = [i for i, snippet in enumerate(SNIPPETS) if words.issubset(set(snippet.split()))]
+        found = find_all_words_match_chunks(words, *inverted_index)
+        assert found.tolist() == expected, words
@@ -0,0 +1,52 @@
+# backend/tests/test_metadata_store.py
+import pytest
+from scripts.metadata_store import (
+    write_metadata_store, load_metadata_store, metadata_column, metadata_snippet_html, render_snippet_html, html_offsets
+)
+
+SAVITRI = {'file_path': '/pdfs/savitri.pdf', 'author': 'Sri Aurobindo', 'group': 'CWSA', 'book_title': 'Savitri', 'priority': 10}
+
+METADATA = [
+    {**SAVITRI, 'pdf_url': 'http://host/pdfs/savitri.pdf#page=1', 'chapter_name': 'Book One', 'page_number': 1, 'snippet': 'O Thou, the Beloved'},
+    {**SAVITRI, 'pdf_url': 'http://host/pdfs/savitri.pdf#page=2', 'chapter_name': 'Book One', 'page_number': 2, 'snippet': ''},
+    {'author': 'The Mother', 'group': 'CWM', 'book_title': 'Prayers and Meditations', 'pdf_url': 'http://host/pdfs/prayers.pdf',
+     'page_number': 2, 'snippet': 'ﬁrst “quoted” line'},
+    {'author': 'Nirodbaran', 'book_title': 'Talks', 'snippet': 'no page\nR&D <i>'},
+]
+
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test_round_trip(tmp_path, use_mmap):
+    write_metadata_store(tmp_path, METADATA)
+    metadata = load_metadata_store(tmp_path, use_mmap)
+    assert len(metadata) == len(METADATA)
+    assert list(metadata) == METADATA
+    assert metadata[-1] == METADATA[-1]
+    assert metadata[1:] == METADATA[1:]
+    # Rows of the same book share one book table entry
+    assert len(metadata.books) == 3
+    for field in ('author', 'pdf_url', 'chapter_name', 'page_number', 'snippet'):
+        assert metadata_column(metadata, field) == [meta.get(field) for meta in METADATA]
+
+
+def test_snippet_html(tmp_path):
+    write_metadata_store(tmp_path, METADATA)
+    metadata = load_metadata_store(tmp_path)
+    assert metadata_snippet_html(metadata, 3) == 'no page<br>R&amp;D &lt;i&gt;'
+    assert [metadata_snippet_html(metadata, i) for i in range(len(METADATA))] == \
+        [metadata_snippet_html(METADATA, i) for i in range(len(METADATA))]
+
+
+def test_html_offsets():
+    text = 'a&b\n<c>'
+    rendered = render_snippet_html(text)
+    assert [rendered[offset] for offset in html_offsets(text, [0, 2, 4, 5])] == ['a', 'b', '&', 'c']
+
+
+def test_missing_store_returns_none(tmp_path):
+    assert load_metadata_store(tmp_path) is None
+
+
+def test_empty_store(tmp_path):
+    write_metadata_store(tmp_path, [])
+    assert len(load_metadata_store(tmp_path)) == 0
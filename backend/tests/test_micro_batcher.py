@@ -0,0 +1,51 @@
+# backend/tests/test_micro_batcher.py
+import threading
+import pytest
+from scripts.micro_batcher import MicroBatcher
+
+
+def test_concurrent_items_share_batches():
+    batch_sizes = []
+
+    def square(items):
+        batch_sizes.append(len(items))
+        return [item * item for item in items]
+
+    batcher = MicroBatcher(square, max_batch_size=8, max_wait=0.05)
+    barrier = threading.Barrier(16)
+    results = {}
+
+    def submit(value):
+        barrier.wait()
+        results[value] = batcher.submit(value).result(timeout=5)
+
+    threads = [threading.Thread(target=submit, args=(value,)) for value in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {value: value * value for value in range(16)}
+    assert max(batch_sizes) <= 8
+    assert len(batch_sizes) < 16
+    assert batcher.stats()['items'] == 16
+
+
+def test_errors_reach_every_caller():
+    def fail(items):
+        raise ValueError("bad batch")
+
+    batcher = MicroBatcher(fail, max_wait=0.001)
+    with pytest.raises(ValueError):
+        batcher.submit(1).result(timeout=5)
+
+
+def test_returned_errors_reach_only_their_caller():
+    def invert(items):
+        return [ZeroDivisionError("no inverse") if item == 0 else 1 / item for item in items]
+
+    batcher = MicroBatcher(invert, max_wait=0.05)
+    futures = [batcher.submit(value) for value in (2, 0, 4)]
+    assert futures[0].result(timeout=5) == 0.5
+    with pytest.raises(ZeroDivisionError):
+        futures[1].result(timeout=5)
+    assert futures[2].result(timeout=5) == 0.25
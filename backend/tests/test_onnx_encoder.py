@@ -0,0 +1,46 @@
+# backend/tests/test_onnx_encoder.py
+import json
+import numpy as np
+import pytest
+from scripts.onnx_encoder import (
+    export_quantized_encoder, OnnxQueryEncoder, onnx_encoder_usable, ENCODER_CONFIG_FILENAME, DEFAULT_MODEL_NAME
+)
+
+QUERIES = [
+    "psychic being",
+    "What is the supramental consciousness?",
+    "Savitri",
+    "the divine Mother and the way of surrender",
+    "integral yoga and the transformation of the nature",
+]
+
+
+def test_unusable_without_export(tmp_path):
+    assert not onnx_encoder_usable(str(tmp_path), DEFAULT_MODEL_NAME)
+
+
+def test_unusable_for_another_model(tmp_path):
+    pytest.importorskip('onnxruntime')
+    (tmp_path / ENCODER_CONFIG_FILENAME).write_text(json.dumps({'model_name': 'another-model'}))
+    assert not onnx_encoder_usable(str(tmp_path), DEFAULT_MODEL_NAME)
+
+
+def test_parity_with_torch(tmp_path):
+    """
+    The int8 encoder must stay within cosine 0.99 of the torch embeddings.
+    """
+    pytest.importorskip('onnxruntime')
+    pytest.importorskip('transformers')
+    pytest.importorskip('torch')
+    sentence_transformers = pytest.importorskip('sentence_transformers')
+    try:
+        torch_model = sentence_transformers.SentenceTransformer(DEFAULT_MODEL_NAME, device='cpu')
+    except Exception as e:
+        pytest.skip(f"model not available: {e}")
+
+    export_quantized_encoder(str(tmp_path), DEFAULT_MODEL_NAME)
+    onnx_embeddings = OnnxQueryEncoder(str(tmp_path)).encode(QUERIES)
+    torch_embeddings = torch_model.encode(QUERIES, convert_to_numpy=True, normalize_embeddings=True)
+    cosines = (onnx_embeddings * torch_embeddings).sum(axis=1) / (
+        np.linalg.norm(onnx_embeddings, axis=1) * np.linalg.norm(torch_embeddings, axis=1))
+    assert cosines.min() >= 0.99
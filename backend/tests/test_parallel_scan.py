@@ -0,0 +1,75 @@
+# backend/tests/test_parallel_scan.py
+import os
+import sys
+import subprocess
+import pytest
+from scripts.parallel_scan import ParallelLexicalScanner
+
+SNIPPETS = [
+    "the psychic being is the soul in evolution",
+    "savitri is a legend and a symbol",
+    "",
+    "naïve café — unicode text about the soul",
+    "the supramental descent and the psychic transformation",
+    "café naïve",
+    "banana bandana",
+    "soul",
+] * 5
+
+
+@pytest.fixture(scope='module')
+def scanner():
+    # Ranking order differs from id order, and chunks outnumber workers times partitions
+    scanner = ParallelLexicalScanner(SNIPPETS, list(reversed(range(len(SNIPPETS)))), 2)
+    yield scanner
+    scanner.close()
+
+
+def scanned(chunk_id_lists):
+    return [idx for chunk_ids in chunk_id_lists for idx in chunk_ids.tolist()]
+
+
+def test_exact_scan_matches_in_process_scan(scanner):
+    chunk_order = list(reversed(range(len(SNIPPETS))))
+    for query in ["the psychic", "soul", "café", "naïve café", "ana", "e", "not present", ""]:
+        expected = [idx for idx in chunk_order if query in SNIPPETS[idx]]
+        assert scanned(scanner.find_exact_match_chunks(query)) == expected, query
+
+
+def test_all_words_scan_matches_in_process_scan(scanner):
+    chunk_order = list(reversed(range(len(SNIPPETS))))
+    for words in [{"the", "soul"}, {"soul"}, {"café", "naïve"}, {"psych"}, {"—"}, {"missing", "the"}, set()]:
+        expected = [idx for idx in chunk_order if words.issubset(SNIPPETS[idx].split())]
+        assert scanned(scanner.find_all_words_match_chunks(words)) == expected, words
+
+
+def test_stopping_early_leaves_partitions_unscanned(scanner, monkeypatch):
+    submitted = []
+    apply_async = scanner._pool.apply_async
+
+    def count_apply_async(func, args):
+        submitted.append(args)
+        return apply_async(func, args)
+
+    monkeypatch.setattr(scanner._pool, 'apply_async', count_apply_async)
+    chunks = scanner.find_exact_match_chunks("soul")
+    next(chunks)
+    chunks.close()
+    assert 0 < len(submitted) < len(scanner._tasks)
+
+
+def test_workers_do_not_run_the_main_module(tmp_path):
+    # Stands in for app.py, which builds the Flask app at import time
+    main_path = tmp_path / 'server.py'
+    main_path.write_text(
+        "import sys\n"
+        f"sys.path.insert(0, {os.path.dirname(os.path.dirname(os.path.abspath(__file__)))!r})\n"
+        "print('main module run', flush=True)\n"
+        "from scripts.parallel_scan import ParallelLexicalScanner\n"
+        "if __name__ == '__main__':\n"
+        "    scanner = ParallelLexicalScanner(['the soul', 'the light'], [0, 1], 2)\n"
+        "    print([ids.tolist() for ids in scanner.find_exact_match_chunks('soul')], flush=True)\n"
+        "    scanner.close()\n"
+    )
+    output = subprocess.run([sys.executable, str(main_path)], capture_output=True, text=True, timeout=60, check=True)
+    assert output.stdout.splitlines() == ['main module run', '[[0], []]']
@@ -0,0 +1,42 @@
+# backend/tests/test_result_cache.py
+from scripts.result_cache import ResultCache, index_generation
+
+
+def test_hits_misses_and_lru_eviction():
+    cache = ResultCache(max_entries=2)
+    assert cache.get('a', 1) is None
+    cache.put('a', 1, ['result a'])
+    cache.put('b', 1, ['result b'])
+    assert cache.get('a', 1) == ['result a']
+    cache.put('c', 1, ['result c'])
+    assert cache.get('b', 1) is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['entries']) == (1, 2, 1, 2)
+
+
+def test_expired_entries_are_misses():
+    cache = ResultCache(ttl=0)
+    cache.put('a', 1, ['result a'])
+    assert cache.get('a', 1) is None
+
+
+def test_new_generation_invalidates(tmp_path):
+    index_file = tmp_path / 'faiss_index.bin'
+    index_file.write_bytes(b'old')
+    cache = ResultCache()
+    cache.put('a', index_generation([index_file]), ['result a'])
+    assert cache.get('a', index_generation([index_file])) == ['result a']
+    index_file.write_bytes(b'rebuilt')
+    assert cache.get('a', index_generation([index_file])) is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_previous_generation_is_ignored():
+    cache = ResultCache()
+    cache.put('a', 1, ['old'])
+    cache.put('a', 2, ['new'])
+    # A search still running on generation 1 neither reads nor overwrites generation 2's entries
+    cache.put('a', 1, ['old'])
+    assert cache.get('a', 1) is None
+    assert cache.get('a', 2) == ['new']
+    assert cache.stats()['invalidations'] == 1
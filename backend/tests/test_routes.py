@@ -1,4 +1,7 @@
 # backend/tests/test_routes.py
+import json
+import time
+
 def test_filters(client):
     response = client.get('/filters')
     assert response.status_code == 200
@@ -12,3 +15,80 @@ def test_search(client):
     assert response.status_code == 200
     data = response.get_json()
     assert 'results' in data
+
+def test_search_batch(client):
+    response = client.post('/search/batch', json={'queries': [{'query': 'test'}, {'query': 'savitri', 'group': 'CWSA'}]})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(data['results']) == 2
+
+def test_search_batch_requires_queries(client):
+    response = client.post('/search/batch', json={})
+    assert response.status_code == 400
+
+def test_search_batch_rejects_bad_queries(client):
+    for queries in [[{'query': 'test', 'top_k': 'x'}], [{'query': 'test', 'top_k': 0}], [{'query': 'test', 'top_k': 10 ** 6}],
+                    [{'query': 'test', 'top_k': None}], [{'query': ['test']}], [{'query': ''}]]:
+        response = client.post('/search/batch', json={'queries': queries})
+        assert response.status_code == 400, queries
+    response = client.post('/search/batch', json={'queries': [{'query': 'test'}], 'top_k': 'x'})
+    assert response.status_code == 400
+
+
+def test_result_cache_stats(client):
+    response = client.get('/search/cache/stats')
+    assert response.status_code == 200
+    assert 'enabled' in response.get_json()
+
+
+def test_search_pagination(client):
+    expected = client.get('/search', query_string={'query': 'test', 'top_k': 5}).get_json()['results']
+    pages = []
+    query_string = {'query': 'test', 'page_size': 2, 'top_k': 5}
+    while True:
+        response = client.get('/search', query_string=query_string)
+        assert response.status_code == 200
+        data = response.get_json()
+        assert len(data['results']) <= 2
+        pages.extend(data['results'])
+        if not data['next_cursor']:
+            break
+        query_string = {'cursor': data['next_cursor'], 'page_size': 2}
+    assert pages == expected
+
+
+def test_search_pagination_rejects_bad_page_size(client):
+    for page_size in ['x', '0']:
+        response = client.get('/search', query_string={'query': 'test', 'page_size': page_size})
+        assert response.status_code == 400
+
+
+def test_search_pagination_rejects_bad_cursor(client):
+    response = client.get('/search', query_string={'cursor': 'not-a-cursor'})
+    assert response.status_code == 400
+
+
+def test_search_stream(client):
+    response = client.get('/search/stream', query_string={'query': 'test', 'top_k': 5})
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert events[-1]['done'] is True
+    assert events[-1]['total'] == sum(len(event['results']) for event in events[:-1])
+    assert all(event['category'] in ('exact', 'all_words', 'semantic') for event in events[:-1])
+
+
+def test_admin_reload(client, monkeypatch):
+    monkeypatch.delenv('ADMIN_TOKEN', raising=False)
+    assert client.post('/admin/reload').status_code == 403
+    monkeypatch.setenv('ADMIN_TOKEN', 'secret')
+    assert client.post('/admin/reload', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    client.get('/search', query_string={'query': 'test'})
+    generation = client.get('/admin/index', headers={'X-Admin-Token': 'secret'}).get_json()['generation']
+    assert client.post('/admin/reload', headers={'X-Admin-Token': 'secret'}).status_code in (202, 409)
+    for _ in range(100):
+        status = client.get('/admin/index', headers={'X-Admin-Token': 'secret'}).get_json()
+        if not status['reloading']:
+            break
+        time.sleep(0.05)
+    assert status['generation'] > generation and status['last_error'] is None
+    assert client.get('/search', query_string={'query': 'test'}).status_code == 200
@@ -0,0 +1,246 @@
+# backend/tests/test_search.py
+import json
+import faiss
+import numpy as np
+import pytest
+from scripts.facets import ids_to_bitmap, get_filter_bitmap
+from scripts.lexical_index import write_exact_index, write_inverted_index
+from scripts.search import (
+    search_flat_range, search_semantic_candidates, run_search, run_semantic_batch, search, search_page,
+    IndexGeneration, generation_numbers, generations, reload_index, GENERATION_LOADERS, encode_queries,
+    encoder_cache_name, load_embedding_cache_cached, render_match, iter_semantic_results
+)
+from scripts.utils import prepare_text_for_matching, extract_matching_sentences, apply_filters
+
+BOOKS = [('Book A', 'CWSA', 1), ('Book B', 'CWM', 5), ('Book C', 'Disciples', 3)]
+WORDS = 'the psychic being soul divine life light truth'.split()
+
+
+def normalized_vectors(num_vectors, dim=8, seed=0):
+    vectors = np.random.default_rng(seed).random((num_vectors, dim), dtype='float32')
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def test_cached_embeddings_of_another_dimension_are_not_used(monkeypatch):
+    class Model:
+        def encode(self, queries, convert_to_numpy=True):
+            return np.ones((len(queries), 8), dtype='float32')
+
+    monkeypatch.setattr('scripts.search.initialize_model_cached', lambda model_name: Model())
+    # Left in the on-disk cache by an earlier build of the model
+    load_embedding_cache_cached().put(encoder_cache_name('model'), 'psychic being', np.ones((1, 32), dtype='float32'))
+    assert encode_queries(['psychic being'], 'model', 8)['psychic being'].shape == (1, 8)
+    with pytest.raises(RuntimeError, match='encodes 8 dimensions'):
+        encode_queries(['savitri'], 'model', 16)
+
+
+def test_failing_batch_group_fails_only_its_requests(monkeypatch):
+    queries = {f"query {i}": normalized_vectors(1, seed=i + 1) for i in range(3)}
+    monkeypatch.setattr('scripts.search.encode_queries', lambda keys, model_name, dim: {key: queries[key] for key in keys})
+    index = faiss.IndexFlatIP(8)
+    index.add(normalized_vectors(20))
+    # An index of another dimension fails its FAISS search
+    other_index = faiss.IndexFlatIP(4)
+    requests = [
+        {'query': query, 'index': request_index, 'model_name': 'model', 'top_k': 2, 'filter_bitmap': filter_bitmap,
+         'filter_range': None, 'rerank_vectors': None, 'rerank_factor': 1}
+        for query, request_index, filter_bitmap in zip(
+            queries, [index, other_index, index], [None, None, ids_to_bitmap(np.arange(5, 15), 20)])
+    ]
+    hits = run_semantic_batch(requests)
+    assert isinstance(hits[1], Exception)
+    for request, (distances, indices) in [(requests[0], hits[0]), (requests[2], hits[2])]:
+        _, expected_indices = search_semantic_candidates(queries[request['query']], index, 10, request['filter_bitmap'])
+        np.testing.assert_array_equal(indices, expected_indices)
+    assert set(hits[2][1][0]) - {-1} <= set(range(5, 15))
+
+
+def test_flat_range_search_matches_filtered_search():
+    vectors = normalized_vectors(60)
+    queries = normalized_vectors(3, seed=1)
+    index = faiss.IndexFlatIP(8)
+    index.add(vectors)
+    # A book filter (every row of [20, 35)) and a narrower author filter inside it
+    for ids in [np.arange(20, 35), np.array([21, 22, 30, 34])]:
+        filter_bitmap = ids_to_bitmap(ids, len(vectors))
+        selector = faiss.IDSelectorBitmap(len(filter_bitmap), faiss.swig_ptr(filter_bitmap))
+        expected_distances, expected_indices = index.search(queries, 10, params=faiss.SearchParameters(sel=selector))
+        distances, indices = search_flat_range(vectors, faiss.METRIC_INNER_PRODUCT, queries, 10, 20, 35, filter_bitmap)
+        assert indices.tolist() == expected_indices.tolist()
+        np.testing.assert_allclose(distances[indices >= 0], expected_distances[expected_indices >= 0], rtol=1e-5)
+        distances, indices = search_semantic_candidates(queries, index, 10, filter_bitmap, (20, 35))
+        assert indices.tolist() == expected_indices.tolist()
+
+
+def build_generation(index_dir, num_chunks=40, lexical_indexes=True):
+    """
+    Writes a small index of num_chunks chunks (every fourth with a one-word snippet) and loads it as a generation.
+    """
+    rng = np.random.default_rng(2)
+    metadata = []
+    for i in range(num_chunks):
+        book_title, group, priority = BOOKS[i % len(BOOKS)]
+        num_lines = 1 if i % 4 == 0 else 6
+        snippet = '\n'.join(' '.join(rng.choice(WORDS, size=1 if i % 4 == 0 else 5)) for _ in range(num_lines))
+        metadata.append({'book_title': book_title, 'group': group, 'author': 'Author', 'priority': priority,
+                         'page_number': i, 'snippet': snippet})
+    index = faiss.IndexFlatIP(8)
+    index.add(normalized_vectors(num_chunks))
+    faiss.write_index(index, str(index_dir / 'faiss_index.bin'))
+    (index_dir / 'metadata.json').write_text(json.dumps(metadata))
+    if lexical_indexes:
+        normalized_snippets = [prepare_text_for_matching(meta['snippet']) for meta in metadata]
+        write_exact_index(str(index_dir), normalized_snippets)
+        write_inverted_index(str(index_dir), normalized_snippets)
+    return IndexGeneration(str(index_dir / 'faiss_index.bin'), str(index_dir / 'metadata.json'), next(generation_numbers))
+
+
+def test_rejected_generation_is_not_cached(tmp_path):
+    generation = build_generation(tmp_path)
+    key = (generation.index_path, generation.metadata_path)
+    generations[key] = generation
+    try:
+        metadata = json.loads((tmp_path / 'metadata.json').read_text())
+        (tmp_path / 'metadata.json').write_text(json.dumps(metadata[:-1]))
+        with pytest.raises(RuntimeError, match='do not match'):
+            reload_index(*key)
+        assert generations[key] is generation
+        assert [loader.cache_info().currsize for loader in GENERATION_LOADERS] == [0] * len(GENERATION_LOADERS)
+    finally:
+        del generations[key]
+
+
+def test_short_semantic_snippets_are_replaced(tmp_path):
+    generation = build_generation(tmp_path)
+    # Chunk 4 has a one-word snippet and is the nearest hit
+    hits = generation.index.search(generation.index.reconstruct(4)[None], 25)
+    results = run_search('light', generation.index_path, generation.metadata_path, top_k=5, search_type='semantic',
+                         min_snippet_length=20, semantic_hits=hits, generation=generation)
+    # The nearest 5 hits include one-word snippets; the next nearest take their place
+    nearest = [idx for idx in hits[1][0].tolist() if idx % 4 != 0][:5]
+    assert sorted(result['page_number'] for result in results) == sorted(nearest)
+
+
+def full_sort_search(generation, query, top_k, filters, search_type, min_snippet_length, hits):
+    """
+    The search as it ran before early termination: every hit of every stage is checked, then all are sorted.
+    """
+    query_normalized = prepare_text_for_matching(query)
+    query_words = ' '.join(set(query_normalized.split()))
+
+    def long_enough(meta, highlight_query, highlight_terms):
+        snippet = extract_matching_sentences(meta['snippet'], highlight_query, highlight_terms=highlight_terms)
+        return len(snippet) >= min_snippet_length
+
+    matches = []
+    matched_indices = set()
+    for idx, meta in enumerate(generation.metadata):
+        if search_type in ['all', 'exact'] and apply_filters([meta], filters) and \
+                query_normalized in prepare_text_for_matching(meta['snippet']) and long_enough(meta, query_normalized, False):
+            matches.append((1, idx, 0.0))
+            matched_indices.add(idx)
+    for idx, meta in enumerate(generation.metadata):
+        if search_type in ['all', 'all_words'] and idx not in matched_indices and apply_filters([meta], filters) and \
+                set(query_words.split()).issubset(prepare_text_for_matching(meta['snippet']).split()) and \
+                long_enough(meta, query_words, True):
+            matches.append((3, idx, 0.1))
+            matched_indices.add(idx)
+    if search_type in ['all', 'semantic']:
+        semantic_matches = [(4, idx, distance) for distance, idx in zip(hits[0][0].tolist(), hits[1][0].tolist())
+                            if idx >= 0 and idx not in matched_indices and long_enough(generation.metadata[idx], query, True)]
+        matches.extend(semantic_matches[:top_k])
+    matches.sort(key=lambda match: (match[0], -generation.metadata[match[1]]['priority'], -match[2]))
+    return [(idx, category_priority) for category_priority, idx, _ in matches[:top_k]]
+
+
+@pytest.mark.parametrize('lexical_indexes', [True, False])
+def test_search_ranks_like_a_full_sort(tmp_path, lexical_indexes):
+    generation = build_generation(tmp_path, lexical_indexes=lexical_indexes)
+    assert (generation.exact_index is not None) == lexical_indexes
+    query_embedding = normalized_vectors(1, seed=3)
+    for filters in [{}, {'book_title': 'Book B'}, {'group': 'CWSA'}]:
+        filter_bitmap = get_filter_bitmap(generation.facets, generation.metadata, filters)
+        for top_k in [3, 10, 40]:
+            hits = search_semantic_candidates(query_embedding, generation.index, top_k * 5, filter_bitmap)
+            for query in ['psychic', 'the soul', 'divine life light', 'truth being', 'missing']:
+                for search_type in ['all', 'exact', 'all_words', 'semantic']:
+                    for min_snippet_length in [10, 40]:
+                        results = run_search(query, generation.index_path, generation.metadata_path, top_k, filters,
+                                             search_type, min_snippet_length=min_snippet_length, semantic_hits=hits,
+                                             generation=generation)
+                        expected = full_sort_search(generation, query, top_k, filters, search_type, min_snippet_length, hits)
+                        assert [(result['page_number'], result['category_priority']) for result in results] == expected, \
+                            (query, search_type, filters, top_k, min_snippet_length)
+
+
+def test_pages_add_up_to_search(tmp_path, monkeypatch):
+    generation = build_generation(tmp_path)
+    query_embedding = normalized_vectors(1, seed=3)
+
+    def find_semantic_hits(query, index, model_name, top_k, filter_bitmap=None, filter_range=None, *args):
+        return search_semantic_candidates(query_embedding, index, top_k * 5, filter_bitmap, filter_range)
+
+    monkeypatch.setattr('scripts.search.find_semantic_hits', find_semantic_hits)
+    index_path, metadata_path = generation.index_path, generation.metadata_path
+    for filters in [{}, {'book_title': 'Book B'}]:
+        for search_type in ['all', 'exact', 'all_words', 'semantic']:
+            for query in ['the soul', 'light']:
+                for top_k in [5, 40]:
+                    # One-word snippets are shorter than 40 characters and are skipped
+                    expected = search(query, index_path, metadata_path, top_k, filters, search_type, min_snippet_length=40)
+                    pages, cursor = [], None
+                    while True:
+                        results, cursor = search_page(query, index_path, metadata_path, 3, top_k, filters, search_type,
+                                                      min_snippet_length=40, cursor=cursor)
+                        assert len(results) <= 3
+                        pages.extend(results)
+                        if cursor is None:
+                            break
+                    assert pages == expected, (query, search_type, filters, top_k)
+
+
+def test_semantic_ranking_renders_lazily(tmp_path):
+    generation = build_generation(tmp_path, num_chunks=60)
+    distances, indices = generation.index.search(normalized_vectors(1, seed=5), 60)
+    matches = [{'idx': idx, 'category_priority': 4, 'distance': distance}
+               for distance, idx in zip(distances[0].tolist(), indices[0].tolist())]
+    highlight_queries = {4: 'light'}
+    for min_snippet_length in [0, 40]:
+        rendered = [(render_match(match, generation.metadata, highlight_queries, min_snippet_length), match)
+                    for match in matches]
+        for top_k in [1, 3, 10, 40]:
+            # The nearest top_k hits with a long enough snippet, ranked by (-priority, -distance)
+            nearest = [(result, match) for result, match in rendered if result is not None][:top_k]
+            ranked = sorted(nearest, key=lambda ranked: (-generation.priorities[ranked[1]['idx']], -ranked[1]['distance']))
+            for limit in [1, top_k // 2 + 1, top_k]:
+                assert list(iter_semantic_results(matches, generation.metadata, highlight_queries, top_k, limit,
+                                                  min_snippet_length, generation.priorities)) == ranked[:limit]
+
+
+def test_first_page_renders_only_the_page(tmp_path, monkeypatch):
+    generation = build_generation(tmp_path)
+    query_embedding = normalized_vectors(1, seed=3)
+
+    def find_semantic_hits(query, index, model_name, top_k, filter_bitmap=None, filter_range=None, *args):
+        return search_semantic_candidates(query_embedding, index, top_k * 5, filter_bitmap, filter_range)
+
+    rendered = []
+
+    def count_render_match(match, *args):
+        rendered.append(match['idx'])
+        return render_match(match, *args)
+
+    monkeypatch.setattr('scripts.search.find_semantic_hits', find_semantic_hits)
+    monkeypatch.setattr('scripts.search.render_match', count_render_match)
+    for search_type in ['all_words', 'semantic']:
+        rendered.clear()
+        search('the light', generation.index_path, generation.metadata_path, 30, search_type=search_type,
+               min_snippet_length=40)
+        searched = len(rendered)
+        rendered.clear()
+        results, cursor = search_page('the light', generation.index_path, generation.metadata_path, 3, 30,
+                                      search_type=search_type, min_snippet_length=40)
+        assert len(results) == 3 and cursor is not None
+        # The page and one result beyond it, plus the hits dropped for a short snippet on the way
+        assert len(rendered) < searched / 2, search_type
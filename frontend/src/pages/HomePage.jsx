@@ -1,11 +1,11 @@
 // frontend/src/pages/HomePage.jsx
 
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { debounce } from 'lodash';
 import SearchBar from '../components/SearchBar';
 import Filters from '../components/Filters';
 import ResultCard from '../components/ResultCard';
-import { fetchFilters, performSearch } from '../services/api';
+import { fetchFilters, streamSearch } from '../services/api';
 import './HomePage.css';
 
 const HomePage = ({ toggleDarkMode }) => {
@@ -27,6 +27,10 @@ const HomePage = ({ toggleDarkMode }) => {
     const resultsPerPage = 10;
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState('');
+    // Aborts the stream of the previous search, so its later stages are not appended to a new one
+    const searchController = useRef(null);
+
+    useEffect(() => () => searchController.current?.abort(), []);
 
     useEffect(() => {
         const getFilters = async () => {
@@ -55,6 +59,9 @@ const HomePage = ({ toggleDarkMode }) => {
             setError('Please enter a search query.');
             return;
         }
+        searchController.current?.abort();
+        const controller = new AbortController();
+        searchController.current = controller;
         setLoading(true);
         setError('');
         try {
@@ -64,10 +71,21 @@ const HomePage = ({ toggleDarkMode }) => {
                 book_title: selectedFilters.book_title,
                 search_type: selectedFilters.search_type
             };
-            const data = await performSearch(query, searchFilters, 100);
-            setResults(Array.isArray(data.results) ? data.results : []);
+            setResults([]);
             setCurrentPage(1);
+            // Exact matches arrive first; later stages are appended as they finish
+            await streamSearch(query, searchFilters, 100, (category, stageResults) => {
+                if (controller.signal.aborted) return;
+                if (Array.isArray(stageResults) && stageResults.length > 0) {
+                    setResults(previous => [...previous, ...stageResults]);
+                    setLoading(false);
+                }
+            }, controller.signal);
         } catch (err) {
+            if (controller.signal.aborted) {
+                // A newer search replaced this one and owns the results and loading state
+                return;
+            }
             console.error("Error performing search:", err);
             setError('Search failed. Please try again.');
         }
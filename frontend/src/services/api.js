@@ -42,4 +42,42 @@ export const performSearch = async (query, filters, top_k = 100) => {
     }
 };
 
-
+/**
+ * Streams a search from /search/stream, stage by stage.
+ * @param {string} query - The search query.
+ * @param {Object} filters - Filters including author, group, book_title and search_type.
+ * @param {number} top_k - Number of top results to fetch.
+ * @param {Function} onResults - Called with (category, results) as each stage arrives:
+ *     exact matches first, then all-words matches, then semantic results.
+ * @param {AbortSignal} [signal] - Aborts the request; the promise then rejects with an AbortError.
+ * @returns {Promise<number>} The total number of results.
+ */
+export const streamSearch = async (query, filters, top_k = 100, onResults, signal) => {
+    const params = new URLSearchParams({ query, top_k: filters.top_k || top_k });
+    ['author', 'group', 'book_title', 'search_type'].forEach((key) => {
+        if (filters[key]) params.append(key, filters[key]);
+    });
+    const response = await fetch(`${API_BASE_URL}/search/stream?${params}`, {
+        headers: { Accept: 'application/x-ndjson' },
+        signal,
+    });
+    if (!response.ok) {
+        throw new Error(`Search failed with status ${response.status}`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+        const { done, value } = await reader.read();
+        buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const line of lines.filter((text) => text.trim())) {
+            const event = JSON.parse(line);
+            if (event.error) throw new Error(event.error);
+            if (event.done) return event.total;
+            onResults(event.category, event.results);
+        }
+        if (done) throw new Error('Search stream ended early.');
+    }
+};